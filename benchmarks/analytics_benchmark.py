@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+'''
+Measures crawl.log analytics throughput, in lines per second, on a
+synthetic log: parsing into columnar chunks, the vectorised aggregation on
+its own, and a plain-Python dict/Counter version of the same aggregates.
+
+    python benchmarks/analytics_benchmark.py [-n LINES] [--chunk-size N]
+'''
+import os
+import random
+import sys
+import time
+
+from argparse import ArgumentParser
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from hapy.analytics import ChunkBuilder, CrawlLogStats, chunks, host_of
+from hapy.crawllog import parse_line
+
+STATUSES = [200] * 20 + [301, 302, 304, 404, 500, -1, -6, -9998]
+MIMES = ['text/html', 'image/jpeg', 'image/png', 'text/css', 'application/javascript', 'text/dns']
+
+
+def synthetic_log(n, hosts=5000):
+    rnd = random.Random(42)
+    for i in range(n):
+        yield ('2020-07-02T10:%02d:%02d.%03dZ %d %d http://host%d.example.com/page/%d L '
+               'http://host%d.example.com/ %s #%03d 20200702100000000+%d sha1:X - -' % (
+                   (i // 60000) % 60, (i // 1000) % 60, i % 1000, rnd.choice(STATUSES),
+                   rnd.randint(0, 200000), rnd.randint(0, hosts), i, rnd.randint(0, hosts),
+                   rnd.choice(MIMES), rnd.randint(0, 200), rnd.randint(1, 5000))).encode('ascii')
+
+
+def python_aggregates(records):
+    by_host = defaultdict(lambda: [0, 0])
+    by_status = Counter()
+    by_mime = defaultdict(lambda: [0, 0])
+    durations = []
+    for r in records:
+        h = by_host[host_of(r.uri)]
+        h[0] += 1
+        h[1] += r.size
+        by_status[r.status] += 1
+        m = by_mime[r.mime]
+        m[0] += 1
+        m[1] += r.size
+        if r.duration is not None:
+            durations.append(r.duration)
+    durations.sort()
+    return durations[len(durations) // 2] if durations else None
+
+
+def rate(n, seconds):
+    return '%10.0f lines/s (%.2fs)' % (n / seconds, seconds)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', dest='number', type=int, default=500000)
+    parser.add_argument('--chunk-size', dest='chunk_size', type=int, default=65536)
+    args = parser.parse_args()
+
+    lines = list(synthetic_log(args.number))
+    records = [parse_line(l) for l in lines]
+
+    start = time.time()
+    builder = ChunkBuilder(args.chunk_size)
+    built = list(chunks(lines, builder=builder))
+    print('parse lines into columnar chunks     ', rate(args.number, time.time() - start))
+
+    start = time.time()
+    stats = CrawlLogStats(builder)
+    for chunk in built:
+        stats.add(chunk)
+    stats.summary()
+    print('vectorised aggregation of chunks     ', rate(args.number, time.time() - start))
+
+    start = time.time()
+    python_aggregates(records)
+    print('dict/Counter aggregation of records  ', rate(args.number, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
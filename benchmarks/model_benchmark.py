@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+'''
+Compares the memory held by job-info snapshots kept as the nested dicts of
+get_job_info() with the slotted JobInfo objects of get_job_info_model().
+
+    python benchmarks/model_benchmark.py [-n SNAPSHOTS]
+'''
+import os
+import sys
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from hapy.models import JobInfo
+from hapy.parse import _parse_info
+
+ASSET = os.path.join(os.path.dirname(__file__), '..', 'tests', 'assets', 'test_get_job_info.xml')
+
+
+def measure(fn, content, n):
+    tracemalloc.start()
+    start = time.time()
+    # Vary a field so identical snapshots can't share strings:
+    kept = [fn(content.replace(b'<launchCount>0', ('<launchCount>%d' % i).encode('ascii')))
+            for i in range(n)]
+    elapsed = time.time() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size, elapsed
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', dest='number', type=int, default=1000)
+    args = parser.parse_args()
+    with open(ASSET, 'rb') as f:
+        content = f.read()
+    for name, fn in [('dict', _parse_info), ('JobInfo', JobInfo.from_xml)]:
+        size, elapsed = measure(fn, content, args.number)
+        print('%-8s %8.1f KiB total %6.2f KiB/snapshot %8.1f us/snapshot' % (
+            name, size / 1024.0, size / 1024.0 / args.number, elapsed * 1e6 / args.number))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+'''
+Compares the streaming job/engine XML parser with the original
+ElementTree + recursive __tree_to_dict approach, on the test fixtures.
+
+    python benchmarks/parse_benchmark.py [-n ITERATIONS] [--scale N]
+
+--scale repeats the jobLogTail and configFiles entries N times, to mimic
+the job-info documents of a long-running crawl.
+'''
+import glob
+import os
+import sys
+import timeit
+import tracemalloc
+
+from argparse import ArgumentParser
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from hapy.parse import _parse_info, _tree_to_dict
+
+ASSETS = os.path.join(os.path.dirname(__file__), '..', 'tests', 'assets')
+
+
+def recursive(content):
+    return _tree_to_dict(ElementTree.fromstring(content))
+
+
+def scaled(content, n):
+    tree = ElementTree.fromstring(content)
+    for section in ['jobLogTail', 'configFiles']:
+        parent = tree.find(section)
+        if parent is not None:
+            values = list(parent)
+            for i in range(n - 1):
+                parent.extend(values)
+    return ElementTree.tostring(tree)
+
+
+def peak_kib(fn, content):
+    tracemalloc.start()
+    fn(content)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024.0
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', dest='number', type=int, default=2000)
+    parser.add_argument('--scale', dest='scale', type=int, default=1)
+    args = parser.parse_args()
+
+    print('%-42s %9s %12s %12s %8s %10s %10s' % (
+        'fixture', 'bytes', 'recursive us', 'streaming us', 'speedup',
+        'rec KiB', 'str KiB'))
+    for path in sorted(glob.glob(os.path.join(ASSETS, '*.xml'))):
+        with open(path, 'rb') as f:
+            content = f.read()
+        if b'<?xml' not in content[:10] or b'<beans' in content:
+            continue
+        if args.scale > 1:
+            content = scaled(content, args.scale)
+        old = timeit.timeit(lambda: recursive(content), number=args.number)
+        new = timeit.timeit(lambda: _parse_info(content), number=args.number)
+        print('%-42s %9d %12.1f %12.1f %7.2fx %10.1f %10.1f' % (
+            os.path.basename(path), len(content),
+            old * 1e6 / args.number, new * 1e6 / args.number, old / new,
+            peak_kib(recursive, content), peak_kib(_parse_info, content)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+'''
+Compares running url-status for many different URLs with the old Jinja2
+templates (values pasted into the Groovy source) against the script
+registry (fixed body, parameters bound as JSON), over a fake engine.
+
+    python benchmarks/script_benchmark.py [-n CALLS]
+
+Reports the client-side cost of preparing each script, the request size,
+the round-trip latency and how many distinct script bodies the engine
+would have to compile. The fake engine doesn't run Groovy, so the saving
+on the engine side shows up only in that last column: with templates every
+new URL is a new script to compile, while the registry's body is compiled
+once per job and reused.
+'''
+import hashlib
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import hapy
+from hapy import scripts
+from tests.fake_engine import FakeEngine
+
+try:
+    from jinja2 import Template
+except ImportError:
+    Template = None
+
+
+class _Substitution(object):
+    '''Stands in for jinja2.Template when Jinja2 isn't installed.'''
+
+    def __init__(self, text):
+        self.text = text
+
+    def render(self, values):
+        text = self.text
+        for k, v in values.items():
+            text = text.replace('{{ %s }}' % k, str(v))
+        return text
+
+
+def template_for(name):
+    '''The registry's script as it was written for the Jinja2 templates.'''
+    body = scripts.get(name).body
+    text = body.replace('params.url', '"{{ url }}"').replace('params.limit ?: 10', '{{ limit }}')
+    return Template(text) if Template is not None else _Substitution(text)
+
+
+def run(label, h, prepare, urls):
+    start = time.perf_counter()
+    prepared = [prepare(url) for url in urls]
+    prepare_time = time.perf_counter() - start
+    size = sum(len(text) for text, body in prepared)
+    bodies = set(hashlib.sha1(body.encode('utf-8')).hexdigest() for text, body in prepared)
+    start = time.perf_counter()
+    for text, body in prepared:
+        h.execute_script('test', 'groovy', text)
+    elapsed = time.perf_counter() - start
+    n = len(urls)
+    print('%-10s %12.1f %10d %12.1f %10d' % (
+        label, prepare_time / n * 1e6, size // n, elapsed / n * 1e3, len(bodies)))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', dest='number', type=int, default=500)
+    args = parser.parse_args()
+
+    urls = ['http://www.example.com/page/%d?q="%d"' % (i, i) for i in range(args.number)]
+    template = template_for('url-status')
+    script = scripts.get('url-status')
+
+    def templated(url):
+        text = template.render({'url': url, 'limit': 10})
+        return text, text
+
+    def registry(url):
+        return script.render(url=url, limit=10), script.body
+
+    print('%-10s %12s %10s %12s %10s' % (
+        'approach', 'prepare us', 'bytes', 'latency ms', 'compiles'))
+    with FakeEngine() as engine:
+        with hapy.Hapy(engine.base_url) as h:
+            h.get_info()
+            run('jinja2' if Template is not None else 'template', h, templated, urls)
+            run('registry', h, registry, urls)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+'''
+Compares reading a job's state from the job-info XML by parsing the whole
+document (as status() used to, through get_job_info()) with JobStatus,
+which stops parsing once it has the state, description and actions.
+
+    python benchmarks/status_benchmark.py [-n CALLS] [--log-lines LINES]
+
+A running job's page carries a long jobLogTail, thread and frontier
+reports, so the fixture is padded with `--log-lines` log lines to make it
+closer to a real one.
+'''
+import os
+import sys
+import time
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from hapy.models import JobInfo, JobStatus
+from hapy.parse import _parse_info
+
+ASSET = os.path.join(os.path.dirname(__file__), '..', 'tests', 'assets', 'test_get_job_info.xml')
+
+
+def full_parse(content):
+    return _parse_info(content)['job'].get('crawlControllerState', '')
+
+
+def model(content):
+    return JobInfo.from_xml(content).crawl_controller_state
+
+
+def status(content):
+    return JobStatus.from_xml(content).state
+
+
+def padded(content, lines):
+    tail = b''.join(b'<value>2020-07-02T10:00:%02d.000Z INFO Some crawl log line %d</value>\n' % (i % 60, i)
+                    for i in range(lines))
+    return content.replace(b'<jobLogTail>', b'<jobLogTail>\n' + tail)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('-n', dest='number', type=int, default=2000)
+    parser.add_argument('--log-lines', dest='log_lines', type=int, default=200)
+    args = parser.parse_args()
+    with open(ASSET, 'rb') as f:
+        content = padded(f.read(), args.log_lines)
+    print('document: %.1f KiB' % (len(content) / 1024.0))
+    base = None
+    for name, fn in [('full', full_parse), ('JobInfo', model), ('JobStatus', status)]:
+        assert fn(content) == 'NASCENT'
+        start = time.perf_counter()
+        for i in range(args.number):
+            fn(content)
+        elapsed = (time.perf_counter() - start) / args.number
+        base = base or elapsed
+        print('%-10s %8.1f us/call %6.1fx' % (name, elapsed * 1e6, base / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,5 @@
 from .hapy import Hapy
 from .hapy import HapyException
+from .hapy import CallInfo
+from .aio import AsyncHapy
+from .fleet import HapyFleet
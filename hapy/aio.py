@@ -0,0 +1,513 @@
+'''
+Asynchronous counterpart of `hapy.Hapy`, built on httpx.
+
+The methods mirror `Hapy` one for one but are coroutines. Response checking,
+XML parsing and `HapyException` are shared with the blocking client.
+
+Only `Hapy` has these:
+
+    connection_stats  httpx doesn't count the connections its pool opens
+    tail_crawl_log    following and streaming logs is left to the
+    read_log          blocking client, e.g. in a thread
+'''
+import asyncio
+import os
+import time
+
+import httpx
+import logging
+
+from . import frontier, inject, queues, scripts, urlstatus, wait
+from .cache import MISS
+from .coalesce import AsyncSingleFlight
+from .hapy import HEADERS, PUT_CODES, _cache_key, _call_info, _capture, _check_response, _is_action, _record, urlparse
+from .instrument import HttpxTrace, add_request, instrumented, parse_timed
+from .limit import CONTROL, MONITOR, rate_limiter
+from .models import EngineInfo, JobInfo, JobStatus
+from .parse import (
+    RAW_ONLY_GROOVY,
+    _check_script_options,
+    _parse_info,
+    _script_result
+)
+from .resilience import resilience as resilience_policy
+
+logger = logging.getLogger(__name__)
+
+
+@instrumented
+class AsyncHapy(object):
+
+    def __init__(self, base_url, username=None, password=None, insecure=True, timeout=None,
+                 max_connections=10, max_keepalive=10, client=None, index_ttl=2.0,
+                 cache=None, coalesce=True, rate_limit=None, resilience=None, observer=None):
+        '''
+        Pass an existing `httpx.AsyncClient` as `client` to share one
+        connection pool between several engines; it is then left open by
+        `aclose()`. `cache`, `coalesce`, `rate_limit`, `resilience` and
+        `observer` work as for `Hapy`, with `coalesce` sharing calls
+        between tasks.
+        '''
+        if base_url.endswith('/'):
+            base_url = base_url[:-1]
+        self.base_url = '%s/engine' % base_url
+        self._engine_path = urlparse(self.base_url).path
+        self.cache = cache
+        if None not in [username, password]:
+            self.auth = httpx.DigestAuth(username, password)
+        else:
+            self.auth = None
+        self.insecure = insecure
+        self.timeout = timeout
+        self._owns_client = client is None
+        if client is None:
+            client = httpx.AsyncClient(
+                verify=not insecure,
+                timeout=timeout,
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_keepalive
+                )
+            )
+        self.client = client
+        self.index_ttl = index_ttl
+        self._job_index = None
+        self._acted_at = None
+        self._flights = AsyncSingleFlight() if coalesce else None
+        self.limiter = rate_limiter(rate_limit)
+        self.resilience = resilience_policy(resilience)
+        self.observer = observer
+
+    async def aclose(self):
+        if self._owns_client:
+            await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def capture(self):
+        '''
+        Returns a context manager that collects a `CallInfo` for each
+        request the current task makes through this client in the block.
+        '''
+        return _capture(self)
+
+    def coalesce_stats(self):
+        '''See `Hapy.coalesce_stats`.'''
+        if self._flights is None:
+            return dict(calls=0, coalesced=0, in_flight=0)
+        return self._flights.stats()
+
+    async def _coalesce(self, key, fn):
+        if self._flights is None:
+            return await fn()
+        return await self._flights.do(key, fn)
+
+    def _invalidate(self, url):
+        self._job_index = None
+        if self._flights is not None:
+            self._flights.forget()
+        if self.cache is not None:
+            self.cache.invalidate(_cache_key(self._engine_path, url)[1])
+
+    async def _lookup(self, kind, job, fetch):
+        if self.cache is None:
+            return await fetch()
+        value = self.cache.get(kind, job, kind)
+        if value is MISS:
+            value = await fetch()
+            self.cache.put(kind, job, kind, value)
+        return value
+
+    async def _config_url(self, name):
+        async def fetch():
+            return (await self.get_job_info(name))['job']['primaryConfigUrl']
+        return await self._lookup('config_url', name, fetch)
+
+    async def _jobs_dir(self):
+        async def fetch():
+            return (await self.get_info())['engine']['jobsDir']
+        return await self._lookup('jobs_dir', None, fetch)
+
+    async def _throttle(self, priority):
+        if self.limiter is not None:
+            await self.limiter.acquire_async(priority)
+
+    def _extensions(self):
+        '''The httpx request extensions: a trace of its phases, if observed.'''
+        if self.observer is None:
+            return None
+        return {'trace': HttpxTrace()}
+
+    def _record(self, r, start, extensions):
+        info = _call_info(r, start)
+        _record(self, info)
+        if extensions is not None:
+            trace = extensions['trace']
+            add_request(self.observer, r.request.method, info.elapsed, trace.connect, trace.server, info.bytes)
+
+    async def _resilient(self, fn, idempotent=True, hedge=False):
+        if self.resilience is None:
+            return await fn()
+        return await self.resilience.call_async(fn, idempotent, hedge)
+
+    async def _http_post(self, url, data, code=200, priority=CONTROL):
+        return await self._resilient(lambda: self._send_post(url, data, code, priority), idempotent=False)
+
+    async def _send_post(self, url, data, code, priority):
+        await self._throttle(priority)
+        extensions = self._extensions()
+        start = time.perf_counter()
+        r = await self.client.post(
+            url,
+            data=data,
+            headers=HEADERS,
+            auth=self.auth,
+            follow_redirects=False,
+            extensions=extensions
+        )
+        self._record(r, start, extensions)
+        if _is_action(url):
+            self._invalidate(url)
+            self._acted_at = time.monotonic()
+        return _check_response(r, code)
+
+    async def _http_get(self, url, code=200, fresh=False):
+        if self.cache is not None:
+            kind, job = _cache_key(self._engine_path, url)
+            r = MISS if fresh else self.cache.get(kind, job, url)
+            if r is not MISS:
+                return r
+        async def fetch():
+            return _check_response(await self._fetch(url), code)
+        r = await self._coalesce(('GET', url, code), lambda: self._resilient(fetch, hedge=True))
+        if self.cache is not None:
+            self.cache.put(kind, job, url, r)
+        return r
+
+    async def _fetch(self, url):
+        await self._throttle(MONITOR)
+        extensions = self._extensions()
+        start = time.perf_counter()
+        r = await self.client.get(
+            url,
+            headers=HEADERS,
+            auth=self.auth,
+            extensions=extensions
+        )
+        self._record(r, start, extensions)
+        return r
+
+    async def _http_put(self, url, data, code=PUT_CODES):
+        return await self._resilient(lambda: self._send_put(url, data, code))
+
+    async def _send_put(self, url, data, code):
+        await self._throttle(CONTROL)
+        extensions = self._extensions()
+        start = time.perf_counter()
+        r = await self.client.put(
+            url,
+            content=data,
+            headers=HEADERS,
+            auth=self.auth,
+            extensions=extensions
+        )
+        self._record(r, start, extensions)
+        self._invalidate(url)
+        return _check_response(r, code)
+
+    async def create_job(self, name):
+        await self._http_post(
+            url=self.base_url,
+            data=dict(
+                action='create',
+                createpath=name
+            ),
+            code=303
+        )
+
+    async def add_job_directory(self, path):
+        await self._http_post(
+            url=self.base_url,
+            data=dict(
+                action='add',
+                path=path
+            ),
+            code=303
+        )
+
+    async def build_job(self, name):
+        await self._http_post(
+            url='%s/job/%s' % (self.base_url, name),
+            data=dict(
+                action='build'
+            ),
+            code=303
+        )
+
+    async def launch_job(self, name):
+        await self._http_post(
+            url='%s/job/%s' % (self.base_url, name),
+            data=dict(
+                action='launch'
+            ),
+            code=303
+        )
+
+    async def rescan_job_directory(self):
+        await self._http_post(
+            url=self.base_url,
+            data=dict(
+                action='rescan'
+            ),
+            code=303
+        )
+
+    async def pause_job(self, name):
+        await self._http_post(
+            url='%s/job/%s' % (self.base_url, name),
+            data=dict(
+                action='pause'
+            ),
+            code=303
+        )
+
+    async def unpause_job(self, name):
+        await self._http_post(
+            url='%s/job/%s' % (self.base_url, name),
+            data=dict(
+                action='unpause'
+            ),
+            code=303
+        )
+
+    async def terminate_job(self, name):
+        await self._http_post(
+            url='%s/job/%s' % (self.base_url, name),
+            data=dict(
+                action='terminate'
+            ),
+            code=303
+        )
+
+    async def teardown_job(self, name):
+        await self._http_post(
+            url='%s/job/%s' % (self.base_url, name),
+            data=dict(
+                action='teardown'
+            ),
+            code=303
+        )
+
+    async def copy_job(self, src_name, dest_name, as_profile=False):
+        data = dict(copyTo=dest_name)
+        if as_profile:
+            data['asProfile'] = 'on'
+        await self._http_post(
+            url='%s/job/%s' % (self.base_url, src_name),
+            data=data,
+            code=303
+        )
+
+    async def checkpoint_job(self, name):
+        await self._http_post(
+            url='%s/job/%s' % (self.base_url, name),
+            data=dict(
+                action='checkpoint'
+            ),
+            code=303
+        )
+
+    async def execute_script(self, name, engine, script, parse=None, raw_only=False):
+        _check_script_options(engine, parse, raw_only)
+        if raw_only:
+            script = RAW_ONLY_GROOVY + script
+        r = await self._http_post(
+            url='%s/job/%s/script' % (self.base_url, name),
+            data=dict(
+                engine=engine,
+                script=script
+            ),
+            code=200,
+            priority=MONITOR
+        )
+        return parse_timed(self, lambda content: _script_result(content, parse), r.content)
+
+    async def run_script(self, job, name, parse='json', **params):
+        return await self.execute_script(job, 'groovy', scripts.render(name, **params),
+                                         parse=parse, raw_only=True)
+
+    async def submit_configuration(self, name, cxml):
+        url = await self._config_url(name)
+        await self._http_put(
+            url=url,
+            data=cxml
+        )
+
+    # End of documented API calls, here are some useful extras
+
+    async def _get_parsed(self, url, parse, fresh=False):
+        async def fetch():
+            return parse_timed(self, parse, (await self._http_get(url, fresh=fresh)).content)
+        return await self._coalesce((parse, url, fresh), fetch)
+
+    async def get_info(self):
+        return await self._get_parsed(self.base_url, _parse_info)
+
+    async def get_job_info(self, name):
+        return await self._get_parsed('%s/job/%s' % (self.base_url, name), _parse_info)
+
+    async def get_info_model(self):
+        return await self._get_parsed(self.base_url, EngineInfo.from_xml)
+
+    async def get_job_info_model(self, name):
+        return await self._get_parsed('%s/job/%s' % (self.base_url, name), JobInfo.from_xml)
+
+    async def get_job_configuration(self, name):
+        url = await self._config_url(name)
+        r = await self._http_get(
+            url=url
+        )
+        return r.content
+
+    async def delete_job(self, name):
+        await self.run_script(name, 'delete_job')
+        jdir = await self._jobs_dir()
+        jobpath = os.path.join(jdir, '%s.jobpath' % name)
+        if os.path.isfile(jobpath):
+            os.remove(jobpath)
+        await self.rescan_job_directory()
+        if self.cache is not None:
+            self.cache.invalidate(name, everything=True)
+
+    async def get_job_status(self, name):
+        return await self._get_parsed('%s/job/%s' % (self.base_url, name), JobStatus.from_xml)
+
+    async def status(self, job=""):
+        return (await self.get_job_status(job)).state or ""
+
+    async def job_index(self, max_age=None):
+        if max_age is None:
+            max_age = self.index_ttl
+        cached = self._job_index
+        if cached is not None and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+        index = (await self._get_parsed(self.base_url, EngineInfo.from_xml, fresh=max_age <= 0)).job_index()
+        self._job_index = (time.monotonic(), index)
+        return index
+
+    async def list_jobs(self, status=None):
+        return [name for name, job in (await self.job_index()).items()
+                if status is None or job.crawl_controller_state == status]
+
+    async def wait_for_states(self, targets, timeout=None):
+        waiter = wait.StateWaiter(targets, timeout, wait.recent(self._acted_at))
+        delay = waiter.update(await self.job_index(max_age=0))
+        while delay is not None:
+            await asyncio.sleep(delay)
+            delay = waiter.update(await self.job_index(max_age=0))
+        infos = await asyncio.gather(*[self._fresh_job_info(job) for job in targets])
+        return dict(zip(targets, infos))
+
+    async def wait_for_state(self, job, states, timeout=None):
+        return (await self.wait_for_states({job: states}, timeout))[job]
+
+    async def wait_for_action(self, job, action, timeout=None):
+        waiter = wait.ActionWaiter(job, action, timeout, wait.recent(self._acted_at))
+        url = '%s/job/%s' % (self.base_url, job)
+        delay = waiter.update(await self._get_parsed(url, JobStatus.from_xml, fresh=True))
+        while delay is not None:
+            await asyncio.sleep(delay)
+            delay = waiter.update(await self._get_parsed(url, JobStatus.from_xml, fresh=True))
+        return await self._fresh_job_info(job)
+
+    async def _fresh_job_info(self, job):
+        return await self._get_parsed('%s/job/%s' % (self.base_url, job), JobInfo.from_xml, fresh=True)
+
+    async def get_launch_id(self, job=""):
+        result = await self.run_script(job, 'launch-id')
+        return result.get('launch_id') if result else None
+
+    async def iter_pending_urls(self, job, page_size=frontier.DEFAULT_PAGE_SIZE, after=None):
+        '''An async generator of the job's `PendingUrl`s; see `Hapy.iter_pending_urls`.'''
+        while True:
+            result = await self.run_script(
+                job, 'pending-urls-page', after=after, page_size=page_size)
+            page = {}
+            for url in frontier.parse_page(result, page):
+                yield url
+            after = page['after']
+            if after is None:
+                return
+
+    async def get_queue_stats(self, job, top=queues.DEFAULT_TOP, sort_by='size'):
+        queues.check_sort_by(sort_by)
+        return queues.QueueStats.from_json(
+            await self.run_script(job, 'queue-stats', top=top, sort_by=sort_by))
+
+    async def url_status_batch(self, job, urls, chunk_size=urlstatus.DEFAULT_CHUNK_SIZE,
+                               concurrency=urlstatus.DEFAULT_CONCURRENCY,
+                               max_scan=urlstatus.DEFAULT_MAX_SCAN):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def lookup(chunk):
+            async with semaphore:
+                return await self.run_script(
+                    job, 'url-status-batch', urls=chunk, max_scan=max_scan) or {}
+
+        result = {}
+        for statuses in await asyncio.gather(*[
+                lookup(chunk) for chunk in urlstatus.chunked(urls, chunk_size)]):
+            result.update(statuses)
+        return result
+
+    async def get_seeds(self, job):
+        r = await self._http_get("%s/job/%s/jobdir/latest/seeds.txt" % (self.base_url, job))
+        seeds = [seed.strip() for seed in r.text.splitlines()]
+        for i, seed in enumerate(seeds):
+            if seed.startswith("#"):
+                return seeds[0:i]
+        return seeds
+
+    async def inject_urls(self, job, urls, force_fetch=False, is_seed=False, method='action',
+                          batch_size=inject.DEFAULT_BATCH_SIZE,
+                          max_batch_bytes=inject.DEFAULT_MAX_BATCH_BYTES, callback=None):
+        injector = inject.UrlInjector(self, job, force_fetch=force_fetch, is_seed=is_seed, method=method,
+                                      batch_size=batch_size, max_batch_bytes=max_batch_bytes,
+                                      callback=callback)
+        action_url = None
+        if method == 'action':
+            action_url = injector.action_url(await self.get_job_info_model(job))
+        sent = []
+        for batch in injector.plan(urls, action_url):
+            start = time.monotonic()
+            result = None
+            if batch.url is not None:
+                await self._http_put(batch.url, batch.payload)
+            else:
+                result = await self.run_script(job, 'inject-urls', **batch.params)
+            sent.append(injector.sent(batch, time.monotonic() - start, result))
+        return sent
+
+    async def empty_frontier(self, job):
+        result = await self.run_script(job, 'empty-frontier')
+        return result.get('deleted') if result else None
+
+    async def launch_from_latest_checkpoint(self, job):
+        checkpoint = (await self.get_job_info_model(job)).checkpoints.latest
+        if checkpoint is None:
+            logger.info("No checkpoint found. Lauching as new job...")
+            await self.launch_job(job)
+        else:
+            logger.info("Launching from checkpoint %s..." % checkpoint)
+            await self._http_post(
+                url='%s/job/%s' % (self.base_url, job),
+                data=dict(
+                    action='launch',
+                    checkpoint=checkpoint
+                ),
+                code=303
+            )
@@ -0,0 +1,268 @@
+'''
+Columnar crawl.log analytics with NumPy.
+
+Crawl log records are gathered into fixed-size `Chunk`s of NumPy columns
+(status as int16, size as int64, durations as int32, timestamps as
+datetime64[ms], and hosts and MIME types as ids into interned string
+tables). `CrawlLogStats` folds chunks into running per-host, per-status and
+per-MIME aggregates with vectorised operations, plus a log-scale latency
+histogram, so memory use doesn't depend on the length of the log.
+
+    stats = analyse(open('crawl.log', 'rb'))
+    print(stats.summary())
+'''
+import numpy as np
+
+from .crawllog import CrawlLogRecord, parse_line
+
+DEFAULT_CHUNK_SIZE = 65536
+
+# Latency histogram bin edges, in milliseconds: 0, then 1ms to ~1h in 5% steps.
+LATENCY_BINS = np.concatenate([[0.0], np.logspace(0, np.log10(3600 * 1000), 312)])
+
+
+class Interner(object):
+    '''Maps strings to dense integer ids, and back.'''
+
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def id(self, value):
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+
+def host_of(uri):
+    '''The lower-cased host of a crawl.log URI, e.g. for 'dns:' or 'http:' URIs.'''
+    if uri.startswith('dns:'):
+        return uri[4:].lower()
+    parts = uri.split('/', 3)
+    if len(parts) < 3:
+        return ''
+    host = parts[2].rpartition('@')[2]
+    if not host.startswith('['):
+        host = host.partition(':')[0]
+    return host.lower()
+
+
+class Chunk(object):
+    '''One batch of crawl.log records held as NumPy columns.'''
+    __slots__ = ('timestamp', 'status', 'size', 'duration', 'host', 'mime')
+
+    def __init__(self, timestamp, status, size, duration, host, mime):
+        self.timestamp = timestamp
+        self.status = status
+        self.size = size
+        self.duration = duration
+        self.host = host
+        self.mime = mime
+
+    def __len__(self):
+        return len(self.status)
+
+
+class ChunkBuilder(object):
+    '''Collects records into `Chunk`s, sharing one host and one MIME interner.'''
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.hosts = Interner()
+        self.mimes = Interner()
+        self._clear()
+
+    def _clear(self):
+        self._timestamp = []
+        self._status = []
+        self._size = []
+        self._duration = []
+        self._host = []
+        self._mime = []
+
+    def __len__(self):
+        return len(self._status)
+
+    def add(self, record):
+        '''Adds a `CrawlLogRecord`; returns a full `Chunk` when there is one.'''
+        # Drop the 'Z': NumPy only parses naive ISO timestamps.
+        self._timestamp.append(record.timestamp.rstrip('Z'))
+        self._status.append(record.status)
+        self._size.append(record.size)
+        self._duration.append(-1 if record.duration is None else record.duration)
+        self._host.append(self.hosts.id(host_of(record.uri)))
+        self._mime.append(self.mimes.id(record.mime))
+        if len(self._status) >= self.chunk_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        '''Returns the records collected so far as a `Chunk`, or None.'''
+        if not self._status:
+            return None
+        try:
+            timestamp = np.array(self._timestamp, dtype='datetime64[ms]')
+        except ValueError:
+            timestamp = np.array([_timestamp(t) for t in self._timestamp], dtype='datetime64[ms]')
+        chunk = Chunk(
+            timestamp,
+            np.array(self._status, dtype=np.int16),
+            np.array(self._size, dtype=np.int64),
+            np.array(self._duration, dtype=np.int32),
+            np.array(self._host, dtype=np.int32),
+            np.array(self._mime, dtype=np.int32)
+        )
+        self._clear()
+        return chunk
+
+
+def _timestamp(value):
+    try:
+        return np.datetime64(value, 'ms')
+    except ValueError:
+        return np.datetime64('NaT')
+
+
+def chunks(records, chunk_size=DEFAULT_CHUNK_SIZE, builder=None):
+    '''
+    Yields `Chunk`s from an iterable of crawl.log lines (str or bytes),
+    `CrawlLogRecord`s, or lists of records as yielded by
+    `Hapy.tail_crawl_log`. Lines that don't parse are skipped.
+    '''
+    if builder is None:
+        builder = ChunkBuilder(chunk_size)
+    for item in records:
+        if isinstance(item, list):
+            items = item
+        else:
+            items = (item,)
+        for record in items:
+            if not isinstance(record, CrawlLogRecord):
+                record = parse_line(record)
+                if record is None:
+                    continue
+            chunk = builder.add(record)
+            if chunk is not None:
+                yield chunk
+    chunk = builder.flush()
+    if chunk is not None:
+        yield chunk
+
+
+def _grow(a, n):
+    if len(a) >= n:
+        return a
+    return np.concatenate([a, np.zeros(n - len(a), dtype=a.dtype)])
+
+
+class CrawlLogStats(object):
+    '''
+    Running aggregates over `Chunk`s that share the interners of `builder`.
+    '''
+
+    def __init__(self, builder=None):
+        self.builder = builder if builder is not None else ChunkBuilder()
+        self.lines = 0
+        self.bytes = 0
+        self.first = None
+        self.last = None
+        self.host_count = np.zeros(0, dtype=np.int64)
+        self.host_bytes = np.zeros(0, dtype=np.int64)
+        self.mime_count = np.zeros(0, dtype=np.int64)
+        self.mime_bytes = np.zeros(0, dtype=np.int64)
+        # Status codes are offset so negative (failure) codes can be counted:
+        self.status_count = np.zeros(1 << 16, dtype=np.int64)
+        self.latency = np.zeros(len(LATENCY_BINS) - 1, dtype=np.int64)
+
+    def add(self, chunk):
+        self.lines += len(chunk)
+        self.bytes += int(chunk.size.sum())
+        valid = chunk.timestamp[~np.isnat(chunk.timestamp)]
+        if len(valid):
+            lo, hi = valid.min(), valid.max()
+            self.first = lo if self.first is None else min(self.first, lo)
+            self.last = hi if self.last is None else max(self.last, hi)
+
+        n = len(self.builder.hosts)
+        self.host_count = _grow(self.host_count, n)
+        self.host_bytes = _grow(self.host_bytes, n)
+        self.host_count[:n] += np.bincount(chunk.host, minlength=n)
+        self.host_bytes[:n] += np.bincount(chunk.host, weights=chunk.size, minlength=n).astype(np.int64)
+
+        n = len(self.builder.mimes)
+        self.mime_count = _grow(self.mime_count, n)
+        self.mime_bytes = _grow(self.mime_bytes, n)
+        self.mime_count[:n] += np.bincount(chunk.mime, minlength=n)
+        self.mime_bytes[:n] += np.bincount(chunk.mime, weights=chunk.size, minlength=n).astype(np.int64)
+
+        self.status_count += np.bincount(chunk.status.astype(np.int32) + (1 << 15), minlength=1 << 16)
+
+        durations = chunk.duration[chunk.duration >= 0]
+        self.latency += np.histogram(durations, bins=LATENCY_BINS)[0]
+
+    def consume(self, records, chunk_size=None):
+        '''Adds every record from `records` (see `chunks`); returns self.'''
+        if chunk_size is not None:
+            self.builder.chunk_size = chunk_size
+        for chunk in chunks(records, builder=self.builder):
+            self.add(chunk)
+        return self
+
+    def elapsed_seconds(self):
+        if self.first is None:
+            return 0.0
+        return (self.last - self.first) / np.timedelta64(1, 's')
+
+    def bytes_per_second(self):
+        elapsed = self.elapsed_seconds()
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def latency_percentiles(self, percentiles=(50, 90, 99)):
+        '''Approximate fetch duration percentiles (ms), from the histogram.'''
+        total = self.latency.sum()
+        if total == 0:
+            return dict((p, None) for p in percentiles)
+        cumulative = np.cumsum(self.latency)
+        result = {}
+        for p in percentiles:
+            i = int(np.searchsorted(cumulative, total * p / 100.0))
+            result[p] = float(LATENCY_BINS[min(i + 1, len(LATENCY_BINS) - 1)])
+        return result
+
+    def by_status(self):
+        codes = np.nonzero(self.status_count)[0]
+        return dict((int(c) - (1 << 15), int(self.status_count[c])) for c in codes)
+
+    def _top(self, interner, count, size, top):
+        order = np.argsort(-count, kind='stable')[:top]
+        return [(interner.values[i], int(count[i]), int(size[i])) for i in order if count[i]]
+
+    def by_host(self, top=20):
+        '''[(host, lines, bytes)] for the `top` hosts by number of lines.'''
+        return self._top(self.builder.hosts, self.host_count, self.host_bytes, top)
+
+    def by_mime(self, top=20):
+        '''[(mime, lines, bytes)] for the `top` MIME types by number of lines.'''
+        return self._top(self.builder.mimes, self.mime_count, self.mime_bytes, top)
+
+    def summary(self, top=20):
+        return dict(
+            lines=self.lines,
+            bytes=self.bytes,
+            elapsed_seconds=self.elapsed_seconds(),
+            bytes_per_second=self.bytes_per_second(),
+            latency_ms=self.latency_percentiles(),
+            by_status=self.by_status(),
+            by_host=self.by_host(top),
+            by_mime=self.by_mime(top)
+        )
+
+
+def analyse(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    '''Returns the `CrawlLogStats` of an iterable of lines or records.'''
+    return CrawlLogStats(ChunkBuilder(chunk_size)).consume(records)
@@ -0,0 +1,95 @@
+'''
+An opt-in, in-memory cache for read-only engine requests.
+
+Entries are keyed by kind, job and key. Each kind has its own time to live,
+and the least recently used entries are evicted once `maxsize` is reached.
+'''
+import threading
+import time
+
+from collections import OrderedDict
+
+MISS = object()
+
+# Kinds of entry the clients store, and how long they stay fresh (seconds):
+#   engine      GET of the engine page (the job list and engine details)
+#   job         GET of a job page
+#   file        GET of anything else, e.g. files from a job directory
+#   config_url  the primaryConfigUrl of a job
+#   jobs_dir    the engine's jobsDir
+DEFAULT_TTLS = {
+    'engine': 2.0,
+    'job': 2.0,
+    'file': 10.0,
+    'config_url': 300.0,
+    'jobs_dir': 3600.0,
+}
+
+# Derived lookups that don't change when a job is launched, paused etc.:
+STABLE_KINDS = frozenset(['config_url', 'jobs_dir'])
+
+
+class ResponseCache(object):
+
+    def __init__(self, ttls=None, maxsize=256):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, kind, job, key):
+        '''Returns the cached value, or `MISS` if absent or expired.'''
+        k = (kind, job, key)
+        with self._lock:
+            entry = self._entries.get(k)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[k]
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(k)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, kind, job, key, value):
+        ttl = self.ttls.get(kind, 0)
+        if ttl <= 0:
+            return
+        k = (kind, job, key)
+        with self._lock:
+            self._entries[k] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(k)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, job=None, everything=False):
+        '''
+        Drops the entries of `job` plus the engine-wide ones, which list the
+        state of every job. Stable derived lookups are kept unless
+        `everything` is set, e.g. when the job itself is deleted.
+        '''
+        with self._lock:
+            for k in list(self._entries):
+                kind, j, key = k
+                if j != job and kind != 'engine':
+                    continue
+                if kind in STABLE_KINDS and not everything:
+                    continue
+                del self._entries[k]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, size=len(self._entries))
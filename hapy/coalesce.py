@@ -0,0 +1,110 @@
+'''
+Single-flight coalescing of identical concurrent calls.
+
+When several threads (or asyncio tasks) ask for the same thing at the same
+moment, only the first actually makes the call; the others wait for it and
+get the same result, or the same exception. Unlike `hapy.cache`, nothing is
+kept once the call is over: a caller arriving after it has finished starts
+a new one, so results are never older than the caller.
+
+`forget()` detaches the calls in flight, so that callers arriving after it
+start afresh. The clients use it when they send an action, which may change
+what an in-flight GET would have seen.
+'''
+import asyncio
+import threading
+
+
+class _Flight(object):
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight(object):
+    '''Coalesces calls with equal keys made from several threads at once.'''
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        '''
+        Returns `fn()`, or the result of the `fn` already being called for
+        `key` by another thread.
+        '''
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def forget(self):
+        with self._lock:
+            self._flights.clear()
+
+    def stats(self):
+        '''Returns a dict of calls made, calls coalesced and calls in flight.'''
+        with self._lock:
+            return dict(calls=self.calls, coalesced=self.coalesced, in_flight=len(self._flights))
+
+
+class AsyncSingleFlight(object):
+    '''
+    Coalesces coroutine calls with equal keys made from several tasks at
+    once. The shared call runs in a task of its own, so cancelling one of
+    the callers doesn't cancel it for the others.
+    '''
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+
+    async def do(self, key, fn):
+        '''Awaits `fn()`, or the `fn()` already being awaited for `key`.'''
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is None:
+            task = self._flights[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            # Don't warn about an exception nobody is left to retrieve:
+            task.exception()
+
+    def forget(self):
+        self._flights.clear()
+
+    def stats(self):
+        return dict(calls=self.calls, coalesced=self.coalesced, in_flight=len(self._flights))
@@ -0,0 +1,229 @@
+'''
+Following a job's crawl.log over HTTP.
+
+`CrawlLogTailer` reads the current launch's crawl.log from the engine's job
+directory with Range requests, starting from where the previous read ended,
+and turns each line into a `CrawlLogRecord`. Only one response chunk and one
+partial line are held at a time, whatever the size of the log.
+'''
+import time
+import logging
+
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+CRAWL_LOG_KEY = 'loggerModule.crawlLogPath'
+LAUNCH_ID_PLACEHOLDERS = ['$%7BlaunchId%7D', '${launchId}']
+# How many bytes already read each poll reads again, to check that the log
+# is still the same file:
+OVERLAP = 256
+# Where Heritrix puts the log when the job doesn't list it:
+DEFAULT_CRAWL_LOG_URL = '%s/job/%s/jobdir/${launchId}/logs/crawl.log'
+
+
+class CrawlLogRecord(namedtuple('CrawlLogRecord', [
+        'timestamp', 'status', 'size', 'uri', 'discovery_path', 'via',
+        'mime', 'thread', 'duration', 'digest'])):
+    '''
+    One crawl.log line. `status`, `size`, `thread` and `duration` (fetch
+    time in milliseconds, or None) are ints; the rest are strings as logged.
+    '''
+    __slots__ = ()
+
+
+def _int(s, default=0):
+    if s.lstrip('-').isdigit():
+        return int(s)
+    return default
+
+
+def parse_line(line):
+    '''
+    Parses one crawl.log line (str or bytes) into a `CrawlLogRecord`, or
+    returns None if it doesn't look like one.
+    '''
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', 'replace')
+    fields = line.split(None, 10)
+    if len(fields) < 10:
+        return None
+    timing = fields[8]
+    plus = timing.find('+')
+    duration = _int(timing[plus + 1:], None) if plus >= 0 else None
+    return CrawlLogRecord(
+        fields[0],
+        _int(fields[1]),
+        _int(fields[2]),
+        fields[3],
+        fields[4],
+        fields[5],
+        fields[6],
+        _int(fields[7].lstrip('#')),
+        duration,
+        fields[9]
+    )
+
+
+def _content_range_total(r):
+    '''The full length from a 'bytes a-b/total' or 'bytes */total' header.'''
+    value = r.headers.get('Content-Range', '')
+    total = value.rpartition('/')[2]
+    return int(total) if total.isdigit() else None
+
+
+class CrawlLogTailer(object):
+    '''
+    Iterating over a tailer yields lists of up to `batch_size` records.
+
+    When `follow` is set it waits `poll_interval` seconds whenever it has
+    caught up and carries on forever; otherwise it stops at the end of the
+    log, with a last line that has no newline yet in the last batch if it
+    parses (so if the tailer is iterated again and the line wasn't
+    complete, the rest of it is skipped).
+
+    Each poll reads the last `OVERLAP` bytes it has seen again: if they
+    have changed, or the log has shrunk, the log was rotated (at a
+    checkpoint) and is read again from the start. A new launch ID switches
+    to the new launch's log.
+    '''
+
+    def __init__(self, hapy, job, batch_size=1000, poll_interval=5.0,
+                 from_start=True, follow=True, chunk_size=1024 * 1024):
+        self.hapy = hapy
+        self.job = job
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.from_start = from_start
+        self.follow = follow
+        self.chunk_size = chunk_size
+        self.launch_id = None
+        self.url = None
+        self.offset = 0
+        self.skipped = 0
+        self._partial = b''
+        self._seen = b''
+
+    def _url_template(self):
+        url = self.hapy.get_job_info_model(self.job).config_url(CRAWL_LOG_KEY)
+        if url is None:
+            url = DEFAULT_CRAWL_LOG_URL % (self.hapy.base_url, self.job)
+            logger.info("%s has no %s, trying %s" % (self.job, CRAWL_LOG_KEY, url))
+        return url
+
+    def _resolve(self):
+        '''Points at the current launch's log; returns True if it changed.'''
+        launch_id = self.hapy.get_launch_id(self.job)
+        if self.url is not None and launch_id == self.launch_id:
+            return False
+        url = self._url_template()
+        for placeholder in LAUNCH_ID_PLACEHOLDERS:
+            url = url.replace(placeholder, launch_id or 'latest')
+        if self.url is not None:
+            logger.info("Launch %s of %s, following %s" % (launch_id, self.job, url))
+        first = self.url is None
+        self.launch_id = launch_id
+        self.url = url
+        self._reset()
+        if first and not self.from_start:
+            self.offset = self._size() or 0
+        return True
+
+    def _reset(self):
+        self.offset = 0
+        self._partial = b''
+        self._seen = b''
+
+    def _remember(self, chunk):
+        '''Keeps the last `OVERLAP` bytes read.'''
+        if len(chunk) >= OVERLAP:
+            self._seen = chunk[-OVERLAP:]
+        else:
+            self._seen = (self._seen + chunk)[-OVERLAP:]
+
+    def _size(self):
+        r = self.hapy._http_get_range(self.url, 0, 0)
+        r.close()
+        if r.status_code == 200:
+            return int(r.headers.get('Content-Length') or 0)
+        return _content_range_total(r)
+
+    def _read(self):
+        '''
+        Reads what's new since `offset`; yields the complete lines. Resets
+        to the start of the log if it was rotated.
+        '''
+        verify = self._seen
+        start = self.offset - len(verify)
+        r = self.hapy._http_get_range(self.url, start)
+        try:
+            if r.status_code == 404:
+                return
+            if r.status_code == 416:
+                total = _content_range_total(r)
+                if total is not None and total < self.offset:
+                    logger.info("%s shrank to %d bytes, rotated?" % (self.url, total))
+                    self._reset()
+                return
+            skip = 0
+            if r.status_code == 200:
+                # No Range support, so read past what we've seen already:
+                skip = start
+            for chunk in r.iter_content(self.chunk_size):
+                if skip:
+                    if len(chunk) <= skip:
+                        skip -= len(chunk)
+                        continue
+                    chunk = chunk[skip:]
+                    skip = 0
+                if verify:
+                    n = min(len(verify), len(chunk))
+                    if chunk[:n] != verify[:n]:
+                        logger.info("%s has changed before byte %d, rotated?" % (self.url, self.offset))
+                        self._reset()
+                        return
+                    verify = verify[n:]
+                    chunk = chunk[n:]
+                    if not chunk:
+                        continue
+                self.offset += len(chunk)
+                self._remember(chunk)
+                lines = (self._partial + chunk).split(b'\n')
+                self._partial = lines.pop()
+                for line in lines:
+                    yield line
+            if skip or verify:
+                logger.info("%s is shorter than before, rotated?" % self.url)
+                self._reset()
+        finally:
+            r.close()
+
+    def __iter__(self):
+        self._resolve()
+        while True:
+            batch = []
+            offset = self.offset
+            for line in self._read():
+                record = parse_line(line)
+                if record is None:
+                    self.skipped += 1
+                    continue
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+            if batch or self.offset < offset:
+                # More to read, or the log was rotated:
+                if batch:
+                    yield batch
+                continue
+            # Caught up: check for a new launch before waiting.
+            if self._resolve():
+                continue
+            if not self.follow:
+                record = parse_line(self._partial) if self._partial else None
+                if record is not None:
+                    self._partial = b''
+                    yield [record]
+                return
+            time.sleep(self.poll_interval)
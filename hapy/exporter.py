@@ -0,0 +1,336 @@
+'''
+A Prometheus exporter for Heritrix engines and their jobs.
+
+    hapy-exporter -u heritrix -p heritrix https://crawler1:8443 https://crawler2:8443
+
+A background thread polls every engine, then every job on it, at a fixed
+interval on a small pool of workers, and renders the results into the
+Prometheus text format once per round. `/metrics` serves the last rendered
+snapshot as it is, so scrapes never reach Heritrix and take the same time
+however many jobs there are.
+'''
+import sys
+import os
+import time
+import logging
+import threading
+
+from argparse import ArgumentParser
+from concurrent import futures
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from .hapy import Hapy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 15.0
+DEFAULT_WORKERS = 8
+DEFAULT_PORT = 9118
+DEFAULT_BURST = 5
+
+# (metric, type, help, JobInfo section, field), for every job:
+JOB_METRICS = (
+    ('heritrix_job_current_docs_per_second', 'gauge', 'Documents crawled per second, recently',
+     'rate_report', 'current_docs_per_second'),
+    ('heritrix_job_average_docs_per_second', 'gauge', 'Documents crawled per second, since launch',
+     'rate_report', 'average_docs_per_second'),
+    ('heritrix_job_current_kib_per_second', 'gauge', 'KiB crawled per second, recently',
+     'rate_report', 'current_kib_per_sec'),
+    ('heritrix_job_average_kib_per_second', 'gauge', 'KiB crawled per second, since launch',
+     'rate_report', 'average_kib_per_sec'),
+    ('heritrix_job_busy_threads', 'gauge', 'Toe threads busy fetching',
+     'load_report', 'busy_threads'),
+    ('heritrix_job_threads', 'gauge', 'Toe threads',
+     'load_report', 'total_threads'),
+    ('heritrix_job_congestion_ratio', 'gauge', 'Ratio of queues waiting to queues in progress',
+     'load_report', 'congestion_ratio'),
+    ('heritrix_job_average_queue_depth', 'gauge', 'Mean number of URLs per active queue',
+     'load_report', 'average_queue_depth'),
+    ('heritrix_job_deepest_queue_depth', 'gauge', 'URLs in the deepest queue',
+     'load_report', 'deepest_queue_depth'),
+    ('heritrix_job_downloaded_uris', 'counter', 'URLs downloaded',
+     'uri_totals', 'downloaded_uri_count'),
+    ('heritrix_job_queued_uris', 'gauge', 'URLs queued',
+     'uri_totals', 'queued_uri_count'),
+    ('heritrix_job_known_uris', 'gauge', 'URLs downloaded or queued',
+     'uri_totals', 'total_uri_count'),
+    ('heritrix_job_future_uris', 'gauge', 'URLs scheduled for later',
+     'uri_totals', 'future_uri_count'),
+    ('heritrix_job_novel_bytes', 'counter', 'Bytes of novel content',
+     'size_totals', 'novel'),
+    ('heritrix_job_novel_uris', 'counter', 'URLs with novel content',
+     'size_totals', 'novel_count'),
+    ('heritrix_job_dup_by_hash_bytes', 'counter', 'Bytes of content seen before, by hash',
+     'size_totals', 'dup_by_hash'),
+    ('heritrix_job_dup_by_hash_uris', 'counter', 'URLs with content seen before, by hash',
+     'size_totals', 'dup_by_hash_count'),
+    ('heritrix_job_not_modified_bytes', 'counter', 'Bytes of not-modified responses',
+     'size_totals', 'not_modified'),
+    ('heritrix_job_not_modified_uris', 'counter', 'URLs answered not-modified',
+     'size_totals', 'not_modified_count'),
+    ('heritrix_job_bytes', 'counter', 'Bytes crawled',
+     'size_totals', 'total'),
+    ('heritrix_job_uris', 'counter', 'URLs crawled',
+     'size_totals', 'total_count'),
+)
+
+# (metric, help, heap report field), for every engine. Jobs report the
+# same JVM's heap, so it is only exported once per engine:
+ENGINE_METRICS = (
+    ('heritrix_engine_heap_used_bytes', 'JVM heap in use', 'used_bytes'),
+    ('heritrix_engine_heap_total_bytes', 'JVM heap allocated', 'total_bytes'),
+    ('heritrix_engine_heap_max_bytes', 'JVM heap limit', 'max_bytes'),
+)
+
+# (metric, help, Resilience.stats() field), for every client with a policy:
+CLIENT_METRICS = (
+    ('heritrix_client_retries', 'Requests retried after a transient failure', 'retries'),
+    ('heritrix_client_hedges', 'Slow GETs sent a second time', 'hedges'),
+    ('heritrix_client_hedge_wins', 'Hedged GETs answered first by the second copy', 'hedge_wins'),
+    ('heritrix_client_circuit_opened', 'Times the circuit breaker opened', 'opened'),
+    ('heritrix_client_circuit_rejected', 'Calls turned away by the open circuit breaker', 'rejected'),
+)
+
+_FAMILIES = {'gauge': GaugeMetricFamily, 'counter': CounterMetricFamily}
+
+
+class _Families(object):
+    '''Stands in for a registry to hand ready-made families to `generate_latest`.'''
+
+    def __init__(self, families):
+        self.families = families
+
+    def collect(self):
+        return self.families
+
+
+def render(engines, jobs, elapsed=None, timestamp=None, clients=()):
+    '''
+    Returns the Prometheus text for one round of polling. `engines` holds
+    `(host, EngineInfo)` pairs and `jobs` `(host, job, JobInfo)` triples,
+    with None in place of the info where the call failed. `clients` holds
+    `(host, stats)` pairs of the clients' `Resilience.stats()`.
+    '''
+    engine_up = GaugeMetricFamily('heritrix_engine_up', 'Whether the engine answered', labels=['host'])
+    engine_metrics = [GaugeMetricFamily(name, doc, labels=['host']) for name, doc, field in ENGINE_METRICS]
+    for host, info in engines:
+        engine_up.add_metric([host], 1 if info is not None else 0)
+        if info is None:
+            continue
+        for family, (name, doc, field) in zip(engine_metrics, ENGINE_METRICS):
+            value = getattr(info.heap_report, field)
+            if value is not None:
+                family.add_metric([host], value)
+
+    labels = ['host', 'job']
+    job_up = GaugeMetricFamily('heritrix_job_up', 'Whether the job info could be read', labels=labels)
+    job_state = GaugeMetricFamily('heritrix_job_state', 'The crawl controller state, as a label',
+                                  labels=labels + ['state'])
+    job_metrics = [_FAMILIES[kind](name, doc, labels=labels) for name, kind, doc, section, field in JOB_METRICS]
+    for host, job, info in jobs:
+        job_up.add_metric([host, job], 1 if info is not None else 0)
+        if info is None:
+            continue
+        job_state.add_metric([host, job, info.crawl_controller_state or ''], 1)
+        for family, (name, kind, doc, section, field) in zip(job_metrics, JOB_METRICS):
+            value = getattr(getattr(info, section), field)
+            if value is not None:
+                family.add_metric([host, job], value)
+
+    families = [engine_up] + engine_metrics + [job_up, job_state] + job_metrics
+    if clients:
+        circuit = GaugeMetricFamily('heritrix_client_circuit_state', 'The circuit breaker state, as a label',
+                                    labels=['host', 'state'])
+        client_metrics = [CounterMetricFamily(name, doc, labels=['host']) for name, doc, field in CLIENT_METRICS]
+        for host, stats in clients:
+            circuit.add_metric([host, stats['state']], 1)
+            for family, (name, doc, field) in zip(client_metrics, CLIENT_METRICS):
+                family.add_metric([host], stats[field])
+        families += [circuit] + client_metrics
+    if elapsed is not None:
+        families.append(GaugeMetricFamily(
+            'heritrix_exporter_poll_seconds', 'Time taken by the last round of polling', value=elapsed))
+    if timestamp is not None:
+        families.append(GaugeMetricFamily(
+            'heritrix_exporter_last_poll_timestamp_seconds', 'When the last round of polling ended',
+            value=timestamp))
+    return generate_latest(_Families(families))
+
+
+class Exporter(object):
+
+    def __init__(self, endpoints, jobs=None, interval=DEFAULT_INTERVAL,
+                 max_workers=DEFAULT_WORKERS, **kwargs):
+        '''
+        `endpoints` holds `Hapy` instances or base URLs; URLs are turned into
+        clients with `kwargs` (username, password, ...) and, unless given, a
+        request timeout of one `interval`. Every job on each engine is
+        polled, or only those named in `jobs`.
+        '''
+        kwargs.setdefault('timeout', interval)
+        self.clients = []
+        for endpoint in endpoints:
+            if not isinstance(endpoint, Hapy):
+                endpoint = Hapy(endpoint, **kwargs)
+            self.clients.append(endpoint)
+        self.jobs = set(jobs) if jobs else None
+        self.interval = interval
+        self.snapshot = render([], [])
+        self.rounds = 0
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _host(h):
+        return h.base_url[:-len('/engine')]
+
+    def poll(self):
+        '''
+        Polls every engine and job once and replaces the snapshot. Job
+        calls for an engine are queued as soon as its job list arrives, so
+        one slow engine doesn't hold up the others.
+        '''
+        start = time.time()
+        pending = dict((self._executor.submit(h.get_info_model), h) for h in self.clients)
+        engines = []
+        jobs = {}
+        for future in futures.as_completed(pending):
+            h = pending[future]
+            host = self._host(h)
+            try:
+                info = future.result()
+            except Exception as e:
+                logger.warning("Could not poll %s: %s" % (host, e))
+                engines.append((host, None))
+                continue
+            engines.append((host, info))
+            for summary in info.jobs:
+                if self.jobs is None or summary.short_name in self.jobs:
+                    jobs[self._executor.submit(h.get_job_info_model, summary.short_name)] = (
+                        host, summary.short_name)
+        results = []
+        for future in futures.as_completed(jobs):
+            host, job = jobs[future]
+            try:
+                results.append((host, job, future.result()))
+            except Exception as e:
+                logger.warning("Could not poll %s job %s: %s" % (host, job, e))
+                results.append((host, job, None))
+        end = time.time()
+        clients = [(self._host(h), h.resilience.stats()) for h in self.clients if h.resilience is not None]
+        self.snapshot = render(sorted(engines, key=lambda e: e[0]), sorted(results, key=lambda j: j[:2]),
+                               elapsed=end - start, timestamp=end, clients=sorted(clients, key=lambda c: c[0]))
+        self.rounds += 1
+        return self.snapshot
+
+    def run(self):
+        '''Polls every `interval` seconds, measured from the start of each round, until `stop()`.'''
+        while not self._stop.is_set():
+            start = time.time()
+            try:
+                self.poll()
+            except Exception as e:
+                logger.exception("Polling failed: %s" % e)
+            self._stop.wait(max(0, self.interval - (time.time() - start)))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown(wait=False)
+        for h in self.clients:
+            h.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.exporter.snapshot
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE_LATEST)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+
+def make_server(exporter, port=DEFAULT_PORT, addr=''):
+    '''An HTTP server for `exporter`'s snapshot; call `serve_forever()` on it.'''
+    server = _Server((addr, port), _Handler)
+    server.exporter = exporter
+    return server
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Exports Heritrix engine and job metrics to Prometheus.')
+    parser.add_argument('endpoints', nargs='*', metavar='url',
+                        default=os.environ.get('HERITRIX_ENDPOINTS', 'https://localhost:8443').split(),
+                        help="Engines to poll [default: $HERITRIX_ENDPOINTS or %(default)s]")
+    parser.add_argument('-u', '--user', dest='user', default=os.environ.get('HERITRIX_USERNAME', 'heritrix'),
+                        help="H3 user to login with [default: %(default)s]")
+    parser.add_argument('-p', '--password', dest='password',
+                        default=os.environ.get('HERITRIX_PASSWORD', 'heritrix'),
+                        help="H3 user password [default: $HERITRIX_PASSWORD or heritrix]")
+    parser.add_argument('-j', '--job', dest='jobs', action='append',
+                        help="Only poll this job; may be repeated [default: every job]")
+    parser.add_argument('-i', '--interval', dest='interval', type=float, default=DEFAULT_INTERVAL,
+                        help="Seconds between polls [default: %(default)s]")
+    parser.add_argument('-w', '--workers', dest='workers', type=int, default=DEFAULT_WORKERS,
+                        help="Concurrent calls to Heritrix [default: %(default)s]")
+    parser.add_argument('-a', '--address', dest='address', default='',
+                        help="Address to listen on [default: all]")
+    parser.add_argument('-P', '--port', dest='port', type=int, default=DEFAULT_PORT,
+                        help="Port to serve /metrics on [default: %(default)s]")
+    parser.add_argument('-r', '--rate-limit', dest='rate_limit', type=float,
+                        help="Most requests per second to send each engine [default: no limit]")
+    parser.add_argument('-b', '--burst', dest='burst', type=int, default=DEFAULT_BURST,
+                        help="Requests that may go at once under --rate-limit [default: %(default)s]")
+    parser.add_argument('-R', '--resilient', dest='resilient', action='store_true',
+                        help="Retry failed calls, and stop calling engines that keep failing for a while")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    exporter = Exporter(args.endpoints, jobs=args.jobs, interval=args.interval,
+                        max_workers=args.workers, username=args.user, password=args.password,
+                        rate_limit=(args.rate_limit, args.burst) if args.rate_limit else None,
+                        resilience=True if args.resilient else None)
+    server = make_server(exporter, args.port, args.address)
+    with exporter:
+        logger.info("Serving metrics for %s on port %d" % (', '.join(args.endpoints), args.port))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
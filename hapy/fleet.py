@@ -0,0 +1,118 @@
+'''
+Fan-out calls across many Heritrix engines.
+
+Every call runs concurrently on a bounded thread pool and returns one
+`HostResult` per engine, so a slow or failing engine never fails the batch.
+'''
+import time
+import logging
+
+from collections import namedtuple
+from concurrent import futures
+
+from .hapy import Hapy
+
+logger = logging.getLogger(__name__)
+
+
+class HostResult(namedtuple('HostResult', ['host', 'value', 'error', 'elapsed'])):
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class HapyFleet(object):
+
+    def __init__(self, endpoints, max_workers=16, timeout=None, rate_limits=None, **kwargs):
+        '''
+        `endpoints` holds `Hapy` instances or base URLs; URLs are turned into
+        clients with `kwargs` (username, password, ...). `timeout` is the
+        per-host limit, in seconds, applied to every fan-out call.
+        `rate_limits` maps base URLs to the `rate_limit` of their client,
+        in place of any `rate_limit` in `kwargs`.
+        '''
+        self.timeout = timeout
+        self.engines = {}
+        for endpoint in endpoints:
+            if not isinstance(endpoint, Hapy):
+                options = dict(kwargs)
+                if rate_limits and endpoint in rate_limits:
+                    options['rate_limit'] = rate_limits[endpoint]
+                endpoint = Hapy(endpoint, timeout=timeout, **options)
+            self.engines[endpoint.base_url[:-len('/engine')]] = endpoint
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        for h in self.engines.values():
+            h.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.engines)
+
+    def map(self, fn, timeout=None):
+        '''
+        Calls `fn(hapy)` for every engine at once and returns a dict of
+        host to `HostResult`. Hosts that have not answered within `timeout`
+        (default: the fleet timeout) get a `TimeoutError`; their worker is
+        left to finish in the background.
+        '''
+        if timeout is None:
+            timeout = self.timeout
+        pending = {}
+        for host, h in self.engines.items():
+            pending[self._executor.submit(self._timed, fn, h)] = host
+        done, not_done = futures.wait(pending, timeout=timeout)
+        results = {}
+        for future in done:
+            host = pending[future]
+            value, error, elapsed = future.result()
+            if error is not None:
+                logger.warning("%s failed: %s" % (host, error))
+            results[host] = HostResult(host, value, error, elapsed)
+        for future in not_done:
+            host = pending[future]
+            logger.warning("%s timed out after %ss" % (host, timeout))
+            results[host] = HostResult(
+                host, None, futures.TimeoutError('%s timed out after %ss' % (host, timeout)), timeout)
+        return results
+
+    @staticmethod
+    def _timed(fn, h):
+        start = time.time()
+        try:
+            return fn(h), None, time.time() - start
+        except Exception as e:
+            return None, e, time.time() - start
+
+    def call(self, method, *args, **kwargs):
+        '''Calls the named `Hapy` method with the same arguments on every engine.'''
+        timeout = kwargs.pop('timeout', None)
+        return self.map(lambda h: getattr(h, method)(*args, **kwargs), timeout=timeout)
+
+    def get_info(self, timeout=None):
+        return self.call('get_info', timeout=timeout)
+
+    def get_job_info(self, name, timeout=None):
+        return self.call('get_job_info', name, timeout=timeout)
+
+    def pause_job(self, name, timeout=None):
+        return self.call('pause_job', name, timeout=timeout)
+
+    def unpause_job(self, name, timeout=None):
+        return self.call('unpause_job', name, timeout=timeout)
+
+    def checkpoint_job(self, name, timeout=None):
+        return self.call('checkpoint_job', name, timeout=timeout)
+
+    def execute_script(self, name, engine, script, parse=None, raw_only=False, timeout=None):
+        return self.call('execute_script', name, engine, script,
+                         parse=parse, raw_only=raw_only, timeout=timeout)
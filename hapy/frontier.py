@@ -0,0 +1,70 @@
+'''
+Paging through a job's pending URLs.
+
+Each page is one run of the pending-urls-page script, which walks the
+frontier's BDB database from the key after the previous page and prints a
+compact JSON row per URL and the key to continue from. `PendingUrl`s are
+made from the rows as they are iterated, so a full export of the frontier
+is one pass with one page held at a time on either side.
+'''
+import logging
+
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 10000
+
+
+class PendingUrl(namedtuple('PendingUrl', [
+        'queue', 'scheduling_directive', 'precedence', 'path_from_seed', 'uri', 'via'])):
+    '''
+    One queued URL. `queue` is its class key, and `scheduling_directive`
+    and `precedence` are ints; `via` is '' for seeds.
+    '''
+    __slots__ = ()
+
+
+def parse_page(result, page):
+    '''
+    Yields the `PendingUrl`s of a page of script output, then sets
+    `page['after']` to the key to continue from, or None at the end.
+    '''
+    page['after'] = None
+    if not result:
+        logger.warning("No output from the pending URLs script")
+        return
+    for row in result.get('urls', []):
+        yield PendingUrl(*row)
+    page['after'] = result.get('next')
+
+
+class PendingUrlPager(object):
+    '''
+    Iterating yields every `PendingUrl` of `job`, `page_size` at a time.
+
+    `after` is the frontier key the next page starts after. It moves on
+    once a page has been read to the end, so a pager created with the
+    `after` of an interrupted one picks up from the last complete page
+    (re-listing the URLs of a partly read page). The frontier changes as
+    the crawl runs, so a dump of a running crawl is not a snapshot.
+    '''
+
+    def __init__(self, hapy, job, page_size=DEFAULT_PAGE_SIZE, after=None):
+        self.hapy = hapy
+        self.job = job
+        self.page_size = page_size
+        self.after = after
+        self.pages = 0
+
+    def __iter__(self):
+        while True:
+            result = self.hapy.run_script(
+                self.job, 'pending-urls-page', after=self.after, page_size=self.page_size)
+            page = {}
+            for url in parse_page(result, page):
+                yield url
+            self.pages += 1
+            self.after = page['after']
+            if self.after is None:
+                return
@@ -36,9 +36,6 @@ from argparse import RawDescriptionHelpFormatter
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__),"..")))
 
-from jinja2 import Environment, PackageLoader
-env = Environment(loader=PackageLoader('hapy.h3cc', 'scripts'))
-
 __all__ = []
 __version__ = 0.1
 __date__ = '2016-01-16'
@@ -67,6 +64,14 @@ logger.setLevel( logging.INFO )
 H3_SCRIPTS_JOB = ["kill-all-toethreads", "pending-urls", "show-all-sheets", "show-decide-rules", "show-metadata", "surt-scope"]
 H3_SCRIPTS_JOB_URL = ["pending-urls-from", "url-status"]
 
+#
+# Commands that call the API directly:
+#
+H3_COMMANDS = ["status", "list-jobs", "job-summary", "job-build", "job-launch", "job-resume", "job-pause",
+               "job-unpause", "job-checkpoint", "job-terminate", "job-teardown", "job-status", "job-info",
+               "job-info-json", "job-cxml", "crawl-log-stats", "pending-urls-all", "queue-stats",
+               "url-status-batch", "fleet-restart"]
+
 #
 def main(argv=None):
     """
@@ -121,8 +126,21 @@ USAGE
                             help="URL to use for queries [default: %(default)s]")
         parser.add_argument('-l' '--query-limit', dest='query_limit', type=int, default=10,
                             help="Maximum number of results to return from queries [default: %(default)s]")
+        parser.add_argument('--log', dest='log', type=str, default=None,
+                            help="crawl.log file or URL to analyse [default: the job's current crawl.log]")
+        parser.add_argument('--url-file', dest='url_file', type=str, default=None,
+                            help="File of URLs, one per line, for url-status-batch [default: the query URL]")
+        parser.add_argument('--engines', dest='engines', type=str, default=None,
+                            help="Comma-separated host:port list for fleet-restart [default: --host and --port]")
+        parser.add_argument('--plan', dest='plan', type=str, default='rolling-restart',
+                            help="Lifecycle plan for fleet-restart, one of: start, restart, "
+                                 "checkpoint-teardown, rolling-restart [default: %(default)s]")
+        parser.add_argument('--parallelism', dest='parallelism', type=int, default=4,
+                            help="Jobs fleet-restart works on at once [default: %(default)s]")
+        parser.add_argument('--timings', dest='timings', action='store_true',
+                            help="Print where the time went in the calls to Heritrix, to stderr")
         parser.add_argument(dest="command", 
-                            help="Command to carry out. One of: " + ", ".join(H3_SCRIPTS_JOB + H3_SCRIPTS_JOB_URL) + ". [default: %(default)s]",
+                            help="Command to carry out. One of: " + ", ".join(H3_COMMANDS + H3_SCRIPTS_JOB + H3_SCRIPTS_JOB_URL) + ". [default: %(default)s]",
                             metavar="command")
 
         # Process arguments
@@ -133,59 +151,110 @@ USAGE
         if verbose > 0:
             logger.setLevel( logging.DEBUG )
 
+        # Time the calls to h3?
+        recorder = None
+        if args.timings:
+            from hapy.instrument import Recorder
+            recorder = Recorder()
+
         # talk to h3:
-        ha = hapy.Hapy("https://%s:%s" % (args.host, args.port), username=args.user, password=args.password)
+        clients = []
+        ha = hapy.Hapy("https://%s:%s" % (args.host, args.port), username=args.user, password=args.password,
+                       observer=recorder)
         job = args.job
 
-        # Commands:
-        command = args.command
-        if command == "status":
-            print(ha.get_info())
-        elif command == "list-jobs":
-            # FIXME Cope when singular hash or array of hashes
-            j = ha.get_info()['engine']['jobs']['value']
-            print(j['key'])
-        elif command == "job-summary":
-            # FIXME Cope when singular hash or array of hashes
-            for j in ha.get_info()['engine']['jobs']['value']:
-                if job == j['key']:
-                    print(j)
-        elif command == "job-build":
-            ha.build_job(job)
-        elif command == "job-launch":
-            ha.launch_job(job)
-        elif command == "job-resume":
-            ha.launch_from_latest_checkpoint(job)
-        elif command == "job-pause":
-            ha.pause_job(job)
-        elif command == "job-unpause":
-            ha.unpause_job(job)
-        elif command == "job-checkpoint":
-            ha.checkpoint_job(job)
-        elif command == "job-terminate":
-            ha.terminate_job(job)
-        elif command == "job-teardown":
-            ha.teardown_job(job)
-        elif command == "job-status":
-            print(ha.get_job_info(job)['job']['statusDescription'])
-        elif command == "job-info":
-            print(ha.get_job_info(job))
-        elif command == "job-info-json":
-            print(json.dumps(ha.get_job_info(job), indent=4))
-        elif command == "job-cxml":
-            print(ha.get_job_configuration(job))
-        elif command in H3_SCRIPTS_JOB:
-            template = env.get_template('%s.groovy' % command)
-            r = ha.execute_script(engine="groovy", 
-                script=template.render(), name=job)
-            print(r[0])
-        elif command in H3_SCRIPTS_JOB_URL:
-            template = env.get_template('%s.groovy' % command)
-            r = ha.execute_script(engine="groovy", 
-                script=template.render({ "url": args.query_url ,"limit": args.query_limit }), name=job)
-            print(r[0])
-        else:
-            logger.error("Can't understand command '%s'" % command)
+        try:
+            # Commands:
+            command = args.command
+            if command == "status":
+                print(ha.get_info())
+            elif command == "list-jobs":
+                for name in ha.list_jobs():
+                    print(name)
+            elif command == "job-summary":
+                summary = ha.job_index().get(job)
+                if summary is not None:
+                    print(summary.as_dict())
+            elif command == "job-build":
+                ha.build_job(job)
+            elif command == "job-launch":
+                ha.launch_job(job)
+            elif command == "job-resume":
+                ha.launch_from_latest_checkpoint(job)
+            elif command == "job-pause":
+                ha.pause_job(job)
+            elif command == "job-unpause":
+                ha.unpause_job(job)
+            elif command == "job-checkpoint":
+                ha.checkpoint_job(job)
+            elif command == "job-terminate":
+                ha.terminate_job(job)
+            elif command == "job-teardown":
+                ha.teardown_job(job)
+            elif command == "job-status":
+                print(ha.get_job_info(job)['job']['statusDescription'])
+            elif command == "job-info":
+                print(ha.get_job_info(job))
+            elif command == "job-info-json":
+                print(json.dumps(ha.get_job_info(job), indent=4))
+            elif command == "job-cxml":
+                print(ha.get_job_configuration(job))
+            elif command == "crawl-log-stats":
+                from hapy import analytics
+                if args.log is None:
+                    stats = analytics.analyse(ha.tail_crawl_log(job, follow=False))
+                elif args.log.startswith('http://') or args.log.startswith('https://'):
+                    stats = analytics.analyse(ha.read_log(args.log))
+                else:
+                    with open(args.log, 'rb') as f:
+                        stats = analytics.analyse(f)
+                print(json.dumps(stats.summary(top=args.query_limit), indent=4))
+            elif command == "pending-urls-all":
+                for url in ha.iter_pending_urls(job, page_size=max(args.query_limit, 1000)):
+                    print("\t".join(str(field) for field in url))
+            elif command == "queue-stats":
+                stats = ha.get_queue_stats(job, top=args.query_limit)
+                print(json.dumps(stats.totals, indent=4))
+                for row in stats:
+                    print("\t".join(str(field) for field in row))
+            elif command == "url-status-batch":
+                if args.url_file is None:
+                    urls = [args.query_url]
+                else:
+                    with open(args.url_file) as f:
+                        urls = [line.strip() for line in f if line.strip()]
+                print(json.dumps(ha.url_status_batch(job, urls), indent=4))
+            elif command == "fleet-restart":
+                from hapy import orchestrate
+                plan = orchestrate.PLANS[args.plan]
+                engines = (args.engines or "%s:%s" % (args.host, args.port)).split(',')
+                clients = [hapy.Hapy("https://%s" % engine, username=args.user, password=args.password,
+                                     observer=recorder)
+                           for engine in engines]
+                targets = orchestrate.find_targets(clients, job.split(','))
+
+                def report(host, name, step):
+                    print("%s\t%s\t%s\t%s\t%d\t%.1f\t%s" % (
+                        host, name, step.name, step.outcome, step.attempts, step.elapsed, step.error or ''))
+                results = orchestrate.run_plan(plan, targets, parallelism=args.parallelism, on_step=report)
+                for result in results:
+                    print("%s\t%s\t%s\t%.1f" % (result.host, result.job, 'ok' if result.ok else 'FAILED',
+                                                  result.elapsed))
+                if not all(result.ok for result in results):
+                    return 1
+            elif command in H3_SCRIPTS_JOB:
+                r = ha.run_script(job, command, limit=args.query_limit)
+                print(json.dumps(r, indent=4))
+            elif command in H3_SCRIPTS_JOB_URL:
+                r = ha.run_script(job, command, url=args.query_url, limit=args.query_limit)
+                print(json.dumps(r, indent=4))
+            else:
+                logger.error("Can't understand command '%s'" % command)
+        finally:
+            for client in [ha] + clients:
+                client.close()
+            if recorder is not None:
+                sys.stderr.write(recorder.summary())
 
         return 0
     except KeyboardInterrupt:
@@ -1,47 +1,383 @@
 import os
+import time
+import threading
+import contextvars
 
-from pkg_resources import resource_string
-from xml.etree import ElementTree
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    from urllib.parse import unquote, urlparse
+except ImportError:
+    from urllib import unquote
+    from urlparse import urlparse
 
 import requests
+import requests.adapters
 import requests.auth
 import logging
 
+from . import scripts, wait
+from .cache import MISS
+from .coalesce import SingleFlight
+from .crawllog import CrawlLogTailer
+from .frontier import DEFAULT_PAGE_SIZE, PendingUrlPager
+from .inject import DEFAULT_BATCH_SIZE, DEFAULT_MAX_BATCH_BYTES, UrlInjector
+from .instrument import add_connect, add_request, instrumented, parse_timed, take_connect
+from .limit import CONTROL, MONITOR, rate_limiter
+from .models import EngineInfo, JobInfo, JobStatus
+from .parse import (
+    RAW_ONLY_GROOVY,
+    _check_script_options,
+    _parse_info,
+    _script_result,
+    _tree_to_dict
+)
+from .queues import DEFAULT_TOP, QueueStats, check_sort_by
+from .resilience import resilience as resilience_policy
+from .urlstatus import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_SCAN,
+    url_status_batch
+)
+
 logger = logging.getLogger(__name__)
 
 HEADERS = {
     'accept': 'application/xml'
 }
 
+# A PUT answers 201 when it creates a file and 200 or 204 when it replaces one:
+PUT_CODES = (200, 201, 204)
+
 
 class HapyException(Exception):
 
     def __init__(self, r):
+        # requests calls the payload 'body', httpx calls it 'content':
+        body = getattr(r.request, 'body', None)
+        if body is None:
+            body = getattr(r.request, 'content', None)
+        self.status_code = r.status_code
         super(HapyException, self).__init__(
             ('HapyException: '
              'request(url=%s, method=%s, data=%s), '
              'response(code=%d, text=%s)') % (
-                r.url, r.request.method, r.request.body,
+                r.url, r.request.method, body,
                 r.status_code, r.text
             )
         )
 
 
-class Hapy:
+class CallInfo(namedtuple('CallInfo', ['method', 'url', 'status', 'elapsed', 'bytes'])):
+    '''
+    One HTTP call to the engine: its method, URL, response status, time
+    taken in seconds and response body size (None for streamed bodies).
+    '''
+    __slots__ = ()
+
+
+# The (client, list) pairs of the `capture()` blocks the current thread or
+# asyncio task is in. Each thread and task starts with its own context, so
+# callers never see each other's calls:
+_captures = contextvars.ContextVar('hapy_captures', default=())
+
+
+@contextmanager
+def _capture(client):
+    calls = []
+    token = _captures.set(_captures.get() + ((client, calls),))
+    try:
+        yield calls
+    finally:
+        _captures.reset(token)
+
+
+def _call_info(r, start, streamed=False):
+    content = None if streamed else r.content
+    return CallInfo(r.request.method, str(r.url), r.status_code, time.perf_counter() - start,
+                    len(content) if isinstance(content, bytes) else None)
+
+
+def _record(client, info):
+    for owner, calls in _captures.get():
+        if owner is client:
+            calls.append(info)
+
+
+def _check_response(r, code):
+    '''`code` is the status expected, or a tuple of the statuses allowed.'''
+    if r.status_code not in (code if isinstance(code, tuple) else (code,)):
+        raise HapyException(r)
+    return r
+
+
+def _cache_key(engine_path, url):
+    '''
+    Returns the cache (kind, job) of a URL: the engine page, a job page, or
+    some other file, which may belong to a job directory.
+    '''
+    path = urlparse(url).path.rstrip('/')
+    if path == engine_path:
+        return 'engine', None
+    prefix = '%s/job/' % engine_path
+    if path.startswith(prefix):
+        parts = path[len(prefix):].split('/', 1)
+        return ('job' if len(parts) == 1 else 'file'), unquote(parts[0])
+    return 'file', None
+
+
+def _is_action(url):
+    '''
+    Whether a POST to `url` acts on a job or the engine, as opposed to
+    running a script, which leaves the job pages as they were.
+    '''
+    return not urlparse(url).path.rstrip('/').endswith('/script')
+
+
+def _counting_pool(cls):
+    '''
+    Subclasses a urllib3 connection pool so it counts the TCP connections
+    it actually opens (urllib3 silently reconnects dropped connections, so
+    its own num_connections undercounts).
+    '''
+
+    class CountingPool(cls):
+        num_connects = 0
+        _count_lock = threading.Lock()
+
+        def _new_conn(self):
+            conn = super(CountingPool, self)._new_conn()
+            connect = conn.connect
 
-    def __init__(self, base_url, username=None, password=None, insecure=True, timeout=None):
+            def counting_connect(*args, **kwargs):
+                with self._count_lock:
+                    self.num_connects += 1
+                start = time.perf_counter()
+                try:
+                    return connect(*args, **kwargs)
+                finally:
+                    add_connect(time.perf_counter() - start)
+            conn.connect = counting_connect
+            return conn
+
+    return CountingPool
+
+
+class _CountingAdapter(requests.adapters.HTTPAdapter):
+    '''
+    HTTPAdapter that keeps the connection counts of the urllib3 pools it
+    owns, including pools that have been evicted or closed.
+    '''
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(_CountingAdapter, self).init_poolmanager(*args, **kwargs)
+        self._retired = [0, 0]
+        manager = self.poolmanager
+        manager.pool_classes_by_scheme = dict(
+            (scheme, _counting_pool(cls))
+            for scheme, cls in manager.pool_classes_by_scheme.items()
+        )
+        dispose = manager.pools.dispose_func
+
+        def retire(pool):
+            self._retired[0] += pool.num_connects
+            self._retired[1] += pool.num_requests
+            if dispose is not None:
+                dispose(pool)
+        manager.pools.dispose_func = retire
+
+    def connection_counts(self):
+        opened, sent = self._retired
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connects
+                sent += pool.num_requests
+        return opened, sent
+
+
+@instrumented
+class Hapy:
+    '''
+    A client for one Heritrix engine. One instance can be shared by many
+    threads: they share its connection pool and cache, while each thread
+    sees only its own responses in `lastresponse` and `capture()`.
+    '''
+
+    def __init__(self, base_url, username=None, password=None, insecure=True, timeout=None,
+                 pool_connections=10, pool_maxsize=10, max_retries=0, keep_alive=True,
+                 index_ttl=2.0, cache=None, coalesce=True, rate_limit=None, resilience=None,
+                 observer=None):
+        '''
+        Pass a `hapy.cache.ResponseCache` as `cache` to reuse recent GET
+        responses and derived lookups; actions sent through this client
+        drop the affected entries.
+
+        With `coalesce`, identical GETs made by several threads at once
+        share one request, and identical lookups (`get_info`,
+        `get_job_info`, `get_job_status`...) share one parsed result: the
+        callers get the same object back, so it shouldn't be modified.
+        See `hapy.coalesce`.
+
+        `rate_limit` caps the request rate to the engine, with actions
+        served ahead of page reads and scripts: pass a
+        `hapy.limit.RateLimiter`, which may be shared with other clients,
+        or a `(rate, burst)` pair. It is available as `limiter`.
+
+        `resilience` retries failed requests, hedges slow GETs and stops
+        calling an engine that keeps failing: pass a
+        `hapy.resilience.Resilience`, True for the default policy, or a
+        dict of `Resilience` keyword arguments. See `hapy.resilience`.
+
+        An `observer` (e.g. a `hapy.instrument.Recorder`) is told how long
+        each method call took, split into connecting, waiting on the
+        engine, downloading and parsing. See `hapy.instrument`.
+        '''
         if base_url.endswith('/'):
             base_url = base_url[:-1]
         self.base_url = '%s/engine' % base_url
+        self._engine_path = urlparse(self.base_url).path
+        self.cache = cache
         if None not in [username, password]:
+            # One auth object for the lifetime of the client, so the digest
+            # nonce from the first challenge is reused by later requests:
             self.auth = requests.auth.HTTPDigestAuth(username, password)
         else:
             self.auth = None
         self.insecure = insecure
         self.timeout = timeout
+        self._adapter = _CountingAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=max_retries
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', self._adapter)
+        self.session.mount('https://', self._adapter)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+        self.index_ttl = index_ttl
+        self._job_index = None
+        self._acted_at = None
+        self._local = threading.local()
+        self._flights = SingleFlight() if coalesce else None
+        self.limiter = rate_limiter(rate_limit)
+        self.resilience = resilience_policy(resilience)
+        self.observer = observer
+
+    def close(self):
+        self.session.close()
+
+    @property
+    def lastresponse(self):
+        '''The last response received by the calling thread, or None.'''
+        return getattr(self._local, 'response', None)
+
+    @property
+    def last_call(self):
+        '''The `CallInfo` of the calling thread's last request, or None.'''
+        return getattr(self._local, 'call', None)
+
+    def capture(self):
+        '''
+        Returns a context manager that collects a `CallInfo` for each
+        request the calling thread makes through this client in the block:
+
+            with h.capture() as calls:
+                h.get_job_info('frequent')
+            print(calls[0].status, calls[0].elapsed, calls[0].bytes)
+        '''
+        return _capture(self)
+
+    def _record(self, r, start, streamed=False):
+        info = _call_info(r, start, streamed)
+        self._local.response = r
+        self._local.call = info
+        _record(self, info)
+        connect = take_connect()
+        if self.observer is not None:
+            # requests times each response up to its headers:
+            headers = sum((h.elapsed for h in r.history), r.elapsed).total_seconds()
+            add_request(self.observer, r.request.method, info.elapsed, connect,
+                        max(headers - connect, 0.0), info.bytes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def connection_stats(self):
+        '''
+        Returns a dict with the number of connections opened, the number of
+        requests sent and how many of those reused an existing connection.
+        '''
+        opened, sent = self._adapter.connection_counts()
+        return dict(
+            opened=opened,
+            requests=sent,
+            reused=max(sent - opened, 0)
+        )
 
-    def _http_post(self, url, data, code=200):
-        r = requests.post(
+    def coalesce_stats(self):
+        '''
+        Returns a dict of the number of coalescable calls (GETs and
+        lookups), how many of them shared another thread's call, and how
+        many are in flight.
+        '''
+        if self._flights is None:
+            return dict(calls=0, coalesced=0, in_flight=0)
+        return self._flights.stats()
+
+    def _coalesce(self, key, fn):
+        if self._flights is None:
+            return fn()
+        return self._flights.do(key, fn)
+
+    def _invalidate(self, url):
+        self._job_index = None
+        if self._flights is not None:
+            self._flights.forget()
+        if self.cache is not None:
+            self.cache.invalidate(_cache_key(self._engine_path, url)[1])
+
+    def _lookup(self, kind, job, fetch):
+        if self.cache is None:
+            return fetch()
+        value = self.cache.get(kind, job, kind)
+        if value is MISS:
+            value = fetch()
+            self.cache.put(kind, job, kind, value)
+        return value
+
+    def _config_url(self, name):
+        return self._lookup('config_url', name,
+                            lambda: self.get_job_info(name)['job']['primaryConfigUrl'])
+
+    def _jobs_dir(self):
+        return self._lookup('jobs_dir', None,
+                            lambda: self.get_info()['engine']['jobsDir'])
+
+    def _throttle(self, priority):
+        if self.limiter is not None:
+            self.limiter.acquire(priority)
+
+    def _resilient(self, fn, idempotent=True, hedge=False):
+        if self.resilience is None:
+            return fn()
+        return self.resilience.call(fn, idempotent, hedge)
+
+    def _http_post(self, url, data, code=200, priority=CONTROL):
+        # Actions aren't idempotent, so they are only retried if they never got there:
+        return self._resilient(lambda: self._send_post(url, data, code, priority), idempotent=False)
+
+    def _send_post(self, url, data, code, priority):
+        self._throttle(priority)
+        start = time.perf_counter()
+        r = self.session.post(
             url=url,
             data=data,
             headers=HEADERS,
@@ -50,26 +386,55 @@ class Hapy:
             allow_redirects=False,
             timeout=self.timeout
         )
-        self.lastresponse = r
-        if r.status_code != code:
-            raise HapyException(r)
+        self._record(r, start)
+        if _is_action(url):
+            self._invalidate(url)
+            self._acted_at = time.monotonic()
+        return _check_response(r, code)
+
+    def _http_get(self, url, code=200, fresh=False):
+        '''GETs `url`, or takes it from the cache unless `fresh` is set.'''
+        if self.cache is not None:
+            kind, job = _cache_key(self._engine_path, url)
+            r = MISS if fresh else self.cache.get(kind, job, url)
+            if r is not MISS:
+                return r
+        r, self._local.call = self._coalesce(('GET', url, code), lambda: self._resilient(
+            lambda: self._get(url, code), hedge=True))
+        self._local.response = r
+        if self.cache is not None:
+            self.cache.put(kind, job, url, r)
         return r
 
-    def _http_get(self, url, code=200):
-        r = requests.get(
+    def _get(self, url, code):
+        '''
+        Returns the checked response to a GET of `url` and its `CallInfo`,
+        for `_http_get` to record in the calling thread: with hedging or
+        coalescing the request may be made in another thread.
+        '''
+        r = _check_response(self._fetch(url), code)
+        return r, self._local.call
+
+    def _fetch(self, url):
+        self._throttle(MONITOR)
+        start = time.perf_counter()
+        r = self.session.get(
             url=url,
             headers=HEADERS,
             auth=self.auth,
             verify=not self.insecure,
             timeout=self.timeout
         )
-        self.lastresponse = r
-        if r.status_code != code:
-            raise HapyException(r)
+        self._record(r, start)
         return r
 
-    def _http_put(self, url, data, code=200):
-        r = requests.put(
+    def _http_put(self, url, data, code=PUT_CODES):
+        return self._resilient(lambda: self._send_put(url, data, code))
+
+    def _send_put(self, url, data, code):
+        self._throttle(CONTROL)
+        start = time.perf_counter()
+        r = self.session.put(
             url=url,
             data=data,
             headers=HEADERS,
@@ -77,8 +442,29 @@ class Hapy:
             verify=not self.insecure,
             timeout=self.timeout
         )
-        self.lastresponse = r
-        if r.status_code != code:
+        self._record(r, start)
+        self._invalidate(url)
+        return _check_response(r, code)
+
+    def _http_get_range(self, url, start, end=None):
+        '''
+        GETs bytes `start` to `end` (inclusive; default the last byte) of
+        `url` and returns the response unread, for streaming. Besides 206,
+        the caller deals with 200 (no Range support), 404 and 416 (nothing
+        at `start`).
+        '''
+        self._throttle(MONITOR)
+        began = time.perf_counter()
+        r = self.session.get(
+            url=url,
+            headers={'Range': 'bytes=%d-%s' % (start, '' if end is None else end)},
+            auth=self.auth,
+            verify=not self.insecure,
+            timeout=self.timeout,
+            stream=True
+        )
+        self._record(r, began, streamed=True)
+        if r.status_code not in (200, 206, 404, 416):
             raise HapyException(r)
         return r
 
@@ -184,131 +570,236 @@ class Hapy:
             code=303
         )
 
-    def execute_script(self, name, engine, script):
+    def execute_script(self, name, engine, script, parse=None, raw_only=False):
+        '''
+        Returns `(raw, html)` output by default. With `parse='raw'` only the
+        raw output is returned, and with `parse='json'` the raw output
+        decoded as JSON (None if there was none). `raw_only` drops anything
+        a Groovy script writes to htmlOut, so the engine doesn't send it.
+        '''
+        _check_script_options(engine, parse, raw_only)
+        if raw_only:
+            script = RAW_ONLY_GROOVY + script
         r = self._http_post(
             url='%s/job/%s/script' % (self.base_url, name),
             data=dict(
                 engine=engine,
                 script=script
             ),
-            code=200
+            code=200,
+            priority=MONITOR
         )
-        tree = ElementTree.fromstring(r.content)
-        raw = tree.find('rawOutput')
-        if raw is not None:
-            raw = raw.text
-        html = tree.find('htmlOutput')
-        if html is not None:
-            html = html.text
-        return raw, html
+        return parse_timed(self, lambda content: _script_result(content, parse), r.content)
+
+    def run_script(self, job, name, parse='json', **params):
+        '''
+        Runs the bundled Groovy script `name` (see `hapy.scripts.names()`)
+        in `job`, with `params` available to it as the `params` map. The
+        bundled scripts print JSON, which is returned decoded; pass `parse`
+        as for `execute_script` to get the output as it is.
+        '''
+        return self.execute_script(job, 'groovy', scripts.render(name, **params),
+                                   parse=parse, raw_only=True)
 
     def submit_configuration(self, name, cxml):
-        info = self.get_job_info(name)
-        url = info['job']['primaryConfigUrl']
+        url = self._config_url(name)
         self._http_put(
             url=url,
-            data=cxml,
-            code=200
+            data=cxml
         )
 
     # End of documented API calls, here are some useful extras
 
     def __tree_to_dict(self, tree):
-        if len(tree) == 0:
-            return {tree.tag: tree.text}
-        D = {}
-        for child in tree:
-            d = self.__tree_to_dict(child)
-            tag = next(iter(d))
-            try:
-                try:
-                    D[tag].append(d[tag])
-                except AttributeError:
-                    D[tag] = [D[tag], d[tag]]
-            except KeyError:
-                D[tag] = d[tag]
-        return {tree.tag: D}
+        return _tree_to_dict(tree)
+
+    def _get_parsed(self, url, parse, fresh=False):
+        return self._coalesce((parse, url, fresh), lambda: parse_timed(
+            self, parse, self._http_get(url, fresh=fresh).content))
 
     def get_info(self):
-        r = self._http_get(self.base_url)
-        return self.__tree_to_dict(ElementTree.fromstring(r.content))
+        return self._get_parsed(self.base_url, _parse_info)
 
     def get_job_info(self, name):
-        r = self._http_get('%s/job/%s' % (self.base_url, name))
-        return self.__tree_to_dict(ElementTree.fromstring(r.content))
+        return self._get_parsed('%s/job/%s' % (self.base_url, name), _parse_info)
+
+    def get_info_model(self):
+        return self._get_parsed(self.base_url, EngineInfo.from_xml)
+
+    def get_job_info_model(self, name):
+        return self._get_parsed('%s/job/%s' % (self.base_url, name), JobInfo.from_xml)
 
     def get_job_configuration(self, name):
-        info = self.get_job_info(name)
-        url = info['job']['primaryConfigUrl']
+        url = self._config_url(name)
         r = self._http_get(
             url=url
         )
         return r.content
 
     def delete_job(self, name):
-        script = resource_string(__name__, 'scripts/delete_job.groovy')
-        self.execute_script(name, 'groovy', script)
-        info = self.get_info()
-        jdir = info['engine']['jobsDir']
+        self.run_script(name, 'delete_job')
+        jdir = self._jobs_dir()
         jobpath = os.path.join(jdir, '%s.jobpath' % name)
         if os.path.isfile(jobpath):
             os.remove(jobpath)
         self.rescan_job_directory()
+        if self.cache is not None:
+            self.cache.invalidate(name, everything=True)
+
+    def get_job_status(self, name):
+        '''
+        Returns a `JobStatus` tuple of the job's state, status description
+        and available actions, parsing only as much of the job page as
+        needed to find them.
+        '''
+        return self._get_parsed('%s/job/%s' % (self.base_url, name), JobStatus.from_xml)
 
     def status(self, job=""):
-        info = self.get_job_info(job)
-        if info.has_key('job'):
-            status = info['job'].get("crawlControllerState", "")
-        else:
-            status = ""
-        return status
+        return self.get_job_status(job).state or ""
+
+    def job_index(self, max_age=None):
+        '''
+        Returns a dict of job shortName to `JobSummary` (state, launch count,
+        profile flag...) built from one `get_info` call. The index is reused
+        for `max_age` seconds, by default the client's `index_ttl`, and
+        dropped by any action POSTed to the engine. With a `max_age` of 0
+        the engine page is fetched afresh, bypassing the response cache.
+        '''
+        if max_age is None:
+            max_age = self.index_ttl
+        cached = self._job_index
+        if cached is not None and time.monotonic() - cached[0] < max_age:
+            return cached[1]
+        index = self._get_parsed(self.base_url, EngineInfo.from_xml, fresh=max_age <= 0).job_index()
+        self._job_index = (time.monotonic(), index)
+        return index
 
     def list_jobs(self, status=None):
-        r = self._http_get(self.base_url)
-        xml = ElementTree.fromstring(r.content)
-        if status is None:
-            return [job.find("shortName").text for job in xml.xpath("//jobs/value")]
-        else:
-            return [job.find("shortName").text for job in xml.xpath("//jobs/value[./crawlControllerState = '%s']" % status)]
+        return [name for name, job in self.job_index().items()
+                if status is None or job.crawl_controller_state == status]
+
+    def wait_for_states(self, targets, timeout=None):
+        '''
+        Waits until every job in the dict `targets` is in its state, or one
+        of its iterable of states, and returns a dict of job to `JobInfo`.
+        All the jobs are checked with one request to the engine per poll.
+        Raises TimeoutError after `timeout` seconds.
+        '''
+        waiter = wait.StateWaiter(targets, timeout, wait.recent(self._acted_at))
+        delay = waiter.update(self.job_index(max_age=0))
+        while delay is not None:
+            time.sleep(delay)
+            delay = waiter.update(self.job_index(max_age=0))
+        return dict((job, self._fresh_job_info(job)) for job in targets)
+
+    def wait_for_state(self, job, states, timeout=None):
+        '''
+        Waits until `job`'s crawlControllerState is `states`, or one of
+        them, e.g. `('PAUSED', 'FINISHED')`, and returns its `JobInfo`.
+        '''
+        return self.wait_for_states({job: states}, timeout)[job]
+
+    def wait_for_action(self, job, action, timeout=None):
+        '''Waits until `job` offers `action` (e.g. 'launch') and returns its `JobInfo`.'''
+        waiter = wait.ActionWaiter(job, action, timeout, wait.recent(self._acted_at))
+        url = '%s/job/%s' % (self.base_url, job)
+        delay = waiter.update(self._get_parsed(url, JobStatus.from_xml, fresh=True))
+        while delay is not None:
+            time.sleep(delay)
+            delay = waiter.update(self._get_parsed(url, JobStatus.from_xml, fresh=True))
+        return self._fresh_job_info(job)
+
+    def _fresh_job_info(self, job):
+        '''The job's `JobInfo`, never from the cache: waits poll live state.'''
+        return self._get_parsed('%s/job/%s' % (self.base_url, job), JobInfo.from_xml, fresh=True)
 
     def get_launch_id(self, job=""):
-        raw, html = self.execute_script(job,"groovy","rawOut.println( appCtx.getCurrentLaunchId() );")
-        if raw:
-            raw = raw.strip()
-        return raw
-
-    def get_seeds( self, job ):
-        url = "%s/job/%s/jobdir/latest/seeds.txt" % ( self.host, job )
-        r = requests.get( url, auth=requests.auth.HTTPDigestAuth( self.user, self.passwd ), verify=self.verify )
-        seeds = [ seed.strip() for seed in r.iter_lines() ]
-        for i, seed in enumerate( seeds ):
-            if seed.startswith( "#" ):
-                return seeds[ 0:i ]
+        result = self.run_script(job, 'launch-id')
+        return result.get('launch_id') if result else None
+
+    def tail_crawl_log(self, job, batch_size=1000, poll_interval=5.0, from_start=True, follow=True):
+        '''
+        Follows the crawl.log of the job's current launch, yielding lists of
+        `hapy.crawllog.CrawlLogRecord`. See `hapy.crawllog.CrawlLogTailer`.
+        '''
+        return iter(CrawlLogTailer(self, job, batch_size=batch_size, poll_interval=poll_interval,
+                                   from_start=from_start, follow=follow))
+
+    def read_log(self, url):
+        '''
+        Iterates over the lines, as bytes, of a log (or any other file) the
+        engine serves at `url`, e.g. an older crawl.log of a job. Raises
+        `HapyException` if it can't be read from the start.
+        '''
+        r = self._http_get_range(url, 0)
+        if r.status_code not in (200, 206):
+            raise HapyException(r)
+        return r.iter_lines()
+
+    def iter_pending_urls(self, job, page_size=DEFAULT_PAGE_SIZE, after=None):
+        '''
+        Iterates over every URL queued in the job's frontier, as
+        `hapy.frontier.PendingUrl`s, fetching `page_size` at a time. The
+        returned `hapy.frontier.PendingUrlPager` keeps the key to resume
+        from in `after`.
+        '''
+        return PendingUrlPager(self, job, page_size=page_size, after=after)
+
+    def get_queue_stats(self, job, top=DEFAULT_TOP, sort_by='size'):
+        '''
+        Returns a `hapy.queues.QueueStats` with totals over all of the job's
+        work queues and the `top` queues by `sort_by` (e.g. 'size', 'spent',
+        'errors' or 'wake_time'), all worked out inside the engine.
+        '''
+        check_sort_by(sort_by)
+        return QueueStats.from_json(self.run_script(job, 'queue-stats', top=top, sort_by=sort_by))
+
+    def url_status_batch(self, job, urls, chunk_size=DEFAULT_CHUNK_SIZE,
+                         concurrency=DEFAULT_CONCURRENCY, max_scan=DEFAULT_MAX_SCAN):
+        '''
+        Returns a dict of URL to its status in the job: its `queue`, whether
+        it is `pending` in the frontier (None if not found within the first
+        `max_scan` URLs of a long queue) and its fetch `history`. URLs are
+        looked up `chunk_size` at a time, one script run per chunk, with up
+        to `concurrency` chunks in flight. See `hapy.urlstatus`.
+        '''
+        return url_status_batch(self, job, urls, chunk_size=chunk_size,
+                                concurrency=concurrency, max_scan=max_scan)
+
+    def get_seeds(self, job):
+        r = self._http_get("%s/job/%s/jobdir/latest/seeds.txt" % (self.base_url, job))
+        seeds = [seed.strip() for seed in r.text.splitlines()]
+        for i, seed in enumerate(seeds):
+            if seed.startswith("#"):
+                return seeds[0:i]
         return seeds
 
-    def empty_frontier( self, job ):
-        script = "count = job.crawlController.frontier.deleteURIs( \".*\", \"^.*\" )\nrawOut.println count"
-        xml = self.execute_script(job, "groovy", script)
-        tree = ElementTree.fromstring( xml.content )
-        return tree.find( "rawOutput" ).text.strip()
+    def inject_urls(self, job, urls, force_fetch=False, is_seed=False, method='action',
+                    batch_size=DEFAULT_BATCH_SIZE, max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+                    callback=None):
+        '''
+        Adds the URLs from the iterable `urls` to the running `job`, in
+        batches of at most `batch_size` URLs or `max_batch_bytes` bytes, as
+        gzipped files in the action directory (`method='action'`) or through
+        a Groovy script (`method='script'`). Returns the list of
+        `hapy.inject.InjectBatch`es sent; `callback` is called with each as
+        it completes. See `hapy.inject.UrlInjector`.
+        '''
+        return UrlInjector(self, job, force_fetch=force_fetch, is_seed=is_seed, method=method,
+                           batch_size=batch_size, max_batch_bytes=max_batch_bytes,
+                           callback=callback).inject(urls)
+
+    def empty_frontier(self, job):
+        '''Deletes every queued URL of the job; returns how many were deleted.'''
+        result = self.run_script(job, 'empty-frontier')
+        return result.get('deleted') if result else None
 
     def launch_from_latest_checkpoint(self, job):
-        info = self.get_job_info(job)
-        if info.has_key('job'):
-            checkpoints = info['job'].get("checkpointFiles").get("value", [])
-        else:
-            checkpoints = []
-
-        if len(checkpoints) == 0:
+        checkpoint = self.get_job_info_model(job).checkpoints.latest
+        if checkpoint is None:
             logger.info("No checkpoint found. Lauching as new job...")
             self.launch_job(job)
         else:
-            # Select the most recent checkpoint:
-            if isinstance(checkpoints, list):
-                checkpoint = checkpoints[0]
-            else:
-                # H3 doesn't return an array if there is only one checkpoint!
-                checkpoint = checkpoints
             logger.info("Launching from checkpoint %s..." %  checkpoint)
             # And launch:
             self._http_post(
@@ -0,0 +1,350 @@
+'''
+A compact on-disk history of job snapshots.
+
+Only the numeric fields of each `JobInfo` are kept, as fixed-point int64
+columns. Rows are buffered in `array`s and written out `chunk_size` rows
+at a time. Each column of a chunk is delta-encoded, byte-shuffled and
+zlib-compressed, so slowly-changing counters take a few bits per snapshot.
+Chunk files are read through `mmap`, and their headers hold their time
+range, so a query only decompresses the columns and chunks it needs.
+
+    history = History('/data/history/frequent')
+    record(h, 'frequent', history, interval=10, stop=stop_event)
+    ...
+    columns = History('/data/history/frequent').read(['busy_threads'], start=time.time() - 86400)
+'''
+import os
+import json
+import mmap
+import time
+import zlib
+import struct
+import logging
+
+from array import array
+
+import numpy as np
+
+from .models import JobInfo
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 8640
+
+# (column, JobInfo section, field, scale); values are stored as
+# round(value * scale), so rates and ratios keep three decimal places:
+FIELDS = (
+    ('current_docs_per_second', 'rate_report', 'current_docs_per_second', 1000),
+    ('average_docs_per_second', 'rate_report', 'average_docs_per_second', 1000),
+    ('current_kib_per_sec', 'rate_report', 'current_kib_per_sec', 1000),
+    ('average_kib_per_sec', 'rate_report', 'average_kib_per_sec', 1000),
+    ('busy_threads', 'load_report', 'busy_threads', 1),
+    ('total_threads', 'load_report', 'total_threads', 1),
+    ('congestion_ratio', 'load_report', 'congestion_ratio', 1000),
+    ('average_queue_depth', 'load_report', 'average_queue_depth', 1000),
+    ('deepest_queue_depth', 'load_report', 'deepest_queue_depth', 1),
+    ('heap_used_bytes', 'heap_report', 'used_bytes', 1),
+    ('heap_total_bytes', 'heap_report', 'total_bytes', 1),
+    ('heap_max_bytes', 'heap_report', 'max_bytes', 1),
+    ('downloaded_uri_count', 'uri_totals', 'downloaded_uri_count', 1),
+    ('queued_uri_count', 'uri_totals', 'queued_uri_count', 1),
+    ('total_uri_count', 'uri_totals', 'total_uri_count', 1),
+    ('future_uri_count', 'uri_totals', 'future_uri_count', 1),
+)
+COLUMNS = tuple(f[0] for f in FIELDS)
+
+# Stored for missing and NaN values; reads turn it back into NaN:
+MISSING = -2 ** 63
+
+_MAGIC = b'HHC1'
+# magic, rows, columns, first and last timestamp (ms):
+_HEADER = struct.Struct('<4sIIqq')
+# offset and length of each column's block:
+_BLOCK = struct.Struct('<QQ')
+
+AGGREGATES = ('mean', 'min', 'max', 'last')
+
+
+def encode(values):
+    '''Delta-encodes, byte-shuffles and compresses an int64 array.'''
+    deltas = np.diff(values, prepend=np.int64(0))
+    # Small deltas leave the high bytes zero; grouping them makes long runs:
+    shuffled = deltas.astype('<i8').view(np.uint8).reshape(-1, 8).T
+    return zlib.compress(shuffled.tobytes())
+
+
+def decode(block, rows):
+    '''The int64 array of `rows` values from an `encode`d block.'''
+    shuffled = np.frombuffer(zlib.decompress(block), dtype=np.uint8).reshape(8, rows)
+    deltas = np.ascontiguousarray(shuffled.T).view('<i8').reshape(rows)
+    # Deltas wrap around at int64, so the sums undo them exactly:
+    return np.cumsum(deltas, dtype=np.int64)
+
+
+def _fixed(value, scale):
+    if value is None or value != value:
+        return MISSING
+    return int(round(value * scale))
+
+
+def _float_column(values, scale):
+    result = values.astype(np.float64)
+    result[values == MISSING] = np.nan
+    if scale != 1:
+        result /= scale
+    return result
+
+
+class Chunk(object):
+    '''One chunk file, mapped into memory. Columns are decoded on request.'''
+    __slots__ = ('path', 'rows', 'first', 'last', 'blocks', '_file', '_map')
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.rows, columns, self.first, self.last = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError("%s is not a history chunk" % path)
+        self.blocks = [_BLOCK.unpack_from(self._map, _HEADER.size + i * _BLOCK.size)
+                       for i in range(columns)]
+
+    @classmethod
+    def write(cls, path, timestamps, columns):
+        '''Writes the int64 `timestamps` and `columns` to a new chunk file at `path`.'''
+        blocks = [encode(timestamps)] + [encode(c) for c in columns]
+        offset = _HEADER.size + len(blocks) * _BLOCK.size
+        tmp = '%s.tmp' % path
+        with open(tmp, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, len(timestamps), len(blocks),
+                                 int(timestamps[0]), int(timestamps[-1])))
+            for block in blocks:
+                f.write(_BLOCK.pack(offset, len(block)))
+                offset += len(block)
+            for block in blocks:
+                f.write(block)
+        # Readers never see a half-written chunk:
+        os.rename(tmp, path)
+        return cls(path)
+
+    def column(self, i):
+        '''Column `i` as int64; 0 is the timestamps.'''
+        offset, length = self.blocks[i]
+        return decode(self._map[offset:offset + length], self.rows)
+
+    def overlaps(self, start, end):
+        return (start is None or self.last >= start) and (end is None or self.first < end)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class History(object):
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        '''
+        Opens the history in the directory `path`, creating it if need
+        be. Rows are written to disk every `chunk_size` snapshots (a day's
+        worth at one every 10 seconds) and on `flush()` or `close()`.
+        '''
+        self.path = path
+        self.chunk_size = chunk_size
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        meta = os.path.join(path, 'columns.json')
+        if os.path.exists(meta):
+            with open(meta) as f:
+                columns = json.load(f)
+            if columns != list(COLUMNS):
+                raise ValueError("%s holds columns %s" % (path, ', '.join(columns)))
+        else:
+            with open(meta, 'w') as f:
+                json.dump(list(COLUMNS), f)
+        self.chunks = []
+        self._pending = [array('q') for i in range(len(COLUMNS) + 1)]
+        self.refresh()
+
+    def refresh(self):
+        '''Picks up chunks written by another `History` on the same directory.'''
+        known = set(c.path for c in self.chunks)
+        for name in sorted(os.listdir(self.path)):
+            path = os.path.join(self.path, name)
+            if name.endswith('.chunk') and path not in known:
+                self.chunks.append(Chunk(path))
+
+    def __len__(self):
+        return sum(c.rows for c in self.chunks) + len(self._pending[0])
+
+    @property
+    def last_timestamp(self):
+        if self._pending[0]:
+            return self._pending[0][-1]
+        if self.chunks:
+            return self.chunks[-1].last
+        return None
+
+    def append(self, info, timestamp=None):
+        '''
+        Adds a snapshot: a `JobInfo` or a `get_job_info()` dict, taken at
+        `timestamp` seconds since the epoch (default: now). Snapshots must
+        be added in time order.
+        '''
+        if not isinstance(info, JobInfo):
+            info = JobInfo(info.get('job') or {})
+        ms = int(round((time.time() if timestamp is None else timestamp) * 1000))
+        last = self.last_timestamp
+        if last is not None and ms < last:
+            raise ValueError("Snapshot at %d ms is older than the last one, at %d ms" % (ms, last))
+        self._pending[0].append(ms)
+        for column, (name, section, field, scale) in zip(self._pending[1:], FIELDS):
+            column.append(_fixed(getattr(getattr(info, section), field), scale))
+        if len(self._pending[0]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        '''Writes any buffered snapshots out as a chunk.'''
+        if not self._pending[0]:
+            return
+        arrays = [np.frombuffer(column, dtype=np.int64) for column in self._pending]
+        last = self.chunks[-1].path if self.chunks else None
+        index = int(os.path.basename(last).split('.')[0]) + 1 if last else 0
+        path = os.path.join(self.path, '%08d.chunk' % index)
+        self.chunks.append(Chunk.write(path, arrays[0], arrays[1:]))
+        self._pending = [array('q') for i in range(len(COLUMNS) + 1)]
+
+    def close(self):
+        self.flush()
+        for chunk in self.chunks:
+            chunk.close()
+        self.chunks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _parts(self, indexes, start, end):
+        '''
+        Yields lists of int64 arrays, timestamps then the columns at
+        `indexes`, chunk by chunk, limited to [`start`, `end`) in ms.
+        '''
+        pending = [np.frombuffer(column, dtype=np.int64) for column in self._pending]
+        sources = [c for c in self.chunks if c.overlaps(start, end)]
+        if len(pending[0]):
+            sources.append(pending)
+        for source in sources:
+            if isinstance(source, Chunk):
+                timestamps = source.column(0)
+                columns = [source.column(i) for i in indexes]
+            else:
+                timestamps = source[0]
+                columns = [source[i] for i in indexes]
+            lo = 0 if start is None else np.searchsorted(timestamps, start, 'left')
+            hi = len(timestamps) if end is None else np.searchsorted(timestamps, end, 'left')
+            if hi > lo:
+                yield [timestamps[lo:hi]] + [c[lo:hi] for c in columns]
+
+    @staticmethod
+    def _indexes(columns):
+        if columns is None:
+            columns = COLUMNS
+        elif isinstance(columns, str):
+            columns = [columns]
+        for name in columns:
+            if name not in COLUMNS:
+                raise ValueError("No column '%s', expected one of %s" % (name, ', '.join(COLUMNS)))
+        return columns, [COLUMNS.index(name) + 1 for name in columns]
+
+    @staticmethod
+    def _ms(seconds):
+        return None if seconds is None else int(round(seconds * 1000))
+
+    def read(self, columns=None, start=None, end=None):
+        '''
+        Returns a dict of NumPy arrays for the snapshots between `start`
+        and `end` (seconds since the epoch, end excluded): 'timestamp' as
+        datetime64[ms], and each of `columns` (default: all) as float64
+        with NaN where the engine didn't report a value.
+        '''
+        columns, indexes = self._indexes(columns)
+        parts = list(self._parts(indexes, self._ms(start), self._ms(end)))
+        result = {'timestamp': np.concatenate([p[0] for p in parts]).astype('datetime64[ms]')
+                  if parts else np.array([], dtype='datetime64[ms]')}
+        for i, name in enumerate(columns):
+            scale = FIELDS[indexes[i] - 1][3]
+            values = np.concatenate([p[i + 1] for p in parts]) if parts else np.array([], dtype=np.int64)
+            result[name] = _float_column(values, scale)
+        return result
+
+    def downsample(self, column, step, start=None, end=None, how='mean'):
+        '''
+        Returns `(timestamps, values)` with one value per `step` seconds,
+        aggregated `how` ('mean', 'min', 'max' or 'last') over the
+        snapshots in each step. Steps with no values are left out. Chunks
+        are decoded one at a time, so memory use depends on the number of
+        steps rather than the number of snapshots.
+        '''
+        if how not in AGGREGATES:
+            raise ValueError("Can't aggregate by '%s', expected one of %s" % (how, ', '.join(AGGREGATES)))
+        (name,), (index,) = self._indexes(column)
+        scale = FIELDS[index - 1][3]
+        step_ms = int(round(step * 1000))
+        buckets, sums, counts, mins, maxs, lasts = [], [], [], [], [], []
+        for timestamps, values in self._parts([index], self._ms(start), self._ms(end)):
+            keep = values != MISSING
+            timestamps = timestamps[keep]
+            values = _float_column(values[keep], scale)
+            if not len(values):
+                continue
+            bucket = timestamps // step_ms
+            starts = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+            buckets.append(bucket[starts])
+            sums.append(np.add.reduceat(values, starts))
+            counts.append(np.diff(np.append(starts, len(values))))
+            mins.append(np.minimum.reduceat(values, starts))
+            maxs.append(np.maximum.reduceat(values, starts))
+            lasts.append(values[np.append(starts[1:], len(values)) - 1])
+        if not buckets:
+            return np.array([], dtype='datetime64[ms]'), np.array([], dtype=np.float64)
+        bucket = np.concatenate(buckets)
+        # A step can straddle two chunks; merge the partial results:
+        starts = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+        ends = np.append(starts[1:], len(bucket)) - 1
+        if how == 'mean':
+            values = np.add.reduceat(np.concatenate(sums), starts) / np.add.reduceat(np.concatenate(counts), starts)
+        elif how == 'min':
+            values = np.minimum.reduceat(np.concatenate(mins), starts)
+        elif how == 'max':
+            values = np.maximum.reduceat(np.concatenate(maxs), starts)
+        else:
+            values = np.concatenate(lasts)[ends]
+        return (bucket[starts] * step_ms).astype('datetime64[ms]'), values
+
+
+def record(hapy, job, history, interval=10.0, stop=None, rounds=None):
+    '''
+    Appends a snapshot of `job` to `history` every `interval` seconds,
+    until the `threading.Event` `stop` is set or after `rounds` polls.
+    Failed polls are logged and skipped. Returns the number recorded.
+    '''
+    polls = recorded = 0
+    while rounds is None or polls < rounds:
+        start = time.time()
+        polls += 1
+        try:
+            history.append(hapy.get_job_info_model(job), timestamp=start)
+            recorded += 1
+        except Exception as e:
+            logger.warning("Could not record %s: %s" % (job, e))
+        if rounds is not None and polls >= rounds:
+            break
+        wait = max(0, interval - (time.time() - start))
+        if stop is not None:
+            if stop.wait(wait):
+                break
+        else:
+            time.sleep(wait)
+    history.flush()
+    return recorded
@@ -0,0 +1,201 @@
+'''
+Adding URLs to a running crawl in bulk.
+
+URLs are read from any iterable (an open file, a generator...) and sent in
+gzipped batches, so memory use is bounded by one batch however long the
+list. A batch is sent either as a gzipped file
+dropped into the job's action directory, which Heritrix picks up on its
+next scan, or through a Groovy script that schedules the URLs straight
+away and reports how many were accepted.
+'''
+import base64
+import gzip
+import io
+import time
+import uuid
+import logging
+
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+ACTION_DIR_KEY = 'actionDirectory.actionDir'
+METHODS = ('action', 'script')
+DEFAULT_BATCH_SIZE = 10000
+DEFAULT_MAX_BATCH_BYTES = 4 * 1024 * 1024
+
+
+class InjectBatch(namedtuple('InjectBatch', [
+        'number', 'urls', 'bytes', 'elapsed', 'scheduled'])):
+    '''
+    One batch sent: its number (from 1), how many URLs and bytes of URLs
+    it held, how long it took to send, and how many URLs the engine
+    scheduled (None when that isn't reported, as for action files).
+    '''
+    __slots__ = ()
+
+    @property
+    def urls_per_second(self):
+        return self.urls / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class PendingBatch(namedtuple('PendingBatch', [
+        'number', 'urls', 'bytes', 'url', 'payload', 'params'])):
+    '''
+    One batch to send: PUT `payload` to the action file `url`, or, when
+    `url` is None, run the inject-urls script with `params`.
+    '''
+    __slots__ = ()
+
+
+def _gzip(lines):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as gz:
+        gz.write(b''.join(lines))
+    return buffer.getvalue()
+
+
+def batches(urls, batch_size=DEFAULT_BATCH_SIZE, max_batch_bytes=DEFAULT_MAX_BATCH_BYTES):
+    '''
+    Yields `(urls, bytes, payload)` for each batch of at most `batch_size`
+    URLs and (roughly) `max_batch_bytes` bytes, where `payload` is the
+    gzipped batch. `urls` may hold str or bytes; blank lines and '#'
+    comments are skipped.
+    '''
+    lines = []
+    size = 0
+    for url in urls:
+        if not isinstance(url, bytes):
+            url = url.encode('utf-8')
+        url = url.strip()
+        if not url or url.startswith(b'#'):
+            continue
+        lines.append(url + b'\n')
+        size += len(url) + 1
+        if len(lines) >= batch_size or size >= max_batch_bytes:
+            yield len(lines), size, _gzip(lines)
+            lines = []
+            size = 0
+    if lines:
+        yield len(lines), size, _gzip(lines)
+
+
+def check_options(method, force_fetch, is_seed):
+    if method not in METHODS:
+        raise ValueError("Unknown injection method '%s', expected one of %s" % (method, ', '.join(METHODS)))
+    if method == 'action' and force_fetch and is_seed:
+        raise ValueError("Action files can't force-fetch seeds, use method='script'")
+
+
+def action_file_name(force_fetch, is_seed, token, number):
+    '''
+    The ActionDirectory picks the treatment from the file extension:
+    .seeds adds seeds, .force schedules with force-fetch, and .schedule
+    schedules as usual.
+    '''
+    if is_seed:
+        suffix = 'seeds'
+    elif force_fetch:
+        suffix = 'force'
+    else:
+        suffix = 'schedule'
+    return 'hapy-%s-%06d.%s.gz' % (token, number, suffix)
+
+
+def new_token():
+    '''Keeps the action files of different calls apart.'''
+    return '%s-%s' % (time.strftime('%Y%m%d%H%M%S'), uuid.uuid4().hex[:8])
+
+
+def schedule_params(payload, force_fetch, is_seed):
+    '''The parameters of the inject-urls script for one batch.'''
+    return dict(
+        force_fetch=bool(force_fetch),
+        is_seed=bool(is_seed),
+        urls=base64.b64encode(payload).decode('ascii')
+    )
+
+
+def scheduled_count(result):
+    '''The number of URLs scheduled, from the inject-urls script's JSON.'''
+    return result.get('scheduled') if result else None
+
+
+def log_batch(job, batch):
+    logger.info("Injected batch %d into %s: %d URLs, %d bytes in %.2fs (%.0f URLs/s)" % (
+        batch.number, job, batch.urls, batch.bytes, batch.elapsed, batch.urls_per_second))
+
+
+class UrlInjector(object):
+    '''
+    Sends URLs to `job` in batches, by `method` 'action' (gzipped files in
+    the action directory) or 'script' (a Groovy script calling
+    `frontier.schedule`, or `seeds.addSeed` for seeds). `callback`, if
+    given, is called with each `InjectBatch` as it completes.
+
+    `inject` sends through a `Hapy`; `AsyncHapy` works through `plan` and
+    `sent` itself, so both clients batch and name the files alike.
+    '''
+
+    def __init__(self, hapy, job, force_fetch=False, is_seed=False, method='action',
+                 batch_size=DEFAULT_BATCH_SIZE, max_batch_bytes=DEFAULT_MAX_BATCH_BYTES,
+                 callback=None):
+        check_options(method, force_fetch, is_seed)
+        self.hapy = hapy
+        self.job = job
+        self.force_fetch = force_fetch
+        self.is_seed = is_seed
+        self.method = method
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.callback = callback
+
+    def action_url(self, info):
+        '''The URL of the action directory, from the job's `JobInfo`.'''
+        url = info.config_url(ACTION_DIR_KEY)
+        if url is None:
+            raise ValueError("Job %s has no action directory" % self.job)
+        return url.rstrip('/')
+
+    def plan(self, urls, action_url=None):
+        '''
+        Yields a `PendingBatch` for each batch of `urls`. Method 'action'
+        needs the `action_url`.
+        '''
+        token = new_token()
+        for number, (count, size, payload) in enumerate(
+                batches(urls, self.batch_size, self.max_batch_bytes), 1):
+            if self.method == 'action':
+                name = action_file_name(self.force_fetch, self.is_seed, token, number)
+                yield PendingBatch(number, count, size, '%s/%s' % (action_url, name), payload, None)
+            else:
+                yield PendingBatch(number, count, size, None, None,
+                                   schedule_params(payload, self.force_fetch, self.is_seed))
+
+    def sent(self, batch, elapsed, result=None):
+        '''
+        Reports a `PendingBatch` sent in `elapsed` seconds, with the
+        inject-urls script's `result`, if run; returns its `InjectBatch`.
+        '''
+        scheduled = scheduled_count(result) if batch.url is None else None
+        done = InjectBatch(batch.number, batch.urls, batch.bytes, elapsed, scheduled)
+        log_batch(self.job, done)
+        if self.callback is not None:
+            self.callback(done)
+        return done
+
+    def inject(self, urls):
+        '''Sends every URL in `urls`; returns the list of `InjectBatch`es.'''
+        action_url = None
+        if self.method == 'action':
+            action_url = self.action_url(self.hapy.get_job_info_model(self.job))
+        sent = []
+        for batch in self.plan(urls, action_url):
+            start = time.monotonic()
+            result = None
+            if batch.url is not None:
+                self.hapy._http_put(batch.url, batch.payload)
+            else:
+                result = self.hapy.run_script(self.job, 'inject-urls', **batch.params)
+            sent.append(self.sent(batch, time.monotonic() - start, result))
+        return sent
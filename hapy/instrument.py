@@ -0,0 +1,316 @@
+'''
+Timing the client's calls, phase by phase.
+
+Give a client an `Observer` and every public method call is reported to
+it as a `Timing`: the time taken overall and in each phase, summed over
+the HTTP requests the call made:
+
+    connect   opening connections: DNS, TCP and TLS
+    server    from sending a request to its response headers
+    download  reading response bodies
+    parse     turning responses into dicts, models or script output
+
+Whatever isn't in a phase (rate limiting, waiting on a coalesced call,
+backing off before a retry) is the difference between `elapsed` and the
+phases. Requests made outside a method call, e.g. by the iterator that
+`iter_pending_urls` returns, are reported on their own, under their HTTP
+method.
+
+`Recorder` keeps histograms of all that per method and prints a summary:
+
+    recorder = Recorder()
+    h = hapy.Hapy('https://localhost:8443', observer=recorder)
+    h.get_job_info('frequent')
+    print(recorder.summary())
+
+Clients have no observer by default, which costs one attribute check per
+call.
+'''
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+
+from collections import namedtuple
+
+PHASES = ('connect', 'server', 'download', 'parse')
+
+# Upper bounds, in seconds, of the histogram buckets:
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float('inf'))
+
+# Public methods that don't call the engine, or only return an iterator
+# that does:
+UNTIMED = frozenset(['close', 'aclose', 'capture', 'connection_stats', 'coalesce_stats',
+                     'tail_crawl_log', 'iter_pending_urls'])
+
+
+class Timing(namedtuple('Timing', ['method', 'elapsed', 'connect', 'server', 'download', 'parse',
+                                   'requests', 'bytes', 'error'])):
+    '''
+    One call: the client method (or HTTP method) name, the seconds taken
+    overall and in each phase, the number of HTTP requests made, the size
+    of their response bodies, and the exception raised, if any.
+    '''
+    __slots__ = ()
+
+
+class Observer(object):
+    '''Receives the `Timing` of every call. Subclass it and override `observe`.'''
+
+    def observe(self, timing):
+        pass
+
+
+class _Span(object):
+    __slots__ = ('connect', 'server', 'download', 'parse', 'requests', 'bytes')
+
+    def __init__(self):
+        self.connect = self.server = self.download = self.parse = 0.0
+        self.requests = self.bytes = 0
+
+    def timing(self, method, elapsed, error):
+        return Timing(method, elapsed, self.connect, self.server, self.download, self.parse,
+                      self.requests, self.bytes, error)
+
+
+# The span of the outermost timed call the current thread or task is in:
+_span = contextvars.ContextVar('hapy_span', default=None)
+
+# Time spent connecting by the current thread since its last request was
+# recorded. Connections are opened in the thread that makes the request:
+_connecting = threading.local()
+
+
+def add_connect(seconds):
+    _connecting.seconds = getattr(_connecting, 'seconds', 0.0) + seconds
+
+
+def take_connect():
+    seconds = getattr(_connecting, 'seconds', 0.0)
+    _connecting.seconds = 0.0
+    return seconds
+
+
+def add_request(observer, method, elapsed, connect, server, nbytes):
+    '''
+    Records one HTTP request that took `elapsed` seconds, `connect` of them
+    connecting and `server` more until its response headers came.
+    '''
+    download = max(elapsed - connect - server, 0.0)
+    span = _span.get()
+    if span is None:
+        observer.observe(Timing(method, elapsed, connect, server, download, 0.0, 1, nbytes or 0, None))
+        return
+    span.connect += connect
+    span.server += server
+    span.download += download
+    span.requests += 1
+    span.bytes += nbytes or 0
+
+
+def add_parse(seconds):
+    span = _span.get()
+    if span is not None:
+        span.parse += seconds
+
+
+def parse_timed(client, parse, content):
+    '''Returns `parse(content)`, timing it if `client` has an observer.'''
+    if client.observer is None:
+        return parse(content)
+    start = time.perf_counter()
+    try:
+        return parse(content)
+    finally:
+        add_parse(time.perf_counter() - start)
+
+
+class HttpxTrace(object):
+    '''
+    Works out the phases of an httpx request from the trace events of its
+    transport, httpcore.
+    '''
+
+    def __init__(self):
+        self.connect = 0.0
+        self.server = 0.0
+        self._started = {}
+
+    async def __call__(self, event, info):
+        name, _, stage = event.rpartition('.')
+        now = time.perf_counter()
+        if stage == 'started':
+            self._started[name] = now
+            return
+        if stage not in ('complete', 'failed'):
+            return
+        if name.startswith('connection.'):
+            self.connect += now - self._started.get(name, now)
+        elif name.endswith('.receive_response_headers'):
+            sent = self._started.get(name.replace('receive_response_headers', 'send_request_headers'))
+            self.server += now - (sent if sent is not None else self._started.get(name, now))
+
+
+def _timed(fn):
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def timed(self, *args, **kwargs):
+        if self.observer is None or _span.get() is not None:
+            return fn(self, *args, **kwargs)
+        span = _Span()
+        token = _span.set(span)
+        start = time.perf_counter()
+        error = None
+        try:
+            return fn(self, *args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _span.reset(token)
+            self.observer.observe(span.timing(name, time.perf_counter() - start, error))
+    return timed
+
+
+def _timed_async(fn):
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def timed(self, *args, **kwargs):
+        if self.observer is None or _span.get() is not None:
+            return await fn(self, *args, **kwargs)
+        span = _Span()
+        token = _span.set(span)
+        start = time.perf_counter()
+        error = None
+        try:
+            return await fn(self, *args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _span.reset(token)
+            self.observer.observe(span.timing(name, time.perf_counter() - start, error))
+    return timed
+
+
+def instrumented(cls):
+    '''
+    Class decorator that times every public method of a client class,
+    when its instance has an `observer`. Only the outermost call is
+    reported, e.g. `status()` but not the `get_job_status()` it makes.
+    '''
+    for name, fn in list(vars(cls).items()):
+        if name.startswith('_') or name in UNTIMED or not inspect.isfunction(fn):
+            continue
+        if inspect.isasyncgenfunction(fn) or inspect.isgeneratorfunction(fn):
+            continue
+        setattr(cls, name, _timed_async(fn) if inspect.iscoroutinefunction(fn) else _timed(fn))
+    return cls
+
+
+class Histogram(object):
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        '''
+        Estimates the `q` quantile (0 to 1), interpolating within its
+        bucket as Prometheus does.
+        '''
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+
+class _MethodStats(object):
+
+    def __init__(self, buckets):
+        self.elapsed = Histogram(buckets)
+        self.phases = dict((phase, Histogram(buckets)) for phase in PHASES)
+        self.requests = 0
+        self.bytes = 0
+        self.errors = {}
+
+    def add(self, timing):
+        self.elapsed.add(timing.elapsed)
+        for phase in PHASES:
+            self.phases[phase].add(getattr(timing, phase))
+        self.requests += timing.requests
+        self.bytes += timing.bytes
+        if timing.error is not None:
+            kind = type(timing.error).__name__
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+class Recorder(Observer):
+    '''Keeps latency histograms, response sizes and error counts per method.'''
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._methods = {}
+        self._lock = threading.Lock()
+
+    def observe(self, timing):
+        with self._lock:
+            stats = self._methods.get(timing.method)
+            if stats is None:
+                stats = self._methods[timing.method] = _MethodStats(self.buckets)
+            stats.add(timing)
+
+    def stats(self):
+        '''
+        Returns a dict of method name to its number of calls, requests,
+        response bytes and errors (by exception class), and the mean,
+        median, 95th percentile and longest time, in seconds, taken
+        overall (`elapsed`) and in each phase.
+        '''
+        def summarise(histogram):
+            return dict(mean=histogram.mean, p50=histogram.quantile(0.5),
+                        p95=histogram.quantile(0.95), max=histogram.max)
+        with self._lock:
+            return dict((method, dict(
+                [('calls', stats.elapsed.count), ('requests', stats.requests), ('bytes', stats.bytes),
+                 ('errors', dict(stats.errors)), ('elapsed', summarise(stats.elapsed))] +
+                [(phase, summarise(stats.phases[phase])) for phase in PHASES]
+            )) for method, stats in self._methods.items())
+
+    def summary(self):
+        '''A table of the `stats()`, one line per method, times in milliseconds.'''
+        lines = ['%-28s %6s %6s %9s %9s %9s %9s %9s %9s %10s' % (
+            'method', 'calls', 'errors', 'p50', 'p95', 'connect', 'server', 'download', 'parse', 'KiB')]
+        for method, stats in sorted(self.stats().items()):
+            lines.append('%-28s %6d %6d %9.1f %9.1f %9.1f %9.1f %9.1f %9.1f %10.1f' % (
+                method, stats['calls'], sum(stats['errors'].values()),
+                stats['elapsed']['p50'] * 1000, stats['elapsed']['p95'] * 1000,
+                stats['connect']['mean'] * 1000, stats['server']['mean'] * 1000,
+                stats['download']['mean'] * 1000, stats['parse']['mean'] * 1000,
+                stats['bytes'] / 1024.0))
+        return '\n'.join(lines) + '\n'
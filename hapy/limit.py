@@ -0,0 +1,192 @@
+'''
+A token-bucket rate limiter with priority classes, to keep monitoring
+traffic from loading the Heritrix JVM that is running the crawl.
+
+The bucket holds up to `burst` tokens and refills at `rate` tokens per
+second; each request to the engine takes one. Callers that find it empty
+queue up, and tokens go to the queue in priority order: `CONTROL`
+requests (actions such as pause, checkpoint, terminate or launch) are
+always served before any `MONITOR` request (page reads, scripts) that is
+waiting, and callers of one class are served in the order they came.
+
+One limiter can be shared by threads and asyncio tasks alike, e.g. by the
+clients of one engine:
+
+    limiter = RateLimiter(rate=2.0, burst=5)
+    h = hapy.Hapy('https://localhost:8443', rate_limit=limiter)
+    ...
+    print(limiter.stats()['monitor']['mean_wait'])
+'''
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+
+CONTROL = 0
+MONITOR = 1
+
+PRIORITIES = {CONTROL: 'control', MONITOR: 'monitor'}
+
+
+class _Waiter(object):
+    __slots__ = ('priority', 'seq', 'wake', 'granted')
+
+    def __init__(self, priority, seq, wake):
+        self.priority = priority
+        self.seq = seq
+        self.wake = wake
+        self.granted = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class _WaitStats(object):
+    __slots__ = ('acquired', 'waited', 'total_wait', 'max_wait')
+
+    def __init__(self):
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def add(self, wait):
+        self.acquired += 1
+        if wait > 0:
+            self.waited += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+
+class RateLimiter(object):
+
+    def __init__(self, rate, burst=1):
+        '''`rate` is in requests per second; `burst` is the bucket size.'''
+        if rate <= 0 or burst < 1:
+            raise ValueError("Need a positive rate and a burst of at least 1, not %s, %s" % (rate, burst))
+        self.rate = float(rate)
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._stats = dict((priority, _WaitStats()) for priority in PRIORITIES)
+        self._lock = threading.Lock()
+
+    def _grant(self):
+        '''
+        Hands the tokens there are to the queue, best first. Returns how
+        long until the next token if anyone is still waiting, else None.
+        Call with the lock held.
+        '''
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        while self._waiters and self._tokens >= 1:
+            waiter = heapq.heappop(self._waiters)
+            self._tokens -= 1
+            waiter.granted = True
+            waiter.wake()
+        if not self._waiters:
+            return None
+        return (1 - self._tokens) / self.rate
+
+    def _enqueue(self, priority, wake):
+        if priority not in PRIORITIES:
+            raise ValueError("Unknown priority %r" % priority)
+        waiter = _Waiter(priority, next(self._seq), wake)
+        heapq.heappush(self._waiters, waiter)
+        return waiter, self._grant()
+
+    def _abandon(self, waiter):
+        '''Takes back the place, or the token, of a caller that gave up.'''
+        with self._lock:
+            if waiter.granted:
+                self._tokens += 1
+            else:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+            self._grant()
+
+    def _done(self, priority, start, queued):
+        wait = time.monotonic() - start if queued else 0.0
+        with self._lock:
+            self._stats[priority].add(wait)
+        return wait
+
+    def acquire(self, priority=MONITOR):
+        '''
+        Blocks until a request may go ahead; returns how long it was
+        queued, in seconds (0 if a token was there).
+        '''
+        start = time.monotonic()
+        event = threading.Event()
+        with self._lock:
+            waiter, delay = self._enqueue(priority, event.set)
+            queued = not waiter.granted
+        try:
+            while not event.wait(delay):
+                with self._lock:
+                    delay = self._grant()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        return self._done(priority, start, queued)
+
+    async def acquire_async(self, priority=MONITOR):
+        '''Like `acquire`, for coroutines.'''
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(_set_done, future)
+        with self._lock:
+            waiter, delay = self._enqueue(priority, wake)
+            queued = not waiter.granted
+        try:
+            while not waiter.granted:
+                try:
+                    await asyncio.wait_for(asyncio.shield(future), delay)
+                except asyncio.TimeoutError:
+                    with self._lock:
+                        delay = self._grant()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        return self._done(priority, start, queued)
+
+    def stats(self):
+        '''
+        Returns a dict of priority class ('control', 'monitor') to the
+        number of requests let through, how many of those had to wait,
+        their mean and longest wait in seconds, and how many are queued.
+        '''
+        with self._lock:
+            queued = dict((priority, 0) for priority in PRIORITIES)
+            for waiter in self._waiters:
+                queued[waiter.priority] += 1
+            return dict((name, dict(
+                acquired=self._stats[priority].acquired,
+                waited=self._stats[priority].waited,
+                mean_wait=self._stats[priority].total_wait / max(self._stats[priority].acquired, 1),
+                max_wait=self._stats[priority].max_wait,
+                queued=queued[priority]
+            )) for priority, name in PRIORITIES.items())
+
+
+def _set_done(future):
+    if not future.done():
+        future.set_result(None)
+
+
+def rate_limiter(spec):
+    '''
+    Returns the `RateLimiter` for a client's `rate_limit` option: None, a
+    `RateLimiter` (which may be shared), or a `(rate, burst)` pair to make
+    a new one from.
+    '''
+    if spec is None or isinstance(spec, RateLimiter):
+        return spec
+    return RateLimiter(*spec)
@@ -0,0 +1,333 @@
+'''
+Typed views of the engine and job information documents.
+
+`Hapy.get_info()` and `Hapy.get_job_info()` return the XML as nested dicts of
+strings. The classes here convert each numeric field once, always present
+repeated elements as lists, and use `__slots__` so that long runs of
+snapshots stay small. The bulky job sections (`jobLogTail`, `configFiles`,
+`threadReport` and `frontierReport`) are cut out of the document unparsed,
+kept as their XML bytes and only parsed when first accessed.
+'''
+from collections import namedtuple
+
+from .parse import _parse_info, _parse_top
+
+
+def _int(s):
+    if s is None or s == '':
+        return None
+    if s.lstrip('-').isdigit():
+        return int(s)
+    return int(float(s))
+
+
+def _float(s):
+    if s is None or s == '':
+        return None
+    return float(s)
+
+
+def _bool(s):
+    if s is None:
+        return None
+    return s.strip().lower() == 'true'
+
+
+def _str(s):
+    return s
+
+
+def _as_list(value, tag='value'):
+    '''H3 sends a lone child as a scalar and none at all as an empty element.'''
+    if isinstance(value, dict):
+        value = value.get(tag)
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    # An empty element that was indented comes back as its whitespace:
+    return [v for v in value if not (isinstance(v, str) and not v.strip())]
+
+
+class _Model(object):
+    '''
+    Base for the report objects. Subclasses list their `_fields` as
+    `(attribute, xml tag, converter)` triples.
+    '''
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, d=None):
+        d = d or {}
+        for attr, tag, convert in self._fields:
+            setattr(self, attr, convert(d.get(tag)))
+
+    def as_dict(self):
+        return dict((attr, getattr(self, attr)) for attr, tag, convert in self._fields)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.as_dict() == other.as_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join(
+            '%s=%r' % (attr, getattr(self, attr)) for attr, tag, convert in self._fields))
+
+
+class RateReport(_Model):
+    _fields = (
+        ('current_docs_per_second', 'currentDocsPerSecond', _float),
+        ('average_docs_per_second', 'averageDocsPerSecond', _float),
+        ('current_kib_per_sec', 'currentKiBPerSec', _float),
+        ('average_kib_per_sec', 'averageKiBPerSec', _float),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+class LoadReport(_Model):
+    _fields = (
+        ('busy_threads', 'busyThreads', _int),
+        ('total_threads', 'totalThreads', _int),
+        ('congestion_ratio', 'congestionRatio', _float),
+        ('average_queue_depth', 'averageQueueDepth', _float),
+        ('deepest_queue_depth', 'deepestQueueDepth', _int),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+class HeapReport(_Model):
+    _fields = (
+        ('used_bytes', 'usedBytes', _int),
+        ('total_bytes', 'totalBytes', _int),
+        ('max_bytes', 'maxBytes', _int),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+class UriTotals(_Model):
+    _fields = (
+        ('downloaded_uri_count', 'downloadedUriCount', _int),
+        ('queued_uri_count', 'queuedUriCount', _int),
+        ('total_uri_count', 'totalUriCount', _int),
+        ('future_uri_count', 'futureUriCount', _int),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+class SizeTotals(_Model):
+    _fields = (
+        ('dup_by_hash', 'dupByHash', _int),
+        ('dup_by_hash_count', 'dupByHashCount', _int),
+        ('novel', 'novel', _int),
+        ('novel_count', 'novelCount', _int),
+        ('not_modified', 'notModified', _int),
+        ('not_modified_count', 'notModifiedCount', _int),
+        ('total', 'total', _int),
+        ('total_count', 'totalCount', _int),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+class ElapsedReport(_Model):
+    _fields = (
+        ('elapsed_milliseconds', 'elapsedMilliseconds', _int),
+        ('elapsed_pretty', 'elapsedPretty', _str),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+class ConfigFile(_Model):
+    _fields = (
+        ('key', 'key', _str),
+        ('path', 'path', _str),
+        ('url', 'url', _str),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+class JobSummary(_Model):
+    '''One entry of the engine's job list.'''
+    _fields = (
+        ('short_name', 'shortName', _str),
+        ('url', 'url', _str),
+        ('is_profile', 'isProfile', _bool),
+        ('launch_count', 'launchCount', _int),
+        ('last_launch', 'lastLaunch', _str),
+        ('primary_config', 'primaryConfig', _str),
+        ('primary_config_url', 'primaryConfigUrl', _str),
+        ('crawl_controller_state', 'crawlControllerState', _str),
+    )
+    __slots__ = tuple(f[0] for f in _fields)
+
+
+class JobStatus(namedtuple('JobStatus', ['state', 'description', 'actions'])):
+    '''
+    The crawlControllerState, statusDescription and availableActions of a
+    job, read without parsing the rest of the job document.
+    '''
+    __slots__ = ()
+    _tags = ('crawlControllerState', 'statusDescription', 'availableActions')
+
+    @classmethod
+    def from_xml(cls, content):
+        found = _parse_top(content, cls._tags)
+        return cls(found.get('crawlControllerState'), found.get('statusDescription'),
+                   tuple(_as_list(found.get('availableActions'))))
+
+
+class CheckpointList(tuple):
+    '''Checkpoint names, most recent first.'''
+    __slots__ = ()
+
+    def __new__(cls, value=None):
+        return tuple.__new__(cls, _as_list(value))
+
+    @property
+    def latest(self):
+        return self[0] if self else None
+
+
+def _cut_sections(content, tags):
+    '''
+    Takes the elements called `tags` out of an XML document without parsing
+    them. Returns the rest of the document and a dict of tag to the bytes
+    of its element. Tags that aren't there, or are empty (`<tag/>`), stay.
+    '''
+    spans = []
+    for tag in tags:
+        start = content.find(b'<' + tag + b'>')
+        if start < 0:
+            continue
+        end = content.find(b'</' + tag + b'>', start)
+        if end < 0:
+            continue
+        spans.append((start, end + len(tag) + 3, tag))
+    spans.sort()
+    rest = []
+    sections = {}
+    offset = 0
+    for start, end, tag in spans:
+        rest.append(content[offset:start])
+        sections[tag.decode('ascii')] = content[start:end]
+        offset = end
+    rest.append(content[offset:])
+    return b''.join(rest), sections
+
+
+class _LazySection(object):
+    '''
+    Descriptor for a section called `tag`, held in `slot` as the bytes of
+    its XML element until first read, when it is parsed, decoded with
+    `decode(value)` and the result kept instead. Values that are already
+    parsed are decoded straight away.
+    '''
+
+    def __init__(self, tag, slot, decode):
+        self.tag = tag
+        self.slot = slot
+        self.decode = decode
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if isinstance(value, bytes):
+            value = self.decode(_parse_info(value)[self.tag])
+            setattr(obj, self.slot, value)
+        return value
+
+    def set(self, obj, value):
+        if not isinstance(value, bytes):
+            value = self.decode(value)
+        setattr(obj, self.slot, value)
+
+
+def _config_files(value):
+    return dict((f.key, f) for f in (ConfigFile(v) for v in _as_list(value)))
+
+
+class JobInfo(object):
+    __slots__ = (
+        'short_name', 'crawl_controller_state', 'status_description',
+        'available_actions', 'launch_count', 'last_launch', 'is_profile',
+        'primary_config', 'primary_config_url', 'uri_totals', 'size_totals',
+        'rate_report', 'load_report', 'elapsed_report', 'heap_report',
+        'checkpoints', '_job_log_tail', '_config_files', '_thread_report',
+        '_frontier_report'
+    )
+
+    job_log_tail = _LazySection('jobLogTail', '_job_log_tail', _as_list)
+    config_files = _LazySection('configFiles', '_config_files', _config_files)
+    thread_report = _LazySection('threadReport', '_thread_report', lambda v: v)
+    frontier_report = _LazySection('frontierReport', '_frontier_report', lambda v: v)
+    _sections = (job_log_tail, config_files, thread_report, frontier_report)
+    _section_tags = tuple(section.tag.encode('ascii') for section in _sections)
+
+    def __init__(self, job):
+        self.short_name = job.get('shortName')
+        self.crawl_controller_state = job.get('crawlControllerState')
+        self.status_description = job.get('statusDescription')
+        self.available_actions = _as_list(job.get('availableActions'))
+        self.launch_count = _int(job.get('launchCount'))
+        self.last_launch = job.get('lastLaunch')
+        self.is_profile = _bool(job.get('isProfile'))
+        self.primary_config = job.get('primaryConfig')
+        self.primary_config_url = job.get('primaryConfigUrl')
+        self.uri_totals = UriTotals(job.get('uriTotalsReport'))
+        self.size_totals = SizeTotals(job.get('sizeTotalsReport'))
+        self.rate_report = RateReport(job.get('rateReport'))
+        self.load_report = LoadReport(job.get('loadReport'))
+        self.elapsed_report = ElapsedReport(job.get('elapsedReport'))
+        self.heap_report = HeapReport(job.get('heapReport'))
+        self.checkpoints = CheckpointList(job.get('checkpointFiles'))
+        for section in self._sections:
+            section.set(self, job.get(section.tag))
+
+    @classmethod
+    def from_xml(cls, content):
+        '''
+        Parses a job page, leaving the bulky sections unparsed. They are
+        passed on as bytes, which only `from_xml` should do.
+        '''
+        content, sections = _cut_sections(content, cls._section_tags)
+        job = _parse_info(content).get('job') or {}
+        job.update(sections)
+        return cls(job)
+
+    def config_url(self, key):
+        '''The URL of a `configFiles` entry, e.g. 'loggerModule.crawlLogPath'.'''
+        f = self.config_files.get(key)
+        return f.url if f is not None else None
+
+    def __repr__(self):
+        return 'JobInfo(short_name=%r, crawl_controller_state=%r, launch_count=%r)' % (
+            self.short_name, self.crawl_controller_state, self.launch_count)
+
+
+class EngineInfo(object):
+    __slots__ = (
+        'heritrix_version', 'jobs_dir', 'jobs_dir_url', 'available_actions',
+        'heap_report', 'jobs'
+    )
+
+    def __init__(self, engine):
+        self.heritrix_version = engine.get('heritrixVersion')
+        self.jobs_dir = engine.get('jobsDir')
+        self.jobs_dir_url = engine.get('jobsDirUrl')
+        self.available_actions = _as_list(engine.get('availableActions'))
+        self.heap_report = HeapReport(engine.get('heapReport'))
+        self.jobs = [JobSummary(j) for j in _as_list(engine.get('jobs'))]
+
+    @classmethod
+    def from_xml(cls, content):
+        return cls(_parse_info(content).get('engine') or {})
+
+    def job_index(self):
+        '''A dict of job shortName to `JobSummary`.'''
+        return dict((j.short_name, j) for j in self.jobs)
+
+    def __repr__(self):
+        return 'EngineInfo(heritrix_version=%r, jobs=%r)' % (
+            self.heritrix_version, [j.short_name for j in self.jobs])
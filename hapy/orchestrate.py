@@ -0,0 +1,215 @@
+'''
+Lifecycle plans run across many jobs and engines at once.
+
+A `Plan` is a list of `Step`s, each an action sent to the job followed by a
+wait for the job to settle, e.g. launch then wait for PAUSED or RUNNING.
+Steps whose action the job doesn't offer are skipped if they're optional
+(there's nothing to terminate on a job that isn't running), and waited for
+otherwise. Transient failures (connection errors, timeouts and 5xx
+responses) are retried. The first step that still fails ends that job's
+plan, and other jobs carry on.
+
+`run_plan` runs a plan for many `(Hapy, job)` targets on a thread pool,
+at most `parallelism` jobs at a time and, if `per_engine` is set, at most
+that many per engine. The rolling restart sets it to one, so each engine
+keeps crawling its other jobs while one restarts.
+
+    results = run_plan(ROLLING_RESTART, find_targets(fleet, ['frequent', 'daily']))
+    for result in results:
+        print(result.host, result.job, result.ok, result.elapsed)
+'''
+import time
+import logging
+import threading
+
+from collections import namedtuple
+from concurrent import futures
+
+from .resilience import is_transient
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARALLELISM = 4
+DEFAULT_RETRIES = 2
+DEFAULT_RETRY_DELAY = 1.0
+DEFAULT_TIMEOUT = 600.0
+
+
+class Step(namedtuple('Step', ['name', 'action', 'call', 'settle', 'optional'])):
+    '''
+    `call(hapy, job)` sends the action, then `settle(hapy, job, timeout)`
+    (if any) waits for the job to reach its next stable state. `action` is
+    the availableActions entry the job has to offer first.
+    '''
+    __slots__ = ()
+
+
+class StepResult(namedtuple('StepResult', ['name', 'outcome', 'attempts', 'elapsed', 'error'])):
+    '''`outcome` is 'done', 'skipped' or 'failed'; `elapsed` is in seconds.'''
+    __slots__ = ()
+
+
+class JobResult(namedtuple('JobResult', ['host', 'job', 'steps', 'elapsed'])):
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return all(step.outcome != 'failed' for step in self.steps)
+
+
+class Plan(namedtuple('Plan', ['name', 'steps', 'per_engine'])):
+    __slots__ = ()
+
+
+def _wait_state(*states):
+    return lambda h, job, timeout: h.wait_for_state(job, states, timeout=timeout)
+
+
+def _wait_action(action):
+    return lambda h, job, timeout: h.wait_for_action(job, action, timeout=timeout)
+
+
+def _step(name, action, call, settle=None, optional=False):
+    return Step(name, action, call, settle, optional)
+
+
+PAUSE = _step('pause', 'pause', lambda h, job: h.pause_job(job), _wait_state('PAUSED'), optional=True)
+CHECKPOINT = _step('checkpoint', 'checkpoint', lambda h, job: h.checkpoint_job(job))
+TERMINATE = _step('terminate', 'terminate', lambda h, job: h.terminate_job(job), _wait_state('FINISHED'))
+TEARDOWN = _step('teardown', 'teardown', lambda h, job: h.teardown_job(job), _wait_action('build'))
+BUILD = _step('build', 'build', lambda h, job: h.build_job(job), _wait_action('launch'))
+LAUNCH = _step('launch', 'launch', lambda h, job: h.launch_job(job), _wait_state('PAUSED', 'RUNNING'))
+RESUME = _step('resume', 'launch', lambda h, job: h.launch_from_latest_checkpoint(job),
+               _wait_state('PAUSED', 'RUNNING'))
+UNPAUSE = _step('unpause', 'unpause', lambda h, job: h.unpause_job(job), _wait_state('RUNNING', 'EMPTY'))
+
+# A running job is checkpointed first, or resuming would lose what it has
+# crawled since its last checkpoint:
+_RESTART_STEPS = (
+    CHECKPOINT._replace(optional=True),
+    TERMINATE._replace(optional=True),
+    TEARDOWN._replace(optional=True),
+    BUILD._replace(optional=True),
+    RESUME,
+    UNPAUSE._replace(optional=True),
+)
+
+START = Plan('start', (BUILD._replace(optional=True), LAUNCH, UNPAUSE._replace(optional=True)), None)
+RESTART_FROM_CHECKPOINT = Plan('restart', _RESTART_STEPS, None)
+CHECKPOINT_THEN_TEARDOWN = Plan('checkpoint-teardown', (PAUSE, CHECKPOINT, TERMINATE, TEARDOWN), None)
+ROLLING_RESTART = Plan('rolling-restart', _RESTART_STEPS, 1)
+
+PLANS = dict((plan.name, plan) for plan in
+             (START, RESTART_FROM_CHECKPOINT, CHECKPOINT_THEN_TEARDOWN, ROLLING_RESTART))
+
+
+def host_of(h):
+    return h.base_url[:-len('/engine')]
+
+
+def find_targets(clients, jobs):
+    '''
+    Returns the `(Hapy, job)` pairs for each of `jobs` on each of the
+    `clients` (a list of `Hapy` or a `HapyFleet`) that has that job.
+    '''
+    if hasattr(clients, 'engines'):
+        clients = list(clients.engines.values())
+    targets = []
+    for h in clients:
+        index = h.job_index()
+        targets.extend((h, job) for job in jobs if job in index)
+    return targets
+
+
+def run_step(h, job, step, retries=DEFAULT_RETRIES, retry_delay=DEFAULT_RETRY_DELAY,
+             timeout=DEFAULT_TIMEOUT):
+    '''Runs one `Step` for `job` and returns its `StepResult`.'''
+    start = time.time()
+    attempts = 0
+    while True:
+        attempts += 1
+        try:
+            if step.action not in h.get_job_status(job).actions:
+                if attempts > 1 and step.settle is not None:
+                    # The last attempt may have got through before failing:
+                    step.settle(h, job, timeout)
+                    return StepResult(step.name, 'done', attempts, time.time() - start, None)
+                if step.optional:
+                    return StepResult(step.name, 'skipped', attempts, time.time() - start, None)
+                h.wait_for_action(job, step.action, timeout=timeout)
+            step.call(h, job)
+            if step.settle is not None:
+                step.settle(h, job, timeout)
+            return StepResult(step.name, 'done', attempts, time.time() - start, None)
+        except Exception as e:
+            if attempts > retries or not is_transient(e):
+                return StepResult(step.name, 'failed', attempts, time.time() - start, e)
+            logger.warning("%s %s: %s failed, retrying: %s" % (host_of(h), job, step.name, e))
+            time.sleep(retry_delay * 2 ** (attempts - 1))
+
+
+def run_job(h, job, plan, on_step=None, **kwargs):
+    '''Runs every step of `plan` for `job` in turn, stopping at the first failure.'''
+    host = host_of(h)
+    start = time.time()
+    steps = []
+    for step in plan.steps:
+        result = run_step(h, job, step, **kwargs)
+        steps.append(result)
+        logger.info("%s %s: %s %s in %.1fs" % (host, job, step.name, result.outcome, result.elapsed))
+        if on_step is not None:
+            on_step(host, job, result)
+        if result.outcome == 'failed':
+            break
+    return JobResult(host, job, steps, time.time() - start)
+
+
+def run_plan(plan, targets, parallelism=DEFAULT_PARALLELISM, per_engine=None, on_step=None, **kwargs):
+    '''
+    Runs `plan` for every `(Hapy, job)` in `targets` and returns their
+    `JobResult`s, in the order given. At most `parallelism` jobs run at
+    once, and at most `per_engine` (default: the plan's limit, if any) on
+    each engine; jobs are started in order as slots come free. `on_step`
+    is called with `(host, job, StepResult)` as each step ends, and other
+    keyword arguments (retries, retry_delay, timeout) go to `run_step`.
+    '''
+    if per_engine is None:
+        per_engine = plan.per_engine
+    targets = list(targets)
+    pending = list(range(len(targets)))
+    running = {}
+    results = [None] * len(targets)
+    done = threading.Condition()
+
+    def finished(i, host):
+        def callback(future):
+            with done:
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    # Only an on_step callback can get here:
+                    results[i] = JobResult(host, targets[i][1], [StepResult('plan', 'failed', 1, 0, e)], 0)
+                running[host] -= 1
+                done.notify()
+        return callback
+
+    with futures.ThreadPoolExecutor(max_workers=parallelism) as executor:
+        with done:
+            while pending or sum(running.values()):
+                choice = None
+                if sum(running.values()) < parallelism:
+                    for i in pending:
+                        host = host_of(targets[i][0])
+                        if per_engine is None or running.get(host, 0) < per_engine:
+                            choice = i
+                            break
+                if choice is None:
+                    done.wait()
+                    continue
+                pending.remove(choice)
+                h, job = targets[choice]
+                host = host_of(h)
+                running[host] = running.get(host, 0) + 1
+                future = executor.submit(run_job, h, job, plan, on_step, **kwargs)
+                future.add_done_callback(finished(choice, host))
+    return results
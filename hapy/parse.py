@@ -0,0 +1,131 @@
+'''
+Decoding of the XML documents returned by the Heritrix engine, shared by the
+blocking and asyncio clients.
+'''
+import json
+
+from io import BytesIO
+from xml.etree import ElementTree
+
+# What execute_script can return: (raw, html), the raw output, or the raw
+# output decoded as JSON.
+SCRIPT_PARSERS = (None, 'raw', 'json')
+
+# Prepended to Groovy scripts run with raw_only, so anything written to
+# htmlOut is dropped and the engine sends no htmlOutput copy.
+RAW_ONLY_GROOVY = 'htmlOut = new PrintWriter(new org.apache.commons.io.output.NullWriter())\n'
+
+
+def _tree_to_dict(tree):
+    if len(tree) == 0:
+        return {tree.tag: tree.text}
+    D = {}
+    for child in tree:
+        d = _tree_to_dict(child)
+        tag = next(iter(d))
+        try:
+            try:
+                D[tag].append(d[tag])
+            except AttributeError:
+                D[tag] = [D[tag], d[tag]]
+        except KeyError:
+            D[tag] = d[tag]
+    return {tree.tag: D}
+
+
+def _parse_info(content):
+    '''
+    Turns an engine or job XML document into nested dicts, in a single
+    streaming pass over the response bytes. Leaf elements map to their text,
+    other elements to a dict of their children, and repeated tags to a list.
+    This is the same shape as `_tree_to_dict`, but the full tree is never
+    built: the (tag, value) pairs of finished elements wait on a stack until
+    their parent ends, which then collects them and frees its children.
+    '''
+    pending = []
+    for event, elem in ElementTree.iterparse(BytesIO(content)):
+        n = len(elem)
+        if n == 0:
+            pending.append((elem.tag, elem.text))
+            continue
+        value = {}
+        for tag, v in pending[-n:]:
+            if tag not in value:
+                value[tag] = v
+            elif isinstance(value[tag], list):
+                value[tag].append(v)
+            else:
+                value[tag] = [value[tag], v]
+        del pending[-n:]
+        elem.clear()
+        pending.append((elem.tag, value))
+    tag, value = pending[0]
+    return {tag: value}
+
+
+# How much of the document _parse_top hands the parser at a time:
+TOP_FEED_SIZE = 512
+
+
+def _parse_top(content, tags):
+    '''
+    Returns a dict of the `tags` children of the root element, stopping
+    the parse as soon as the last of them ends. Heritrix writes the job's
+    state near the top of the document, so the bulky sections after it
+    (jobLogTail, reports, configFiles...) are never read. The document is
+    fed to the parser in small pieces, since `iterparse` would parse a
+    whole 16KiB buffer before yielding anything. Leaf elements map to
+    their text, others to a list of their children's text.
+    '''
+    wanted = frozenset(tags)
+    found = {}
+    depth = 0
+    parser = ElementTree.XMLPullParser(events=('start', 'end'))
+    for offset in range(0, len(content), TOP_FEED_SIZE):
+        parser.feed(content[offset:offset + TOP_FEED_SIZE])
+        for event, elem in parser.read_events():
+            if event == 'start':
+                depth += 1
+                continue
+            if depth == 2:
+                if elem.tag in wanted:
+                    if len(elem):
+                        found[elem.tag] = [child.text for child in elem]
+                    else:
+                        # An emptied list still holds its indentation:
+                        found[elem.tag] = elem.text if elem.text and elem.text.strip() else None
+                    if len(found) == len(wanted):
+                        return found
+                elem.clear()
+            depth -= 1
+    return found
+
+
+def _parse_script_output(content):
+    tree = ElementTree.fromstring(content)
+    raw = tree.find('rawOutput')
+    if raw is not None:
+        raw = raw.text
+    html = tree.find('htmlOutput')
+    if html is not None:
+        html = html.text
+    return raw, html
+
+
+def _check_script_options(engine, parse, raw_only):
+    if parse not in SCRIPT_PARSERS:
+        raise ValueError("Can't parse script output as '%s', expected one of %s" % (
+            parse, ', '.join(str(p) for p in SCRIPT_PARSERS)))
+    if raw_only and engine != 'groovy':
+        raise ValueError("raw_only is only supported for groovy scripts")
+
+
+def _script_result(content, parse):
+    raw, html = _parse_script_output(content)
+    if parse is None:
+        return raw, html
+    if parse == 'raw':
+        return raw
+    if raw is None or not raw.strip():
+        return None
+    return json.loads(raw)
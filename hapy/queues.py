@@ -0,0 +1,90 @@
+'''
+Per-queue frontier statistics.
+
+The queue-stats script scans the frontier's work queues inside the engine,
+adds up the totals and keeps only the top queues by one column, so only a
+few compact rows come back however many queues there are. `QueueStats`
+holds those rows column by column in `array`s.
+'''
+import logging
+
+from array import array
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Numeric columns, in the order they follow queue and state in each row:
+COLUMNS = (
+    'size', 'enqueued', 'spent', 'session_budget', 'session_balance',
+    'total_budget', 'errors', 'wake_time', 'last_dequeue'
+)
+SORT_KEYS = COLUMNS
+TOTALS = ('queues', 'urls', 'active', 'snoozed', 'retired', 'inactive', 'spent')
+DEFAULT_TOP = 100
+
+
+class QueueRow(namedtuple('QueueRow', ('queue', 'state') + COLUMNS)):
+    '''
+    One work queue: its class key, state ('active', 'snoozed', 'retired'
+    or 'inactive') and counts. `wake_time` and `last_dequeue` are in
+    milliseconds since the epoch, or 0.
+    '''
+    __slots__ = ()
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class QueueStats(object):
+    '''
+    A table of `QueueRow`s, in the order the engine sorted them, plus the
+    `totals` over all queues. `column(name)` returns one numeric column as
+    an `array` of signed 64-bit ints.
+    '''
+
+    def __init__(self):
+        self.totals = dict((name, 0) for name in TOTALS)
+        self.queues = []
+        self.states = []
+        self.columns = dict((name, array('q')) for name in COLUMNS)
+
+    def __len__(self):
+        return len(self.queues)
+
+    def __getitem__(self, i):
+        return QueueRow(self.queues[i], self.states[i],
+                        *[self.columns[name][i] for name in COLUMNS])
+
+    def __iter__(self):
+        for i in range(len(self.queues)):
+            yield self[i]
+
+    def column(self, name):
+        return self.columns[name]
+
+    def append(self, fields):
+        self.queues.append(fields[0])
+        self.states.append(fields[1])
+        for name, value in zip(COLUMNS, fields[2:]):
+            self.columns[name].append(_int(value))
+
+    @classmethod
+    def from_json(cls, result):
+        '''Builds the table from the queue-stats script's decoded JSON.'''
+        stats = cls()
+        if not result:
+            logger.warning("No output from the queue stats script")
+            return stats
+        stats.totals.update(result.get('totals', {}))
+        for row in result.get('rows', []):
+            stats.append(row)
+        return stats
+
+
+def check_sort_by(sort_by):
+    if sort_by not in SORT_KEYS:
+        raise ValueError("Can't sort queues by '%s', expected one of %s" % (sort_by, ', '.join(SORT_KEYS)))
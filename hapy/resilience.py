@@ -0,0 +1,358 @@
+'''
+Retries, hedged requests and a circuit breaker for the calls one client
+makes to its engine.
+
+    h = hapy.Hapy('https://localhost:8443', resilience=Resilience(hedge=Hedging()))
+    print(h.resilience.stats())
+
+Transient failures (connection errors, timeouts and 5xx responses) of
+idempotent requests, GETs and PUTs, are retried after a jittered,
+exponentially growing delay. Actions POSTed to the engine, such as
+launch or terminate, are only retried when the request can't have
+reached the engine, since repeating one that did could run it twice.
+
+With `Hedging`, a GET that takes longer than most recent GETs (the 95th
+percentile, by default) is sent again, and whichever answer comes first
+is used. The copies run in a pool of `max_workers` threads, so the client
+hands the winning response and its `CallInfo` back to be recorded as the
+calling thread's `lastresponse` and `last_call`; the time each copy spent
+connecting is measured in the worker that made it. Nothing waits for a
+worker: when none is idle a GET runs in the calling thread, unhedged, and
+a slow GET gets no second copy, so a busy client neither queues its GETs
+nor adds backups to the load.
+
+The `CircuitBreaker` opens after a run of consecutive transient failures,
+and while open every call fails at once with `CircuitOpenError` rather
+than waiting on an engine that is down. After `reset_timeout` one call is
+let through as a probe: if it works the breaker closes again.
+'''
+import asyncio
+import contextvars
+import random
+import threading
+import time
+
+from collections import deque
+from concurrent import futures
+
+import httpx
+import requests
+
+DEFAULT_RETRIES = 2
+DEFAULT_BASE_DELAY = 0.2
+DEFAULT_MAX_DELAY = 5.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+DEFAULT_PERCENTILE = 95
+DEFAULT_MIN_SAMPLES = 20
+DEFAULT_WINDOW = 200
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+def is_transient(error):
+    '''Whether a failed call is worth repeating.'''
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+        return True
+    # A HapyException for a 5xx response:
+    return (getattr(error, 'status_code', None) or 0) >= 500
+
+
+def never_sent(error):
+    '''Whether a failed call certainly didn't reach the engine.'''
+    return isinstance(error, (requests.ConnectTimeout, httpx.ConnectError, httpx.ConnectTimeout))
+
+
+class RetryPolicy(object):
+
+    def __init__(self, retries=DEFAULT_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        '''
+        How long to wait before retry number `attempt` (from 1): anything
+        up to the exponential backoff, so that clients that failed together
+        don't all come back together.
+        '''
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before(self):
+        '''Raises `CircuitOpenError` if a call may not go ahead now.'''
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError("Circuit open after %d failures; retrying in %.1fs" % (
+                self.failures, max(0, self._opened_at + self.reset_timeout - time.monotonic())))
+
+    def after(self, ok):
+        '''Records how a call let through by `before()` went.'''
+        with self._lock:
+            self._probing = False
+            if ok:
+                self.state = CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self.opened += 1
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+    def abandon(self):
+        '''Lets another call probe, when one let through was cancelled.'''
+        with self._lock:
+            self._probing = False
+
+
+class Hedging(object):
+    '''
+    When to send a second copy of a slow GET: once it has taken longer
+    than the `percentile` of the last `window` GETs, as soon as
+    `min_samples` have been seen.
+    '''
+
+    def __init__(self, percentile=DEFAULT_PERCENTILE, min_samples=DEFAULT_MIN_SAMPLES,
+                 window=DEFAULT_WINDOW, min_delay=0.0, max_workers=8):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_workers = max_workers
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def delay(self):
+        '''Seconds to wait before hedging, or None if there isn't enough to go on.'''
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            latencies = sorted(self._latencies)
+        i = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100.0))
+        return max(latencies[i], self.min_delay)
+
+
+class Resilience(object):
+    '''The retry, hedging and circuit breaker policy of one client.'''
+
+    def __init__(self, retry=None, breaker=None, hedge=None):
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+        self.hedge = hedge
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._executor = None
+        self._workers = None
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _failed(self, error, attempt, idempotent):
+        '''
+        Records a failed attempt; returns how long to wait before the next
+        one, or None if it shouldn't be retried.
+        '''
+        transient = is_transient(error)
+        # Anything but a transient failure shows the engine is up:
+        self.breaker.after(not transient)
+        if not transient or attempt > self.retry.retries or not (idempotent or never_sent(error)):
+            return None
+        self._count('retries')
+        return self.retry.delay(attempt)
+
+    def _succeeded(self, start, hedge):
+        self.breaker.after(True)
+        if hedge and self.hedge is not None:
+            self.hedge.add(time.monotonic() - start)
+
+    def call(self, fn, idempotent=True, hedge=False):
+        '''
+        Returns `fn()`, retrying it as the policy allows. Hedges it as well
+        if `hedge` is set and the policy has `Hedging`.
+        '''
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before()
+            start = time.monotonic()
+            try:
+                if hedge and self.hedge is not None:
+                    result = self._hedged(fn)
+                else:
+                    result = fn()
+            except Exception as e:
+                delay = self._failed(e, attempt, idempotent)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            self._succeeded(start, hedge)
+            return result
+
+    def _submit(self, fn):
+        '''
+        Runs `fn` on a worker if one is idle, in the caller's context so
+        `capture()` sees it; returns its future, or None if all are busy.
+        '''
+        if not self._workers.acquire(blocking=False):
+            return None
+        context = contextvars.copy_context()
+
+        def run():
+            try:
+                return context.run(fn)
+            finally:
+                self._workers.release()
+        return self._executor.submit(run)
+
+    def _hedged(self, fn):
+        delay = self.hedge.delay()
+        if delay is None:
+            return fn()
+        with self._lock:
+            if self._executor is None:
+                self._executor = futures.ThreadPoolExecutor(max_workers=self.hedge.max_workers)
+                self._workers = threading.BoundedSemaphore(self.hedge.max_workers)
+        primary = self._submit(fn)
+        if primary is None:
+            return fn()
+        # The worker was idle, so the delay doesn't include any queueing:
+        done, pending = futures.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        backup = self._submit(fn)
+        if backup is None:
+            return primary.result()
+        self._count('hedges')
+        pending = set([primary, backup])
+        while True:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count('hedge_wins')
+                    return future.result()
+            if not pending:
+                # Both failed:
+                return primary.result()
+
+    async def call_async(self, fn, idempotent=True, hedge=False):
+        '''Like `call`, for a coroutine function `fn`.'''
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before()
+            start = time.monotonic()
+            try:
+                if hedge and self.hedge is not None:
+                    result = await self._hedged_async(fn)
+                else:
+                    result = await fn()
+            except Exception as e:
+                delay = self._failed(e, attempt, idempotent)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            self._succeeded(start, hedge)
+            return result
+
+    async def _hedged_async(self, fn):
+        delay = self.hedge.delay()
+        if delay is None:
+            return await fn()
+        primary = asyncio.ensure_future(fn())
+        done, pending = await asyncio.wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        self._count('hedges')
+        backup = asyncio.ensure_future(fn())
+        pending = set([primary, backup])
+        try:
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is backup:
+                            self._count('hedge_wins')
+                        return future.result()
+                if not pending:
+                    # Both failed:
+                    return primary.result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def stats(self):
+        '''
+        Returns a dict of the breaker's state ('closed', 'open' or
+        'half_open'), its consecutive failures, how many times it has
+        opened and how many calls it has turned away, and the number of
+        retries, hedged requests and hedges that answered first.
+        '''
+        return dict(
+            state=self.breaker.state,
+            failures=self.breaker.failures,
+            opened=self.breaker.opened,
+            rejected=self.breaker.rejected,
+            retries=self.retries,
+            hedges=self.hedges,
+            hedge_wins=self.hedge_wins
+        )
+
+
+def resilience(spec):
+    '''
+    Returns the `Resilience` for a client's `resilience` option: None, a
+    `Resilience` (shared with whatever else uses it), True for the default
+    policy, or a dict of keyword arguments to make a new one from.
+    '''
+    if spec is None or isinstance(spec, Resilience):
+        return spec
+    if spec is True:
+        return Resilience()
+    return Resilience(**spec)
@@ -0,0 +1,113 @@
+'''
+The Groovy scripts bundled with hapy.
+
+Each script is read from the package once and is never edited per call.
+Parameters are sent as JSON in a fixed preamble and reach the script as the
+`params` map, so no value can break the Groovy source. The preamble also
+compiles the script body the first time it runs in a job and keeps the
+class, keyed by the body's SHA-1, so later runs skip compiling the body.
+
+    text = hapy.scripts.render('pending-urls-from', url='http://example.com/', limit=10)
+'''
+import base64
+import hashlib
+import json
+import threading
+
+from pkg_resources import resource_listdir, resource_string
+
+# The preamble sent in front of every script. Only the parameters change
+# between calls of the same script.
+LOADER = '''// hapy script %(name)s
+params = new groovy.json.JsonSlurper().parseText(new String("%(params)s".decodeBase64(), "UTF-8"))
+hapyScripts = null
+hapyContext = binding.hasVariable("appCtx") ? appCtx : null
+if (hapyContext != null) {
+    synchronized (hapyContext) {
+        if (!hapyContext.containsBean("hapyScripts")) {
+            hapyContext.getBeanFactory().registerSingleton("hapyScripts", new java.util.concurrent.ConcurrentHashMap())
+        }
+        hapyScripts = hapyContext.getBean("hapyScripts")
+    }
+}
+hapyClass = hapyScripts?.get("%(sha1)s")
+if (hapyClass == null) {
+    hapyClass = new GroovyClassLoader(getClass().getClassLoader()).parseClass(
+        new String("%(body)s".decodeBase64(), "UTF-8"), "%(class_name)s.groovy")
+    hapyScripts?.put("%(sha1)s", hapyClass)
+}
+org.codehaus.groovy.runtime.InvokerHelper.createScript(hapyClass, binding).run()
+'''
+
+# The parameters a script can't do without, checked before it is sent:
+REQUIRED_PARAMS = {
+    'exclude-surt': ('surt',),
+    'inject-urls': ('urls',),
+    'pending-urls-from': ('url',),
+    'url-status': ('url',),
+    'url-status-batch': ('urls',),
+}
+
+
+class Script(object):
+    __slots__ = ('name', 'body', 'sha1', 'required', '_head', '_tail')
+
+    def __init__(self, name, body):
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        self.name = name
+        self.body = body
+        data = body.encode('utf-8')
+        self.sha1 = hashlib.sha1(data).hexdigest()
+        self.required = REQUIRED_PARAMS.get(name, ())
+        # Everything but the parameters is worked out once:
+        self._head, self._tail = (LOADER % dict(
+            name=name,
+            params='\0',
+            sha1=self.sha1,
+            body=base64.b64encode(data).decode('ascii'),
+            class_name='hapy_%s' % name.replace('-', '_')
+        )).split('\0')
+
+    def render(self, **params):
+        '''
+        The text to send to the engine, with `params` bound as JSON. Raises
+        ValueError if a required parameter is missing or None.
+        '''
+        missing = [param for param in self.required if params.get(param) is None]
+        if missing:
+            raise ValueError("Script '%s' needs %s" % (self.name, ', '.join(missing)))
+        encoded = json.dumps(params, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        return self._head + base64.b64encode(encoded).decode('ascii') + self._tail
+
+    def __repr__(self):
+        return 'Script(name=%r, sha1=%r)' % (self.name, self.sha1)
+
+
+_scripts = {}
+_lock = threading.Lock()
+
+
+def names():
+    '''The names of the bundled scripts.'''
+    return sorted(f[:-len('.groovy')] for f in resource_listdir(__name__, '')
+                  if f.endswith('.groovy'))
+
+
+def get(name):
+    '''The bundled `Script` called `name`, read on first use.'''
+    script = _scripts.get(name)
+    if script is None:
+        with _lock:
+            script = _scripts.get(name)
+            if script is None:
+                try:
+                    body = resource_string(__name__, '%s.groovy' % name)
+                except (IOError, OSError):
+                    raise KeyError("No bundled script called '%s'" % name)
+                script = _scripts[name] = Script(name, body)
+    return script
+
+
+def render(name, **params):
+    return get(name).render(**params)
@@ -1,3 +1,6 @@
+// Deletes the job directory and prints its path as JSON: {"deleted": ...}
+import groovy.json.JsonOutput
+
 def delClos
 delClos = { it.eachDir( delClos );
             it.eachFile {
@@ -5,4 +8,7 @@ delClos = { it.eachDir( delClos );
             }
         it.delete()
 }
-delClos( job.jobDir )
\ No newline at end of file
+jobDir = job.jobDir.toString()
+delClos( job.jobDir )
+
+rawOut.print(JsonOutput.toJson([deleted: jobDir]))
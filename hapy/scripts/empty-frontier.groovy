@@ -0,0 +1,6 @@
+// Deletes every queued URL and prints how many went as JSON: {"deleted": n}
+import groovy.json.JsonOutput
+
+count = job.crawlController.frontier.deleteURIs(".*", "^.*")
+
+rawOut.print(JsonOutput.toJson([deleted: count]))
@@ -1,13 +1,18 @@
 //Groovy
+// Adds params.surt to the SURT prefixes the scope rejects, e.g.
+// "http://(org,northcountrygazette,", and prints the result as JSON:
+// {"surt": ..., "added": true|false, "surts": [...]}
+import groovy.json.JsonOutput
+
 rule = appCtx.getBean("scope").rules.find{ rule ->
   rule.class == org.archive.modules.deciderules.surt.SurtPrefixedDecideRule &&
   rule.decision == org.archive.modules.deciderules.DecideResult.REJECT
 }
- 
-theSurt = "http://(org,northcountrygazette," // ncg is cranky. avoid.
-rawOut.print( "result of adding theSurt: ")
-rawOut.println( rule.surtPrefixes.considerAsAddDirective(theSurt) )
-rawOut.println()
- 
-//dump the list of surts excluded to check results
-rule.surtPrefixes.each{ rawOut.println(it) }
\ No newline at end of file
+
+theSurt = params.surt
+if (!theSurt) {
+    throw new IllegalArgumentException("exclude-surt needs params.surt")
+}
+added = rule.surtPrefixes.considerAsAddDirective(theSurt)
+
+rawOut.print(JsonOutput.toJson([surt: theSurt, added: added, surts: rule.surtPrefixes.collect{ it.toString() }]))
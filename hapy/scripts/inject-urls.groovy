@@ -0,0 +1,41 @@
+// Schedules a batch of URLs, params.urls: gzipped, base64-encoded, one per line.
+// Prints the number of URLs scheduled and the number that failed as JSON:
+// {"scheduled": n, "failed": n}
+
+import groovy.json.JsonOutput
+import java.util.zip.GZIPInputStream
+import org.archive.modules.CrawlURI
+import org.archive.modules.SchedulingConstants
+import org.archive.net.UURIFactory
+
+forceFetch = params.force_fetch
+isSeed = params.is_seed
+urls = params.urls
+
+frontier = appCtx.getBean("frontier")
+seeds = appCtx.getBean("seeds")
+scheduled = 0
+failed = 0
+
+new GZIPInputStream(new ByteArrayInputStream(urls.decodeBase64())).eachLine("UTF-8") { line ->
+    line = line.trim()
+    if (!line || line.startsWith("#")) {
+        return
+    }
+    try {
+        curi = new CrawlURI(UURIFactory.getInstance(line))
+        curi.setSchedulingDirective(SchedulingConstants.MEDIUM)
+        curi.setForceFetch(forceFetch)
+        if (isSeed) {
+            curi.setSeed(true)
+            seeds.addSeed(curi)
+        } else {
+            frontier.schedule(curi)
+        }
+        scheduled++
+    } catch (Exception e) {
+        failed++
+    }
+}
+
+rawOut.print(JsonOutput.toJson([scheduled: scheduled, failed: failed]))
@@ -1,8 +1,15 @@
+// Kills every toe thread and prints their serial numbers as JSON:
+// {"killed": [...]}
+import groovy.json.JsonOutput
+
 tpool = job.crawlController.toePool;
+killed = []
 
 tpool.toes.each{
     if( it != null) {
-        rawOut.println("Killing toe thread " + it.serialNumber)
+        killed << it.serialNumber
         tpool.killThread(it.serialNumber, false)
     }
-}
\ No newline at end of file
+}
+
+rawOut.print(JsonOutput.toJson([killed: killed]))
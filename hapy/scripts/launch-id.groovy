@@ -0,0 +1,4 @@
+// Prints the current launch ID as JSON: {"launch_id": ...}
+import groovy.json.JsonOutput
+
+rawOut.print(JsonOutput.toJson([launch_id: appCtx.getCurrentLaunchId()]))
@@ -1,9 +1,10 @@
-//classKey = "com,theguardian,www,"
-//classKey = "uk,co,bbc,www,"
-//MAX_URLS_TO_LIST = 10
+// Lists the first params.limit pending URLs in the queue of params.url as
+// JSON: {"queue": ..., "urls": [{"queue": ..., "scheduling_directive": ...,
+//   "precedence": ..., "path_from_seed": ..., "uri": ..., "via": ...}, ...],
+//   "count": n}
 
-uri = "{{ url }}"
-MAX_URLS_TO_LIST = {{ limit }}
+uri = params.url
+MAX_URLS_TO_LIST = params.limit ?: 10
 pathFromSeed = ""
 
 // groovy
@@ -12,6 +13,7 @@ pathFromSeed = ""
 import com.sleepycat.je.CursorConfig
 import com.sleepycat.je.DatabaseEntry;
 import com.sleepycat.je.OperationStatus;
+import groovy.json.JsonOutput
 import org.archive.modules.CrawlURI
 import org.archive.net.UURI
 import org.archive.modules.extractor.LinkContext
@@ -38,18 +40,23 @@ cursor = pendingUris.pendingUrisDB.openCursor(null, CursorConfig.READ_COMMITTED)
 key = new DatabaseEntry(BdbMultipleWorkQueues.calculateOriginKey(classKey));
 value = new DatabaseEntry();
 count = 0;
+urls = []
 cursor.getSearchKey(key, value, null);
-while (cursor.getNext(key, value, null) == OperationStatus.SUCCESS && count < MAX_URLS_TO_LIST) {
+// Check the count first, so the cursor stops at the limit rather than one past it:
+while (count < MAX_URLS_TO_LIST && cursor.getNext(key, value, null) == OperationStatus.SUCCESS) {
     if (value.getData().length == 0) {
         continue;
     }
     curi = pendingUris.crawlUriBinding.entryToObject(value);
-    //if( curi.toString().startsWith(uri) ) {
-      rawOut.println( curi.getClassKey() + "" + curi.getSchedulingDirective() + "." + curi.getPrecedence() + "." + curi.getOrdinal() + " " + curi.pathFromSeed + " " + curi );
-      count++
-    //}
+    // Stop at the end of this queue rather than running on into the next:
+    if (curi.getClassKey() != classKey) {
+        break;
+    }
+    urls << [queue: curi.getClassKey(), scheduling_directive: curi.getSchedulingDirective(),
+        precedence: curi.getPrecedence(), path_from_seed: curi.pathFromSeed, uri: curi.toString(),
+        via: curi.getVia()?.toString()]
+    count++
 }
 cursor.close();
  
-rawOut.println()
-rawOut.println "---- Total " + count + " pending urls listed ----"
+rawOut.print(JsonOutput.toJson([queue: classKey, urls: urls, count: count]))
@@ -0,0 +1,53 @@
+// Lists one page of the pending URLs, in frontier key order, starting after
+// params.after (a base64 key; null to start at the beginning). Prints
+// {"urls": [[classKey, schedulingDirective, precedence, pathFromSeed, uri, via], ...],
+//  "next": <key to continue from, or null at the end>}
+
+import com.sleepycat.je.CursorConfig
+import com.sleepycat.je.DatabaseEntry
+import com.sleepycat.je.OperationStatus
+import groovy.json.JsonOutput
+
+after = params.after
+PAGE_SIZE = params.page_size
+
+pendingUris = job.crawlController.frontier.pendingUris
+cursor = pendingUris.pendingUrisDB.openCursor(null, CursorConfig.READ_COMMITTED)
+key = new DatabaseEntry()
+value = new DatabaseEntry()
+lastKey = null
+count = 0
+urls = []
+
+try {
+    if (after) {
+        afterKey = after.decodeBase64()
+        key.setData(afterKey)
+        status = cursor.getSearchKeyRange(key, value, null)
+        if (status == OperationStatus.SUCCESS && Arrays.equals(key.getData(), afterKey)) {
+            status = cursor.getNext(key, value, null)
+        }
+    } else {
+        status = cursor.getFirst(key, value, null)
+    }
+    while (status == OperationStatus.SUCCESS && count < PAGE_SIZE) {
+        // Empty values mark the start of a queue:
+        if (value.getData().length > 0) {
+            curi = pendingUris.crawlUriBinding.entryToObject(value)
+            urls << [curi.getClassKey(), curi.getSchedulingDirective(), curi.getPrecedence(),
+                curi.getPathFromSeed(), curi.toString(), curi.getVia()?.toString() ?: ""]
+            count++
+        }
+        lastKey = key.getData().clone()
+        status = cursor.getNext(key, value, null)
+    }
+} finally {
+    cursor.close()
+}
+
+next = null
+if (status == OperationStatus.SUCCESS && lastKey != null) {
+    next = lastKey.encodeBase64().toString()
+}
+
+rawOut.print(JsonOutput.toJson([urls: urls, next: next]))
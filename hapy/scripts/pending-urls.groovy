@@ -1,10 +1,15 @@
-MAX_URLS_TO_LIST = {{ limit }}
+// Lists the first params.limit pending URLs as JSON:
+// {"urls": [{"queue": ..., "scheduling_directive": ..., "precedence": ...,
+//   "path_from_seed": ..., "uri": ..., "via": ...}, ...], "count": n}
+
+MAX_URLS_TO_LIST = params.limit ?: 10
 
 // see org.archive.crawler.frontier.BdbMultipleWorkQueues.forAllPendingDo()
 
 import com.sleepycat.je.CursorConfig 
 import com.sleepycat.je.DatabaseEntry;
 import com.sleepycat.je.OperationStatus;
+import groovy.json.JsonOutput
  
 pendingUris = job.crawlController.frontier.pendingUris
  
@@ -15,16 +20,19 @@ cursor = pendingUris.pendingUrisDB.openCursor(null, CursorConfig.READ_COMMITTED)
 key = new DatabaseEntry();
 value = new DatabaseEntry();
 count = 0;
+urls = []
  
-while (cursor.getNext(key, value, null) == OperationStatus.SUCCESS && count < MAX_URLS_TO_LIST) {
+// Check the count first, so the cursor stops at the limit rather than one past it:
+while (count < MAX_URLS_TO_LIST && cursor.getNext(key, value, null) == OperationStatus.SUCCESS) {
     if (value.getData().length == 0) {
         continue;
     }
     curi = pendingUris.crawlUriBinding.entryToObject(value);
-    rawOut.println( "" + curi.getSchedulingDirective() + "-" + curi.getPrecedence() + "-" + curi.pathFromSeed + " " + curi );
+    urls << [queue: curi.getClassKey(), scheduling_directive: curi.getSchedulingDirective(),
+        precedence: curi.getPrecedence(), path_from_seed: curi.pathFromSeed, uri: curi.toString(),
+        via: curi.getVia()?.toString()]
     count++
 }
 cursor.close();
  
-rawOut.println()
-rawOut.println "---- Total " + count + " pending urls listed ----"
+rawOut.print(JsonOutput.toJson([urls: urls, count: count]))
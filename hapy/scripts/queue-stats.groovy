@@ -0,0 +1,66 @@
+// Summarises the frontier's work queues inside the engine. Prints the
+// totals and the TOP queues by SORT_BY (descending) as JSON:
+//   {"totals": {"queues": n, "urls": n, "active": n, "snoozed": n,
+//               "retired": n, "inactive": n, "spent": n},
+//    "rows": [[classKey, state, size, enqueued, spent, sessionBudget,
+//              sessionBalance, totalBudget, errors, wakeTime, lastDequeueTime], ...]}
+// Times are in milliseconds since the epoch, 0 if unset. Only TOP rows are
+// kept while scanning, however many queues there are.
+
+import groovy.json.JsonOutput
+
+TOP = params.top
+SORT_BY = params.sort_by
+
+frontier = job.crawlController.frontier
+now = System.currentTimeMillis()
+totals = [queues: 0, urls: 0, active: 0, snoozed: 0, retired: 0, inactive: 0, spent: 0]
+top = new PriorityQueue(Math.max(TOP, 1), { a, b -> a[SORT_BY] <=> b[SORT_BY] } as Comparator)
+
+for (classKey in frontier.allQueues.keySet()) {
+    q = frontier.allQueues.get(classKey)
+    if (q == null) {
+        continue
+    }
+    if (q.isRetired()) {
+        state = "retired"
+    } else if (q.wakeTime > now) {
+        state = "snoozed"
+    } else if (q.active) {
+        state = "active"
+    } else {
+        state = "inactive"
+    }
+    row = [
+        queue: classKey,
+        state: state,
+        size: q.getCount(),
+        enqueued: q.enqueueCount,
+        spent: q.totalExpenditure,
+        session_budget: q.sessionBudget,
+        session_balance: q.sessionBalance,
+        total_budget: q.totalBudget,
+        errors: q.errorCount,
+        wake_time: q.wakeTime,
+        last_dequeue: q.lastDequeueTime
+    ]
+    totals.queues++
+    totals.urls += row.size
+    totals[state]++
+    totals.spent += row.spent
+    if (TOP > 0) {
+        top.add(row)
+        if (top.size() > TOP) {
+            top.poll()
+        }
+    }
+}
+
+rows = []
+while (!top.isEmpty()) {
+    row = top.poll()
+    rows << [row.queue.toString(), row.state, row.size, row.enqueued, row.spent, row.session_budget,
+        row.session_balance, row.total_budget, row.errors, row.wake_time, row.last_dequeue]
+}
+
+rawOut.print(JsonOutput.toJson([totals: totals, rows: rows.reverse()]))
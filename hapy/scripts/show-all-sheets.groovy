@@ -1,20 +1,20 @@
 //Groovy
+// Prints the sheet associations (SURT prefix to sheet names) and the sheets
+// (name to overridden settings) as one JSON object.
+import groovy.json.JsonOutput
+
 mgr = appCtx.getBean("sheetOverlaysManager")
 
-//review the associations
-rawOut.println("------------------");
-rawOut.println("SHEET ASSOCIATIONS");
-rawOut.println("------------------\n");
-mgr.sheetNamesBySurt.each{ k, v -> 
-    rawOut.println("$k\n $v\n")
+associations = [:]
+mgr.sheetNamesBySurt.each{ k, v ->
+    associations[k.toString()] = v.collect{ it.toString() }
 }
 
-// List the sheets:
-rawOut.println("------")
-rawOut.println("SHEETS")
-rawOut.println("------\n")
+sheets = [:]
 mgr.getSheetsByName().each{ name, sheet ->
-    rawOut.println("$name")
-    sheet.getMap().each{ k, v -> rawOut.println("$k = $v") }
-    rawOut.println("")
+    settings = [:]
+    sheet.getMap().each{ k, v -> settings[k.toString()] = v.toString() }
+    sheets[name.toString()] = settings
 }
+
+rawOut.print(JsonOutput.toJson([associations: associations, sheets: sheets]))
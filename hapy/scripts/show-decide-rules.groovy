@@ -1,18 +1,20 @@
 //Groovy
-def printProps(obj){
+// Prints the scope's decide rules, in order, as JSON:
+// {"rules": [{"class": ..., "properties": {name: value, ...}}, ...]}
+import groovy.json.JsonOutput
+
+def describe(obj){
   // getProperties is a groovy introspective shortcut. it returns a map
+  def properties = [:]
   obj.properties.each{ prop ->
-    // prop is a Map.Entry
-    rawOut.println "\n"+ prop
-    try{ // some things don't like you to get their class. ignore those.
-      rawOut.println "TYPE: "+ prop.value.class.name
+    // some things don't like to be turned into strings. ignore those.
+    try{
+      properties[prop.key.toString()] = prop.value == null ? null : prop.value.toString()
     }catch(Exception e){}
   }
+  return [class: obj.class.name, properties: properties]
 }
-  
-// loop through the rules
-counter = 0
-appCtx.getBean("scope").rules.each { rule ->
-  rawOut.println("\n###############${counter++}\n")
-  printProps( rule )
-}
\ No newline at end of file
+
+rules = appCtx.getBean("scope").rules.collect{ rule -> describe( rule ) }
+
+rawOut.print(JsonOutput.toJson([rules: rules]))
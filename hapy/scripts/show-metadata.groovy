@@ -1,4 +1,9 @@
+// Prints the crawl metadata as a JSON object of property to value.
+import groovy.json.JsonOutput
+
+metadata = [:]
 appCtx.getBean("metadata").keyedProperties.each{ k, v ->
-  rawOut.println( k)
-  rawOut.println(" $v\n")
+  metadata[k.toString()] = v == null ? null : v.toString()
 }
+
+rawOut.print(JsonOutput.toJson(metadata))
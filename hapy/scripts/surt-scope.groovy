@@ -1,8 +1,10 @@
 //Groovy
+// Prints the SURT prefixes accepted by the scope as JSON: {"surts": [...]}
+import groovy.json.JsonOutput
+
 rule = appCtx.getBean("scope").rules.find{ rule ->
   rule.class == org.archive.modules.deciderules.surt.SurtPrefixedDecideRule &&
   rule.decision == org.archive.modules.deciderules.DecideResult.ACCEPT
 }
- 
-//dump the list of surts excluded to check results
-rule.surtPrefixes.each{ rawOut.println(it) }
\ No newline at end of file
+
+rawOut.print(JsonOutput.toJson([surts: rule.surtPrefixes.collect{ it.toString() }]))
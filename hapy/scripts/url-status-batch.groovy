@@ -0,0 +1,96 @@
+// Looks up the status of a batch of URLs, params.urls.
+// The URLs are grouped by queue so each queue is scanned once, for at most
+// MAX_SCAN entries, and their fetch history is read from the persist store.
+// Prints one JSON object:
+//   {"<url>": {"queue": ..., "pending": true|false|null, "history": [...]}, ...}
+// "pending" is null when the URL wasn't found in the part of a long queue
+// that was scanned, and "error" is set for URLs that couldn't be parsed.
+
+import org.json.JSONArray
+import org.json.JSONObject
+import com.sleepycat.je.CursorConfig
+import com.sleepycat.je.DatabaseEntry
+import com.sleepycat.je.OperationStatus
+import org.archive.modules.CrawlURI
+import org.archive.net.UURI
+import org.archive.modules.extractor.LinkContext
+import org.archive.crawler.frontier.BdbMultipleWorkQueues
+import org.archive.modules.recrawl.RecrawlAttributeConstants
+
+urls = params.urls*.trim().findAll { it }
+MAX_SCAN = params.max_scan
+
+frontier = job.crawlController.frontier
+pendingUris = frontier.pendingUris
+loadProcessor = appCtx.getBean("persistLoadProcessor")
+result = new JSONObject()
+// classKey -> URL as the frontier prints it -> URLs as requested:
+byQueue = [:]
+
+urls.each { uri ->
+    def status = new JSONObject()
+    result.put(uri, status)
+    try {
+        // Construct the CrawlURI, taking care to cope with API changes in recent H3 updates:
+        def uuri
+        try {
+            uuri = new UURI(uri, false)
+        } catch (groovy.lang.GroovyRuntimeException e) {
+            uuri = new UURI(uri, false, "UTF-8")
+        }
+        def curi = new CrawlURI(uuri, "", null, LinkContext.NAVLINK_MISC)
+        frontier.frontierPreparer.prepare(curi)
+        status.put("queue", curi.getClassKey())
+        byQueue.get(curi.getClassKey(), [:]).get(curi.toString(), []) << uri
+
+        def fetches = new JSONArray()
+        def history = loadProcessor.store.get(loadProcessor.persistKeyFor(uri))
+        if (history != null) {
+            history.get(RecrawlAttributeConstants.A_FETCH_HISTORY).each { fetch ->
+                if (fetch != null) {
+                    fetches.put(fetch)
+                }
+            }
+        }
+        status.put("history", fetches)
+    } catch (Exception e) {
+        status.put("error", e.toString())
+    }
+}
+
+byQueue.each { classKey, wanted ->
+    def found = [] as Set
+    def complete = true
+    def scanned = 0
+    def cursor = pendingUris.pendingUrisDB.openCursor(null, CursorConfig.READ_COMMITTED)
+    try {
+        def key = new DatabaseEntry(BdbMultipleWorkQueues.calculateOriginKey(classKey))
+        def value = new DatabaseEntry()
+        def op = cursor.getSearchKeyRange(key, value, null)
+        while (op == OperationStatus.SUCCESS && found.size() < wanted.size()) {
+            // Empty values mark the start of a queue:
+            if (value.getData().length > 0) {
+                def match = pendingUris.crawlUriBinding.entryToObject(value)
+                if (match.getClassKey() != classKey) {
+                    break
+                }
+                if (wanted.containsKey(match.toString())) {
+                    found << match.toString()
+                }
+                if (++scanned >= MAX_SCAN) {
+                    complete = false
+                    break
+                }
+            }
+            op = cursor.getNext(key, value, null)
+        }
+    } finally {
+        cursor.close()
+    }
+    wanted.each { canonical, requested ->
+        def pending = found.contains(canonical) ? true : (complete ? false : JSONObject.NULL)
+        requested.each { result.getJSONObject(it).put("pending", pending) }
+    }
+}
+
+rawOut.print(result.toString())
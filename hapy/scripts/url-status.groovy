@@ -1,5 +1,5 @@
-uri="{{ url }}"
-MAX_URLS_TO_LIST = {{ limit }}
+uri = params.url
+MAX_URLS_TO_LIST = params.limit ?: 10
 pathFromSeed = ""
 
 import org.json.JSONObject
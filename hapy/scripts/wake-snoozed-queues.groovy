@@ -1,10 +1,11 @@
 //Groovy
-  
+// Wakes all snoozed queues and prints the snoozed counts before and after
+// as JSON: {"before": n, "after": n}
+import groovy.json.JsonOutput
+
 countBefore = job.crawlController.frontier.getSnoozedCount()
- 
+
 job.crawlController.frontier.forceWakeQueues()
 countAfter = job.crawlController.frontier.getSnoozedCount()
- 
-rawOut.println("Snoozed queues.")
-rawOut.println(" - Before: " + countBefore)
-rawOut.println(" - After: " + countAfter)
\ No newline at end of file
+
+rawOut.print(JsonOutput.toJson([before: countBefore, after: countAfter]))
@@ -0,0 +1,45 @@
+'''
+Looking up the status of many URLs at once.
+
+URLs are sent in chunks to the url-status-batch script, which groups each
+chunk by queue so every queue is scanned once, reads the fetch history of
+all of them and answers with one JSON document. Chunks run concurrently.
+'''
+import logging
+
+from concurrent import futures
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_SCAN = 100000
+
+
+def chunked(urls, chunk_size):
+    '''Yields lists of up to `chunk_size` distinct, non-blank URLs.'''
+    seen = set()
+    chunk = []
+    for url in urls:
+        url = url.strip()
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        chunk.append(url)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def url_status_batch(hapy, job, urls, chunk_size=DEFAULT_CHUNK_SIZE,
+                     concurrency=DEFAULT_CONCURRENCY, max_scan=DEFAULT_MAX_SCAN):
+    def lookup(chunk):
+        return hapy.run_script(job, 'url-status-batch', urls=chunk, max_scan=max_scan) or {}
+
+    result = {}
+    with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for statuses in executor.map(lookup, chunked(urls, chunk_size)):
+            result.update(statuses)
+    return result
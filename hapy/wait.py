@@ -0,0 +1,123 @@
+'''
+Waiting for jobs to reach a state or offer an action.
+
+Polling starts fast when the client has just sent an action, since the
+job is about to change, and otherwise at a slower rate. Each poll that
+sees no change stretches the interval, up to a ceiling. Any change of
+state snaps it back to fast, because one transition (PREPARING) is
+usually followed closely by the next (PAUSED).
+
+Waiting for states reads the job list on the engine page, one request per
+round for any number of jobs. Waiting for an action reads a `JobStatus`
+from each job's page, which is the one place `availableActions` appears.
+The full `JobInfo` is only fetched once the wait is over.
+'''
+import time
+
+FAST_INTERVAL = 0.1
+SLOW_INTERVAL = 1.0
+MAX_INTERVAL = 5.0
+BACKOFF = 1.5
+# How long after an action polling starts at FAST_INTERVAL:
+RECENT_ACTION = 10.0
+
+
+def state_set(states):
+    '''A frozenset of one state name or an iterable of them.'''
+    if isinstance(states, str):
+        return frozenset([states])
+    return frozenset(states)
+
+
+def deadline(timeout):
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def recent(acted_at):
+    return acted_at is not None and time.monotonic() - acted_at < RECENT_ACTION
+
+
+class Backoff(object):
+    '''Poll intervals that grow while nothing changes.'''
+
+    def __init__(self, recent=False, fast=FAST_INTERVAL, slow=SLOW_INTERVAL,
+                 maximum=MAX_INTERVAL, factor=BACKOFF):
+        self.fast = fast
+        self.maximum = maximum
+        self.factor = factor
+        self.interval = fast if recent else slow
+
+    def next(self, changed=False):
+        if changed:
+            self.interval = self.fast
+        interval = self.interval
+        self.interval = min(self.interval * self.factor, self.maximum)
+        return interval
+
+
+class StateWaiter(object):
+    '''
+    Tracks jobs until each is in one of its target states. Feed it the
+    engine's job index with `update()` after every poll. A job missing
+    from the index is in state None.
+    '''
+
+    def __init__(self, targets, timeout=None, recent=False):
+        self.targets = dict((job, state_set(states)) for job, states in targets.items())
+        self.waiting = set(self.targets)
+        self.states = {}
+        self.deadline = deadline(timeout)
+        self.timeout = timeout
+        self.backoff = Backoff(recent)
+
+    def update(self, index):
+        '''
+        Takes a dict of job name to `JobSummary` and returns how long to
+        sleep before the next poll, or None once every job is there.
+        Raises TimeoutError if the deadline passes first.
+        '''
+        changed = False
+        for job in list(self.waiting):
+            summary = index.get(job)
+            state = summary.crawl_controller_state if summary is not None else None
+            if job in self.states and self.states[job] != state:
+                changed = True
+            self.states[job] = state
+            if state in self.targets[job]:
+                self.waiting.discard(job)
+        if not self.waiting:
+            return None
+        return self._delay(changed)
+
+    def _delay(self, changed):
+        delay = self.backoff.next(changed)
+        if self.deadline is not None:
+            left = self.deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError("Gave up after %ss waiting for %s" % (self.timeout, ', '.join(
+                    '%s to be %s (is %s)' % (job, '/'.join(sorted(str(s) for s in self.targets[job])), self.states.get(job))
+                    for job in sorted(self.waiting))))
+            delay = min(delay, left)
+        return delay
+
+
+class ActionWaiter(StateWaiter):
+    '''Tracks one job until `action` is among its available actions.'''
+
+    def __init__(self, job, action, timeout=None, recent=False):
+        StateWaiter.__init__(self, {job: ()}, timeout, recent)
+        self.job = job
+        self.action = action
+
+    def update(self, status):
+        '''Like `StateWaiter.update`, but takes the job's `JobStatus`.'''
+        state = status.state
+        changed = self.job in self.states and self.states[self.job] != state
+        self.states[self.job] = state
+        if self.action in status.actions:
+            return None
+        try:
+            return self._delay(changed)
+        except TimeoutError:
+            raise TimeoutError("Gave up after %ss waiting for %s to offer '%s' (is %s, offers %s)" % (
+                self.timeout, self.job, self.action, state, ', '.join(status.actions)))
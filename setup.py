@@ -35,7 +35,8 @@ setup(
         ],
     entry_points={
         'console_scripts': [
-            'h3cc=hapy.h3cc:main'
+            'h3cc=hapy.h3cc:main',
+            'hapy-exporter=hapy.exporter:main'
         ]
     }
 )
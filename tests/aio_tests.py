@@ -0,0 +1,93 @@
+import asyncio
+import inspect
+import time
+
+from nose.tools import (
+    raises,
+    assert_equals,
+    assert_true
+)
+
+import hapy
+
+from .fake_engine import FakeEngine
+
+# Blocking helpers with no coroutine counterpart, and plain context managers:
+SYNC_ONLY = set(['close', 'connection_stats', 'tail_crawl_log', 'read_log', 'capture',
+                 'coalesce_stats'])
+
+
+def test_mirrors_hapy():
+    sync = set(name for name, _ in inspect.getmembers(hapy.Hapy, inspect.isfunction)
+               if not name.startswith('_'))
+    for name in sync - SYNC_ONLY:
+        method = getattr(hapy.AsyncHapy, name, None)
+        assert_true(inspect.iscoroutinefunction(method) or inspect.isasyncgenfunction(method), name)
+
+
+def test_get_info():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url, username='admin', password='admin') as h:
+            return await h.get_info()
+    with FakeEngine(username='admin', password='admin') as engine:
+        info = asyncio.run(go(engine))
+    assert_equals('3.1.1', info['engine']['heritrixVersion'])
+
+
+def test_get_job_info():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return await h.get_job_info('test')
+    with FakeEngine() as engine:
+        info = asyncio.run(go(engine))
+    assert_equals('test', info['job']['shortName'])
+    assert_equals(('GET', '/engine/job/test', b''), engine.requests[-1])
+
+
+def test_build_job():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url, username='admin', password='admin') as h:
+            await h.build_job('test')
+    with FakeEngine(username='admin', password='admin') as engine:
+        asyncio.run(go(engine))
+    assert_equals(('POST', '/engine/job/test', b'action=build'), engine.requests[-1])
+
+
+def test_execute_script():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return await h.execute_script('test', 'groovy', 'rawOut.print("a")')
+    with FakeEngine() as engine:
+        raw, html = asyncio.run(go(engine))
+    assert_equals('raw', raw)
+    assert_equals(None, html)
+
+
+def test_submit_configuration():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            await h.submit_configuration('test', 'cxml')
+    with FakeEngine() as engine:
+        asyncio.run(go(engine))
+    assert_equals(('PUT', '/engine/job/test/jobdir/crawler-beans.cxml', b'cxml'), engine.requests[-1])
+
+
+@raises(hapy.HapyException)
+def test_wrong_code():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            await h._http_get('%s/nothing' % engine.base_url)
+    with FakeEngine() as engine:
+        asyncio.run(go(engine))
+
+
+def test_concurrent_requests():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return await asyncio.gather(*[h.get_job_info('test') for i in range(10)])
+    with FakeEngine(delay=0.2) as engine:
+        start = time.time()
+        infos = asyncio.run(go(engine))
+        elapsed = time.time() - start
+    assert_equals(10, len(infos))
+    assert_true(elapsed < 1.0, elapsed)
@@ -0,0 +1,75 @@
+from nose.tools import (
+    assert_equals,
+    assert_almost_equals,
+    assert_true
+)
+
+import numpy as np
+
+from hapy.analytics import (
+    ChunkBuilder,
+    CrawlLogStats,
+    analyse,
+    chunks,
+    host_of
+)
+from hapy.crawllog import parse_line
+
+LINES = [
+    '2020-07-02T10:00:00.000Z 200 1000 http://a.com/1 - - text/html #001 20200702100000000+10 sha1:A - -',
+    '2020-07-02T10:00:01.000Z 200 3000 http://a.com/2 L http://a.com/1 text/html #002 20200702100001000+20 sha1:B - -',
+    '2020-07-02T10:00:02.000Z 404 500 https://B.com:8080/x L http://a.com/1 text/plain #003 20200702100002000+1000 sha1:C - -',
+    '2020-07-02T10:00:03.000Z -6 - dns:c.com P http://c.com/ text/dns #004 - - - -',
+    'garbage',
+    '2020-07-02T10:00:04.000Z 200 500 http://user@a.com/3 L http://a.com/1 image/png #001 20200702100004000+30 sha1:D - -',
+]
+
+
+def test_host_of():
+    assert_equals('a.com', host_of('http://a.com/1'))
+    assert_equals('b.com', host_of('https://user@B.com:8080/x'))
+    assert_equals('c.com', host_of('dns:c.com'))
+    assert_equals('', host_of('whois:nothing'))
+
+
+def test_chunks_are_columnar():
+    builder = ChunkBuilder(2)
+    cs = list(chunks(LINES, builder=builder))
+    assert_equals([2, 2, 1], [len(c) for c in cs])
+    assert_equals(np.int16, cs[0].status.dtype)
+    assert_equals(np.int64, cs[0].size.dtype)
+    assert_equals([200, 200], list(cs[0].status))
+    assert_equals([1000, -1], list(cs[1].duration))
+    assert_equals(['a.com', 'b.com', 'c.com'], builder.hosts.values)
+    assert_equals([1, 2], list(cs[1].host))
+
+
+def test_aggregates():
+    stats = analyse(LINES, chunk_size=2)
+    assert_equals(5, stats.lines)
+    assert_equals(5000, stats.bytes)
+    assert_equals({200: 3, 404: 1, -6: 1}, stats.by_status())
+    assert_equals([('a.com', 3, 4500), ('b.com', 1, 500), ('c.com', 1, 0)], stats.by_host())
+    assert_equals(('text/html', 2, 4000), stats.by_mime()[0])
+    assert_almost_equals(4.0, stats.elapsed_seconds())
+    assert_almost_equals(1250.0, stats.bytes_per_second())
+
+
+def test_latency_percentiles():
+    stats = analyse(LINES)
+    p = stats.latency_percentiles((50, 99))
+    # Bins are 5% wide, so allow for that:
+    assert_true(20 <= p[50] <= 21.5, p)
+    assert_true(1000 <= p[99] <= 1060, p)
+
+
+def test_chunking_does_not_change_results():
+    a = analyse(LINES * 50, chunk_size=7).summary()
+    b = analyse(LINES * 50, chunk_size=1000).summary()
+    assert_equals(a, b)
+
+
+def test_records_and_batches():
+    records = [parse_line(l) for l in LINES if parse_line(l)]
+    stats = CrawlLogStats(ChunkBuilder(3)).consume([records[:2], records[2:]])
+    assert_equals(5, stats.lines)
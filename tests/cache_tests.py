@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+from nose.tools import (
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.cache import MISS, ResponseCache
+from hapy.hapy import _cache_key
+
+from .fake_engine import FakeEngine
+
+
+def test_cache_key():
+    assert_equals(('engine', None), _cache_key('/engine', 'https://h:8443/engine/'))
+    assert_equals(('job', 'a b'), _cache_key('/engine', 'https://h:8443/engine/job/a%20b'))
+    assert_equals(('file', 'test'), _cache_key(
+        '/engine', 'https://h:8443/engine/job/test/jobdir/crawler-beans.cxml'))
+    assert_equals(('file', None), _cache_key('/engine', 'https://h:8443/other'))
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(ttls={'job': 0.05})
+    cache.put('job', 'a', 'k', 1)
+    assert_equals(1, cache.get('job', 'a', 'k'))
+    time.sleep(0.1)
+    assert_true(cache.get('job', 'a', 'k') is MISS)
+
+
+def test_zero_ttl_disables_kind():
+    cache = ResponseCache(ttls={'file': 0})
+    cache.put('file', None, 'k', 1)
+    assert_equals(0, len(cache))
+
+
+def test_lru_eviction():
+    cache = ResponseCache(maxsize=2)
+    cache.put('job', 'a', 'a', 1)
+    cache.put('job', 'b', 'b', 2)
+    cache.get('job', 'a', 'a')
+    cache.put('job', 'c', 'c', 3)
+    assert_true(cache.get('job', 'b', 'b') is MISS)
+    assert_equals(1, cache.get('job', 'a', 'a'))
+    assert_equals(1, cache.stats()['evictions'])
+
+
+def test_invalidate():
+    cache = ResponseCache()
+    cache.put('engine', None, 'e', 0)
+    cache.put('job', 'a', 'a', 1)
+    cache.put('config_url', 'a', 'config_url', 'url')
+    cache.put('job', 'b', 'b', 2)
+    cache.invalidate('a')
+    assert_true(cache.get('engine', None, 'e') is MISS)
+    assert_true(cache.get('job', 'a', 'a') is MISS)
+    assert_equals('url', cache.get('config_url', 'a', 'config_url'))
+    assert_equals(2, cache.get('job', 'b', 'b'))
+    cache.invalidate('a', everything=True)
+    assert_true(cache.get('config_url', 'a', 'config_url') is MISS)
+
+
+def test_hapy_reuses_job_info():
+    with FakeEngine() as engine:
+        with hapy.Hapy(engine.base_url, cache=ResponseCache()) as h:
+            h.get_job_info('test')
+            h.get_job_info_model('test')
+            h.get_job_info('other')
+    assert_equals(['/engine/job/test', '/engine/job/other'], [p for m, p, b in engine.requests])
+
+
+def test_hapy_actions_invalidate_job():
+    with FakeEngine() as engine:
+        with hapy.Hapy(engine.base_url, cache=ResponseCache()) as h:
+            h.get_job_info('test')
+            h.get_job_info('other')
+            h.launch_job('test')
+            h.get_job_info('test')
+            h.get_job_info('other')
+    assert_equals(
+        [('GET', '/engine/job/test'), ('GET', '/engine/job/other'),
+         ('POST', '/engine/job/test'), ('GET', '/engine/job/test')],
+        [(m, p) for m, p, b in engine.requests])
+
+
+def test_hapy_caches_config_url():
+    with FakeEngine() as engine:
+        with hapy.Hapy(engine.base_url, cache=ResponseCache()) as h:
+            h.submit_configuration('test', 'one')
+            h.submit_configuration('test', 'two')
+    assert_equals(
+        [('GET', '/engine/job/test'),
+         ('PUT', '/engine/job/test/jobdir/crawler-beans.cxml'),
+         ('PUT', '/engine/job/test/jobdir/crawler-beans.cxml')],
+        [(m, p) for m, p, b in engine.requests])
+
+
+def test_async_hapy_cache():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url, cache=ResponseCache()) as h:
+            await h.get_info()
+            await h.get_info()
+            await h.rescan_job_directory()
+            await h.get_info()
+    with FakeEngine() as engine:
+        asyncio.run(go(engine))
+    assert_equals(['GET', 'POST', 'GET'], [m for m, p, b in engine.requests])
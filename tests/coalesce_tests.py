@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+from concurrent import futures
+
+from nose.tools import (
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.coalesce import SingleFlight
+
+from .fake_engine import FakeEngine, xml_asset
+
+THREADS = 8
+
+
+def together(fn, n=THREADS):
+    '''Calls `fn()` on `n` threads at once; returns the results or exceptions.'''
+    start = threading.Barrier(n)
+
+    def run(i):
+        start.wait()
+        try:
+            return fn()
+        except Exception as e:
+            return e
+    with futures.ThreadPoolExecutor(max_workers=n) as executor:
+        return list(executor.map(run, range(n)))
+
+
+def gets(engine):
+    return [r for r in engine.requests if r[0] == 'GET']
+
+
+def test_single_flight():
+    flights = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return object()
+    results = together(lambda: flights.do('k', slow))
+    assert_equals(1, len(calls))
+    assert_true(all(result is results[0] for result in results))
+    assert_equals(dict(calls=THREADS, coalesced=THREADS - 1, in_flight=0), flights.stats())
+    # Once the call is over, the next one starts afresh:
+    flights.do('k', slow)
+    assert_equals(2, len(calls))
+
+
+def test_errors_are_shared():
+    flights = SingleFlight()
+
+    def fail():
+        time.sleep(0.2)
+        raise ValueError('no')
+    results = together(lambda: flights.do('k', fail))
+    assert_true(all(isinstance(result, ValueError) for result in results), results)
+    assert_equals(THREADS - 1, flights.stats()['coalesced'])
+
+
+def test_concurrent_calls_share_a_request():
+    with FakeEngine(delay=0.2) as engine:
+        h = hapy.Hapy(engine.base_url, pool_maxsize=THREADS)
+        results = together(lambda: h.get_job_info('test'))
+    assert_equals(1, len(gets(engine)))
+    assert_equals('test', results[0]['job']['shortName'])
+    assert_true(all(result is results[0] for result in results))
+    assert_equals(THREADS - 1, h.coalesce_stats()['coalesced'])
+
+
+def test_lookups_share_a_get():
+    lookups = [lambda h: h.get_info(), lambda h: h.get_info_model()]
+    with FakeEngine(delay=0.2) as engine:
+        h = hapy.Hapy(engine.base_url)
+        together(lambda: lookups.pop()(h), 2)
+    # Each parses the page in its own way, from the one response:
+    assert_equals(1, len(gets(engine)))
+    assert_equals(1, h.coalesce_stats()['coalesced'])
+
+
+def test_sequential_calls_are_not_coalesced():
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url)
+        h.get_job_status('test')
+        h.get_job_status('test')
+    assert_equals(2, len(gets(engine)))
+    assert_equals(0, h.coalesce_stats()['coalesced'])
+
+
+def test_disabled():
+    with FakeEngine(delay=0.2) as engine:
+        h = hapy.Hapy(engine.base_url, pool_maxsize=THREADS, coalesce=False)
+        together(lambda: h.get_job_info('test'))
+    assert_equals(THREADS, len(gets(engine)))
+    assert_equals(dict(calls=0, coalesced=0, in_flight=0), h.coalesce_stats())
+
+
+def test_action_ends_sharing():
+    release = threading.Event()
+    first = []
+
+    def job_page(request, body, name):
+        if not first:
+            first.append(1)
+            release.wait(5)
+        return 200, xml_asset(request, 'test_get_job_info.xml'), {}
+    with FakeEngine() as engine:
+        engine.route('GET', r'/engine/job/([^/]+)/?', job_page)
+        h = hapy.Hapy(engine.base_url)
+        with futures.ThreadPoolExecutor(max_workers=1) as executor:
+            before = executor.submit(h.get_job_status, 'test')
+            while not first:
+                time.sleep(0.01)
+            h.pause_job('test')
+            # Started after the action, so it mustn't get the answer from before it:
+            after = h.get_job_status('test')
+            release.set()
+            before.result()
+    assert_equals(2, len(gets(engine)))
+    assert_equals('NASCENT', after.state)
+
+
+def test_async():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            results = await asyncio.gather(*[h.get_job_info('test') for i in range(THREADS)])
+            return h, results
+    with FakeEngine(delay=0.2) as engine:
+        h, results = asyncio.run(go(engine))
+    assert_equals(1, len(gets(engine)))
+    assert_true(all(result is results[0] for result in results))
+    assert_equals(THREADS - 1, h.coalesce_stats()['coalesced'])
+
+
+def test_async_cancelling_one_caller():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            first = asyncio.ensure_future(h.get_job_status('test'))
+            second = asyncio.ensure_future(h.get_job_status('test'))
+            await asyncio.sleep(0.05)
+            first.cancel()
+            return await second
+    with FakeEngine(delay=0.2) as engine:
+        status = asyncio.run(go(engine))
+    assert_equals('NASCENT', status.state)
+    assert_equals(1, len(gets(engine)))
@@ -0,0 +1,155 @@
+from nose.tools import (
+    raises,
+    assert_equals,
+    assert_is_none
+)
+
+import hapy
+from hapy.crawllog import CrawlLogTailer, parse_line
+
+from .fake_engine import FakeEngine, script_output, xml_asset
+
+LINE = ('2020-07-02T10:06:36.219Z   200       4526 http://example.com/a.css E '
+        'http://example.com/ text/css #042 20200702100636131+76 '
+        'sha1:BBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBB - duplicate:digest {"warcFilename":"x"}')
+LOG = 'test/jobdir/20200702100000/logs/crawl.log'
+
+
+def lines(n, start=0):
+    return ''.join(LINE.replace('/a.css', '/%d.css' % i) + '\n'
+                   for i in range(start, start + n)).encode('utf-8')
+
+
+def tailer(engine, **kwargs):
+    engine.route('POST', r'/engine/job/([^/]+)/script', script_output('{"launch_id": "20200702100000"}'))
+    h = hapy.Hapy(engine.base_url)
+    return h, CrawlLogTailer(h, 'test', follow=False, **kwargs)
+
+
+def test_parse_line():
+    r = parse_line(LINE)
+    assert_equals('2020-07-02T10:06:36.219Z', r.timestamp)
+    assert_equals(200, r.status)
+    assert_equals(4526, r.size)
+    assert_equals('http://example.com/a.css', r.uri)
+    assert_equals('E', r.discovery_path)
+    assert_equals('http://example.com/', r.via)
+    assert_equals('text/css', r.mime)
+    assert_equals(42, r.thread)
+    assert_equals(76, r.duration)
+    assert_equals('sha1:BBBBBBBBBBBBBBBBBBBBBBBBBBBBBBBB', r.digest)
+
+
+def test_parse_line_missing_values():
+    r = parse_line('2020-07-02T10:06:36.219Z -6 - dns:example.com P http://example.com/ '
+                   'text/dns #001 - - - -')
+    assert_equals(-6, r.status)
+    assert_equals(0, r.size)
+    assert_is_none(r.duration)
+    assert_is_none(parse_line('not a crawl log line'))
+
+
+def test_tail_in_batches():
+    with FakeEngine() as engine:
+        engine.files[LOG] = lines(25)
+        h, t = tailer(engine, batch_size=10)
+        sizes = [len(batch) for batch in t]
+    assert_equals([10, 10, 5], sizes)
+
+
+def test_tail_is_incremental():
+    with FakeEngine() as engine:
+        engine.files[LOG] = lines(3) + LINE[:20].encode('utf-8')
+        h, t = tailer(engine)
+        first = [r.uri for batch in t for r in batch]
+        engine.files[LOG] = lines(3) + lines(2, 3)
+        second = [r.uri for batch in t for r in batch]
+    assert_equals(3, len(first))
+    assert_equals(['http://example.com/3.css', 'http://example.com/4.css'], second)
+
+
+def test_tail_from_end():
+    with FakeEngine() as engine:
+        engine.files[LOG] = lines(3)
+        h, t = tailer(engine, from_start=False)
+        assert_equals([], list(t))
+        engine.files[LOG] = lines(4)
+        assert_equals(['http://example.com/3.css'], [r.uri for batch in t for r in batch])
+
+
+def test_tail_after_rotation():
+    with FakeEngine() as engine:
+        engine.files[LOG] = lines(5)
+        h, t = tailer(engine)
+        list(t)
+        engine.files[LOG] = lines(1, 100)
+        # The shorter log is read again from the start at once:
+        rotated = [r.uri for batch in t for r in batch]
+    assert_equals(['http://example.com/100.css'], rotated)
+
+
+def test_tail_after_rotation_to_a_longer_log():
+    with FakeEngine() as engine:
+        engine.files[LOG] = lines(2)
+        h, t = tailer(engine)
+        list(t)
+        # The new log grew past where the old one ended between polls:
+        engine.files[LOG] = lines(5, 100)
+        rotated = [r.uri for batch in t for r in batch]
+    assert_equals(['http://example.com/%d.css' % i for i in range(100, 105)], rotated)
+
+
+def test_tail_ends_with_unterminated_line():
+    with FakeEngine() as engine:
+        engine.files[LOG] = lines(2) + LINE.replace('/a.css', '/2.css').encode('utf-8')
+        h, t = tailer(engine, batch_size=10)
+        batches = list(t)
+    assert_equals([['http://example.com/0.css', 'http://example.com/1.css'], ['http://example.com/2.css']],
+                  [[r.uri for r in batch] for batch in batches])
+
+
+def test_tail_without_range_support():
+    with FakeEngine() as engine:
+        engine.ranges = False
+        engine.files[LOG] = lines(2)
+        h, t = tailer(engine)
+        list(t)
+        engine.files[LOG] = lines(3)
+        assert_equals(['http://example.com/2.css'], [r.uri for batch in t for r in batch])
+
+
+def test_tail_follows_new_launch():
+    with FakeEngine() as engine:
+        engine.files[LOG] = lines(2)
+        h, t = tailer(engine)
+        list(t)
+        engine.files['test/jobdir/20200801000000/logs/crawl.log'] = lines(1, 50)
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output('{"launch_id": "20200801000000"}'))
+        assert_equals(['http://example.com/50.css'], [r.uri for batch in t for r in batch])
+
+
+def test_tail_without_crawl_log_path():
+    def get_job_info(request, body, name):
+        body = xml_asset(request, 'test_get_job_info.xml')
+        return 200, body.replace(b'loggerModule.crawlLogPath', b'loggerModule.other'), {}
+    with FakeEngine() as engine:
+        engine.route('GET', r'/engine/job/([^/]+)/?', get_job_info)
+        engine.files[LOG] = lines(2)
+        h, t = tailer(engine)
+        assert_equals(['http://example.com/0.css', 'http://example.com/1.css'],
+                      [r.uri for batch in t for r in batch])
+
+
+def test_read_log():
+    with FakeEngine() as engine:
+        engine.files[LOG] = lines(3)
+        h = hapy.Hapy(engine.base_url)
+        records = [parse_line(line) for line in h.read_log('%s/job/%s' % (h.base_url, LOG))]
+    assert_equals(['http://example.com/%d.css' % i for i in range(3)], [r.uri for r in records])
+
+
+@raises(hapy.HapyException)
+def test_read_missing_log():
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url)
+        h.read_log('%s/job/test/jobdir/nothing.log' % h.base_url)
@@ -0,0 +1,71 @@
+import time
+import threading
+
+import requests
+
+from nose.tools import (
+    assert_equals,
+    assert_true
+)
+
+from hapy.exporter import Exporter, make_server, render
+from hapy.models import JobInfo
+
+from .fake_engine import FakeEngine, asset
+
+
+def test_render():
+    info = JobInfo.from_xml(asset('test_get_job_info.xml'))
+    text = render([('http://a', None)], [('http://b', 'test', info), ('http://b', 'other', None)]).decode('utf-8')
+    assert_true('heritrix_engine_up{host="http://a"} 0.0' in text, text)
+    assert_true('heritrix_job_up{host="http://b",job="test"} 1.0' in text, text)
+    assert_true('heritrix_job_up{host="http://b",job="other"} 0.0' in text, text)
+    assert_true('heritrix_job_deepest_queue_depth{host="http://b",job="test"} -1.0' in text, text)
+    assert_true('# TYPE heritrix_job_downloaded_uris_total counter' in text, text)
+    # A job that couldn't be read has no other series:
+    assert_equals(1, text.count('job="other"'))
+
+
+def test_poll():
+    with FakeEngine() as engine:
+        exporter = Exporter([engine.base_url])
+        text = exporter.poll().decode('utf-8')
+        exporter.stop()
+    assert_equals(1, exporter.rounds)
+    assert_true('heritrix_engine_up{host="%s"} 1.0' % engine.base_url in text, text)
+    assert_true('heritrix_job_up{host="%s",job="test"} 1.0' % engine.base_url in text, text)
+    assert_true('heritrix_job_state{host="%s",job="test",state="' % engine.base_url in text, text)
+
+
+def test_poll_only_named_jobs():
+    with FakeEngine() as engine:
+        exporter = Exporter([engine.base_url], jobs=['other'])
+        text = exporter.poll().decode('utf-8')
+        exporter.stop()
+    assert_true('job="test"' not in text, text)
+    # Only the engine was asked:
+    assert_equals(1, len(engine.requests))
+
+
+def test_scrape_does_not_poll():
+    with FakeEngine() as engine:
+        with Exporter([engine.base_url], interval=60) as exporter:
+            while exporter.rounds == 0:
+                time.sleep(0.01)
+            server = make_server(exporter, port=0, addr='127.0.0.1')
+            url = 'http://127.0.0.1:%d/metrics' % server.server_address[1]
+            thread = threading.Thread(target=server.serve_forever)
+            thread.daemon = True
+            thread.start()
+            try:
+                polled = len(engine.requests)
+                for i in range(5):
+                    r = requests.get(url)
+                assert_equals(404, requests.get(url[:-len('metrics')] + 'other').status_code)
+            finally:
+                server.shutdown()
+                server.server_close()
+            assert_equals(polled, len(engine.requests))
+    assert_equals(200, r.status_code)
+    assert_true(r.content == exporter.snapshot)
+    assert_true(r.headers['Content-Type'].startswith('text/plain'))
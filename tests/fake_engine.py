@@ -0,0 +1,237 @@
+'''
+A small threaded HTTP server that answers like a Heritrix engine, so the
+clients can be exercised over real sockets without a running crawler.
+'''
+import base64
+import hashlib
+import json
+import re
+import threading
+
+from pkg_resources import resource_string
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+
+REALM = 'Authentication Required'
+NONCE = 'fake-engine-nonce'
+
+
+def asset(name):
+    return resource_string(__name__, 'assets/%s' % name)
+
+
+def _md5(s):
+    return hashlib.md5(s.encode('utf-8')).hexdigest()
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up on us; that's expected here.
+        pass
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with self.server.engine.lock:
+            self.server.engine.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _authorised(self):
+        engine = self.server.engine
+        if engine.username is None:
+            return True
+        header = self.headers.get('Authorization', '')
+        if not header.startswith('Digest '):
+            return False
+        fields = dict(re.findall(r'(\w+)="?([^",]*)"?', header[len('Digest '):]))
+        if fields.get('nonce') != NONCE:
+            return False
+        ha1 = _md5('%s:%s:%s' % (engine.username, REALM, engine.password))
+        ha2 = _md5('%s:%s' % (self.command, fields.get('uri', '')))
+        expected = _md5('%s:%s:%s:%s:%s:%s' % (
+            ha1, NONCE, fields.get('nc'), fields.get('cnonce'),
+            fields.get('qop'), ha2))
+        return fields.get('response') == expected
+
+    def _send(self, code, body=b'', headers=None):
+        self.send_response(code)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        engine = self.server.engine
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if not self._authorised():
+            with engine.lock:
+                engine.challenges += 1
+            self._send(401, headers={
+                'WWW-Authenticate':
+                    'Digest realm="%s", nonce="%s", qop="auth"' % (REALM, NONCE)
+            })
+            return
+        with engine.lock:
+            engine.requests.append((self.command, self.path, body))
+        if engine.delay:
+            engine.sleep(engine.delay)
+        for (method, pattern), handler in engine.routes:
+            if method != self.command:
+                continue
+            m = re.match('%s$' % pattern, self.path)
+            if m:
+                code, payload, headers = handler(self, body, *m.groups())
+                self._send(code, payload, headers)
+                return
+        self._send(404, b'Not Found')
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+
+
+def xml_asset(request, name):
+    '''Returns a fixture with its URLs pointing at this fake engine.'''
+    return asset(name).replace(
+        b'https://localhost:8443', request.server.engine.base_url.encode('ascii'))
+
+
+def _get_info(request, body):
+    return 200, xml_asset(request, 'test_get_info.xml'), {'Content-Type': 'application/xml'}
+
+
+def _get_job_info(request, body, name):
+    return 200, xml_asset(request, 'test_get_job_info.xml'), {'Content-Type': 'application/xml'}
+
+
+def _post_action(request, body, *name):
+    return 303, b'', {'Location': request.path}
+
+
+def _post_script(request, body, name):
+    return 200, asset('test_execute_script_raw.xml'), {'Content-Type': 'application/xml'}
+
+
+def _put_file(request, body, path):
+    '''Stores the file in `engine.files`: 201 if it is new, else 200.'''
+    files = request.server.engine.files
+    code = 200 if path in files else 201
+    files[path] = body
+    return code, b'', {}
+
+
+def _get_file(request, body, path):
+    '''Serves `engine.files[path]`, honouring single 'bytes=a-b' ranges.'''
+    data = request.server.engine.files.get(path)
+    if data is None:
+        return 404, b'Not Found', {}
+    m = re.match(r'bytes=(\d+)-(\d*)$', request.headers.get('Range', ''))
+    if not m or not request.server.engine.ranges:
+        return 200, data, {}
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else len(data) - 1
+    if start >= len(data):
+        return 416, b'', {'Content-Range': 'bytes */%d' % len(data)}
+    end = min(end, len(data) - 1)
+    return 206, data[start:end + 1], {
+        'Content-Range': 'bytes %d-%d/%d' % (start, end, len(data))}
+
+
+def script_params(body):
+    '''
+    Returns `(name, params)` of a bundled script POSTed by `Hapy.run_script`,
+    decoded from its preamble.
+    '''
+    script = parse_qs(body.decode('utf-8'))['script'][0]
+    name = re.search(r'// hapy script (\S+)', script).group(1)
+    params = re.search(r'parseText\(new String\("([^"]*)"', script).group(1)
+    return name, json.loads(base64.b64decode(params).decode('utf-8'))
+
+
+def script_output(raw):
+    '''A handler for the script endpoint that prints `raw`.'''
+    def handler(request, body, name):
+        return 200, (
+            '<?xml version="1.0" standalone=\'yes\'?><script>'
+            '<rawOutput>%s</rawOutput></script>' % raw).encode('utf-8'), {}
+    return handler
+
+
+class FakeEngine(object):
+    '''
+    Usage:
+
+        with FakeEngine(username='admin', password='admin') as engine:
+            h = hapy.Hapy(engine.base_url, username='admin', password='admin')
+
+    Add or override responses with `engine.route(method, regex, handler)`;
+    handlers take the request handler, the request body and any regex
+    groups and return `(code, body, headers)`.
+    '''
+
+    def __init__(self, username=None, password=None, delay=0):
+        self.username = username
+        self.password = password
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.challenges = 0
+        self.requests = []
+        # Job directory contents, by path below /engine/job/:
+        self.files = {}
+        self.ranges = True
+        self.routes = [
+            (('GET', r'/engine/job/([^/]+/jobdir/.+)'), _get_file),
+            (('GET', r'/engine/?'), _get_info),
+            (('GET', r'/engine/job/([^/]+)/?'), _get_job_info),
+            (('POST', r'/engine/?'), _post_action),
+            (('POST', r'/engine/job/([^/]+)/script'), _post_script),
+            (('POST', r'/engine/job/([^/]+)/?'), _post_action),
+            (('PUT', r'/engine/job/(.+)'), _put_file),
+        ]
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.engine = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def sleep(self, seconds):
+        threading.Event().wait(seconds)
+
+    def route(self, method, pattern, handler):
+        self.routes.insert(0, ((method, pattern), handler))
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,54 @@
+import time
+
+from nose.tools import (
+    assert_equals,
+    assert_true,
+    assert_false
+)
+
+import hapy
+from hapy.fleet import HostResult
+
+from .fake_engine import FakeEngine
+
+
+def test_fan_out_is_concurrent():
+    engines = [FakeEngine(delay=0.3).start() for i in range(5)]
+    try:
+        with hapy.HapyFleet([e.base_url for e in engines], max_workers=5) as fleet:
+            start = time.time()
+            results = fleet.get_job_info('test')
+            elapsed = time.time() - start
+    finally:
+        for e in engines:
+            e.stop()
+    assert_equals(5, len(results))
+    assert_true(all(r.ok for r in results.values()))
+    assert_equals('test', results[engines[0].base_url].value['job']['shortName'])
+    assert_true(elapsed < 1.0, elapsed)
+
+
+def test_errors_are_per_host():
+    with FakeEngine() as good, FakeEngine() as bad:
+        bad.route('POST', r'/engine/job/([^/]+)/?', lambda request, body, name: (500, b'', {}))
+        with hapy.HapyFleet([good.base_url, hapy.Hapy(bad.base_url)]) as fleet:
+            results = fleet.pause_job('test')
+    assert_true(results[good.base_url].ok)
+    assert_false(results[bad.base_url].ok)
+    assert_true(isinstance(results[bad.base_url].error, hapy.HapyException))
+
+
+def test_per_host_timeout():
+    with FakeEngine() as fast, FakeEngine(delay=2) as slow:
+        with hapy.HapyFleet([fast.base_url, slow.base_url], timeout=0.3) as fleet:
+            start = time.time()
+            results = fleet.get_info()
+            elapsed = time.time() - start
+    assert_true(results[fast.base_url].ok)
+    assert_false(results[slow.base_url].ok)
+    assert_true(elapsed < 1.0, elapsed)
+
+
+def test_host_result():
+    r = HostResult('h', 1, None, 0.1)
+    assert_true(r.ok)
@@ -0,0 +1,71 @@
+import asyncio
+import base64
+import json
+
+from nose.tools import (
+    assert_equals,
+    assert_is_none
+)
+
+import hapy
+from hapy.frontier import PendingUrl, parse_page
+
+from .fake_engine import FakeEngine, script_params
+
+KEYS = [('key%03d' % i).encode('ascii') for i in range(25)]
+
+
+def frontier_script(request, body, name):
+    '''Pages through KEYS like pending-urls-page.groovy does through BDB.'''
+    script, params = script_params(body)
+    after, page_size = params['after'], params['page_size']
+    start = KEYS.index(base64.b64decode(after)) + 1 if after else 0
+    keys = KEYS[start:start + page_size]
+    rows = [['com,example,)', 1, 3, 'L', 'http://example.com/%s' % k.decode('ascii'), 'http://example.com/']
+            for k in keys]
+    after = base64.b64encode(keys[-1]).decode('ascii') if start + page_size < len(KEYS) else None
+    return 200, (
+        '<?xml version="1.0" standalone=\'yes\'?><script>'
+        '<rawOutput>%s</rawOutput></script>' % json.dumps({'urls': rows, 'next': after})).encode('utf-8'), {}
+
+
+def test_parse_page():
+    page = {}
+    urls = list(parse_page({'urls': [['com,example,)', 1, 3, '', 'http://example.com/', '']],
+                            'next': 'a2V5'}, page))
+    assert_equals([PendingUrl('com,example,)', 1, 3, '', 'http://example.com/', '')], urls)
+    assert_equals('a2V5', page['after'])
+    list(parse_page({'urls': [], 'next': None}, page))
+    assert_is_none(page['after'])
+
+
+def test_iter_pending_urls():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', frontier_script)
+        pager = hapy.Hapy(engine.base_url).iter_pending_urls('test', page_size=10)
+        uris = [url.uri for url in pager]
+    assert_equals(['http://example.com/%s' % k.decode('ascii') for k in KEYS], uris)
+    assert_equals(3, pager.pages)
+    assert_is_none(pager.after)
+
+
+def test_iter_pending_urls_resumes():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', frontier_script)
+        h = hapy.Hapy(engine.base_url)
+        pager = h.iter_pending_urls('test', page_size=10)
+        first = [url.uri for url, i in zip(pager, range(15))]
+        rest = [url.uri for url in h.iter_pending_urls('test', page_size=10, after=pager.after)]
+    assert_equals(15, len(first))
+    assert_equals('http://example.com/key010', rest[0])
+    assert_equals(15, len(rest))
+
+
+def test_iter_pending_urls_async():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return [url.uri async for url in h.iter_pending_urls('test', page_size=7)]
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', frontier_script)
+        uris = asyncio.run(go(engine))
+    assert_equals(25, len(uris))
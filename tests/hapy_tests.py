@@ -15,11 +15,13 @@ from nose.tools import (
 
 import hapy
 
+from .fake_engine import FakeEngine
+
 BASE_URL = 'https://localhost:8443'
 h = None
 
 
-def setup():
+def setup_module():
     global h
     h = hapy.Hapy(BASE_URL)
 
@@ -63,44 +65,44 @@ def test_auth():
 
 
 @raises(hapy.HapyException)
-@patch('hapy.hapy.requests')
-def test_get_wrong_code(mock_requests):
+@patch('hapy.hapy.requests.Session.get')
+def test_get_wrong_code(mock_get):
     r = Mock()
     r.status_code = 404
     r.request = Mock()
-    mock_requests.get.return_value = r
+    mock_get.return_value = r
     h._http_get('url')
 
 
 @raises(hapy.HapyException)
-@patch('hapy.hapy.requests')
-def test_post_wrong_code(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_post_wrong_code(mock_post):
     r = Mock()
     r.status_code = 404
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     h._http_post('url', data='data')
 
 
 @raises(hapy.HapyException)
-@patch('hapy.hapy.requests')
-def test_put_wrong_code(mock_requests):
+@patch('hapy.hapy.requests.Session.put')
+def test_put_wrong_code(mock_put):
     r = Mock()
     r.status_code = 404
     r.request = Mock()
-    mock_requests.put.return_value = r
+    mock_put.return_value = r
     h._http_put('url', data='data')
 
 
-@patch('hapy.hapy.requests')
-def test_create_job(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_create_job(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_create_job'
     h.create_job(name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine',
         data=dict(
             action='create',
@@ -114,15 +116,15 @@ def test_create_job(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_add_job_directory(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_add_job_directory(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     path = '/test_add_job_directory'
     h.add_job_directory(path)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine',
         data=dict(
             action='add',
@@ -136,15 +138,15 @@ def test_add_job_directory(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_build_job(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_build_job(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_build_job'
     h.build_job(name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % name,
         data=dict(
             action='build'
@@ -157,16 +159,16 @@ def test_build_job(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_supply_timeout(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_supply_timeout(mock_post):
     h = hapy.Hapy(BASE_URL, timeout=0.005)
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_build_job'
     h.build_job(name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % name,
         data=dict(
             action='build'
@@ -179,15 +181,15 @@ def test_supply_timeout(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_launch_job(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_launch_job(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_launch_job'
     h.launch_job(name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % name,
         data=dict(
             action='launch'
@@ -200,14 +202,14 @@ def test_launch_job(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_rescan_job_directory(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_rescan_job_directory(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     h.rescan_job_directory()
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine',
         data=dict(
             action='rescan'
@@ -220,15 +222,15 @@ def test_rescan_job_directory(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_pause_job(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_pause_job(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_pause_job'
     h.pause_job(name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % name,
         data=dict(
             action='pause'
@@ -241,15 +243,15 @@ def test_pause_job(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_unpause_job(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_unpause_job(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_unpause_job'
     h.unpause_job(name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % name,
         data=dict(
             action='unpause'
@@ -262,15 +264,15 @@ def test_unpause_job(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_terminate_job(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_terminate_job(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_terminate_job'
     h.terminate_job(name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % name,
         data=dict(
             action='terminate'
@@ -283,15 +285,15 @@ def test_terminate_job(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_teardown_job(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_teardown_job(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_teardown_job'
     h.teardown_job(name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % name,
         data=dict(
             action='teardown'
@@ -304,16 +306,16 @@ def test_teardown_job(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_copy_job(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_copy_job(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     src_name = 'test_copy_job'
     dest_name = 'test_copy_job_copy'
     h.copy_job(src_name, dest_name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % src_name,
         data=dict(
             copyTo=dest_name
@@ -326,16 +328,16 @@ def test_copy_job(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_copy_job_as_profile(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_copy_job_as_profile(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     src_name = 'test_copy_job'
     dest_name = 'test_copy_job_copy'
     h.copy_job(src_name, dest_name, as_profile=True)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % src_name,
         data=dict(
             copyTo=dest_name,
@@ -349,15 +351,15 @@ def test_copy_job_as_profile(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_checkpoint_job(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_checkpoint_job(mock_post):
     r = Mock()
     r.status_code = 303
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_checkpoint_job'
     h.checkpoint_job(name)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % name,
         data=dict(
             action='checkpoint'
@@ -370,8 +372,8 @@ def test_checkpoint_job(mock_requests):
     )
 
 
-@patch('hapy.hapy.requests')
-def test_execute_script(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_execute_script(mock_post):
     r = Mock()
     r.status_code = 200
     r.content = resource_string(
@@ -379,12 +381,12 @@ def test_execute_script(mock_requests):
         'assets/test_execute_script.xml'
     )
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_execute_script'
     engine = 'groovy'
     script = ''
     raw, html = h.execute_script(name, engine, script)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s/script' % name,
         data=dict(
             engine=engine,
@@ -400,8 +402,8 @@ def test_execute_script(mock_requests):
     assert_is_none(html)
 
 
-@patch('hapy.hapy.requests')
-def test_execute_script_raw(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_execute_script_raw(mock_post):
     r = Mock()
     r.status_code = 200
     r.content = resource_string(
@@ -409,12 +411,12 @@ def test_execute_script_raw(mock_requests):
         'assets/test_execute_script_raw.xml'
     )
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_execute_script'
     engine = 'groovy'
     script = 'rawOut.print("a")'
     raw, html = h.execute_script(name, engine, script)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s/script' % name,
         data=dict(
             engine=engine,
@@ -430,8 +432,8 @@ def test_execute_script_raw(mock_requests):
     assert_is_none(html)
 
 
-@patch('hapy.hapy.requests')
-def test_execute_script_html(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_execute_script_html(mock_post):
     r = Mock()
     r.status_code = 200
     r.content = resource_string(
@@ -439,12 +441,12 @@ def test_execute_script_html(mock_requests):
         'assets/test_execute_script_html.xml'
     )
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_execute_script'
     engine = 'groovy'
     script = 'htmlOut.print("a")'
     raw, html = h.execute_script(name, engine, script)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s/script' % name,
         data=dict(
             engine=engine,
@@ -460,8 +462,8 @@ def test_execute_script_html(mock_requests):
     assert_is_none(raw)
 
 
-@patch('hapy.hapy.requests')
-def test_execute_script_both(mock_requests):
+@patch('hapy.hapy.requests.Session.post')
+def test_execute_script_both(mock_post):
     r = Mock()
     r.status_code = 200
     r.content = resource_string(
@@ -469,12 +471,12 @@ def test_execute_script_both(mock_requests):
         'assets/test_execute_script_both.xml'
     )
     r.request = Mock()
-    mock_requests.post.return_value = r
+    mock_post.return_value = r
     name = 'test_execute_script'
     engine = 'groovy'
     script = 'htmlOut.print("a")\nrawOut.print("b")'
     raw, html = h.execute_script(name, engine, script)
-    mock_requests.post.assert_called_with(
+    mock_post.assert_called_with(
         url='https://localhost:8443/engine/job/%s/script' % name,
         data=dict(
             engine=engine,
@@ -490,8 +492,9 @@ def test_execute_script_both(mock_requests):
     assert_equals("html", html)
 
 
-@patch('hapy.hapy.requests')
-def test_submit_configuration(mock_requests):
+@patch('hapy.hapy.requests.Session.put')
+@patch('hapy.hapy.requests.Session.get')
+def test_submit_configuration(mock_get, mock_put):
     r = Mock()
     r.status_code = 200
     r.request = Mock()
@@ -499,14 +502,14 @@ def test_submit_configuration(mock_requests):
         __name__,
         'assets/test_get_job_info.xml'
     )
-    mock_requests.get.return_value = r
+    mock_get.return_value = r
     r = Mock()
     r.status_code = 200
     r.request = Mock()
-    mock_requests.put.return_value = r
+    mock_put.return_value = r
     name = 'test_submit_configuration'
     h.submit_configuration(name, 'cxml')
-    mock_requests.put.assert_called_with(
+    mock_put.assert_called_with(
         url=('https://localhost:8443/engine/job/'
              'test/jobdir/crawler-beans.cxml'),
         data='cxml',
@@ -537,8 +540,26 @@ def test_tree_to_dict_multiple_child():
     assert_equals(d, h._Hapy__tree_to_dict(text))
 
 
-@patch('hapy.hapy.requests')
-def test_get_info(mock_requests):
+def test_parse_info_matches_tree_to_dict():
+    for name in ['test_execute_script_both.xml', 'test_get_info.xml',
+                 'test_get_info_multiple_jobs.xml', 'test_get_job_info.xml',
+                 'test_submit_configuration_job_info.xml']:
+        xml = resource_string(__name__, 'assets/%s' % name)
+        assert_equals(
+            h._Hapy__tree_to_dict(ElementTree.fromstring(xml)),
+            hapy.hapy._parse_info(xml)
+        )
+
+
+def test_parse_info_repeated_children():
+    xml = (b'<root><child>a</child><child><x>1</x></child><child/>'
+           b'<other><y/></other></root>')
+    d = dict(root=dict(child=['a', dict(x='1'), None], other=dict(y=None)))
+    assert_equals(d, hapy.hapy._parse_info(xml))
+
+
+@patch('hapy.hapy.requests.Session.get')
+def test_get_info(mock_get):
     r = Mock()
     r.status_code = 200
     r.content = resource_string(
@@ -546,9 +567,9 @@ def test_get_info(mock_requests):
         'assets/test_get_info.xml'
     )
     r.request = Mock()
-    mock_requests.get.return_value = r
+    mock_get.return_value = r
     info = h.get_info()
-    mock_requests.get.assert_called_with(
+    mock_get.assert_called_with(
         url='https://localhost:8443/engine',
         auth=None,
         verify=False,
@@ -558,8 +579,8 @@ def test_get_info(mock_requests):
     assert_equals('3.1.1', info['engine']['heritrixVersion'])
 
 
-@patch('hapy.hapy.requests')
-def test_get_job_info(mock_requests):
+@patch('hapy.hapy.requests.Session.get')
+def test_get_job_info(mock_get):
     r = Mock()
     r.status_code = 200
     r.content = resource_string(
@@ -567,10 +588,10 @@ def test_get_job_info(mock_requests):
         'assets/test_get_job_info.xml'
     )
     r.request = Mock()
-    mock_requests.get.return_value = r
+    mock_get.return_value = r
     name = 'test_get_job_info'
     info = h.get_job_info(name)
-    mock_requests.get.assert_called_with(
+    mock_get.assert_called_with(
         url='https://localhost:8443/engine/job/%s' % name,
         auth=None,
         verify=False,
@@ -580,8 +601,8 @@ def test_get_job_info(mock_requests):
     assert_equals('test', info['job']['shortName'])
 
 
-@patch('hapy.hapy.requests')
-def test_get_job_configuration(mock_requests):
+@patch('hapy.hapy.requests.Session.get')
+def test_get_job_configuration(mock_get):
     name = 'test_get_job_configuration'
     cxml = resource_string(
         __name__,
@@ -599,9 +620,9 @@ def test_get_job_configuration(mock_requests):
         r.content = cxml if ('cxml' in kwargs['url']) else xml
         return r
 
-    mock_requests.get.side_effect = side_effect
+    mock_get.side_effect = side_effect
     config = h.get_job_configuration(name)
-    mock_requests.get.assert_called_with(
+    mock_get.assert_called_with(
         url='https://localhost:8443/engine/job/test/jobdir/crawler-beans.cxml',
         auth=None,
         verify=False,
@@ -609,3 +630,55 @@ def test_get_job_configuration(mock_requests):
         timeout=None
     )
     assert_equals(cxml, config)
+
+
+def test_session_reuses_connection_and_nonce():
+    with FakeEngine(username='admin', password='admin') as engine:
+        with hapy.Hapy(engine.base_url, username='admin', password='admin') as h:
+            for i in range(5):
+                h.get_job_info('test')
+            h.pause_job('test')
+            stats = h.connection_stats()
+    assert_equals(1, engine.connections)
+    assert_equals(1, engine.challenges)
+    assert_equals(1, stats['opened'])
+    assert_equals(stats['requests'] - 1, stats['reused'])
+
+
+def test_session_no_keep_alive():
+    with FakeEngine() as engine:
+        with hapy.Hapy(engine.base_url, keep_alive=False) as h:
+            h.get_info()
+            h.get_info()
+            stats = h.connection_stats()
+    assert_equals(2, engine.connections)
+    assert_equals(2, stats['opened'])
+    assert_equals(0, stats['reused'])
+
+
+def test_list_jobs_from_one_request():
+    with FakeEngine() as engine:
+        engine.route('GET', r'/engine/?', lambda request, body: (
+            200, resource_string(__name__, 'assets/test_get_info_multiple_jobs.xml'), {}))
+        with hapy.Hapy(engine.base_url) as h:
+            assert_equals(['test', 'test2'], h.list_jobs())
+            assert_equals(['test', 'test2'], h.list_jobs(status='NASCENT'))
+            assert_equals([], h.list_jobs(status='RUNNING'))
+            assert_equals(0, h.job_index()['test2'].launch_count)
+    assert_equals(1, len(engine.requests))
+
+
+def test_list_jobs_single_job():
+    with FakeEngine() as engine:
+        with hapy.Hapy(engine.base_url) as h:
+            assert_equals(['test'], h.list_jobs('NASCENT'))
+
+
+def test_job_index_dropped_by_actions():
+    with FakeEngine() as engine:
+        with hapy.Hapy(engine.base_url) as h:
+            h.list_jobs()
+            h.create_job('new')
+            h.list_jobs()
+            h.list_jobs()
+    assert_equals(['GET', 'POST', 'GET'], [m for m, path, body in engine.requests])
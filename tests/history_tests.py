@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from nose.tools import (
+    raises,
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.history import MISSING, History, decode, encode, record
+from hapy.models import JobInfo
+
+from .fake_engine import FakeEngine
+
+T0 = 1593684000.0
+
+
+def setup_module():
+    global tmp
+    tmp = tempfile.mkdtemp()
+
+
+def teardown_module():
+    shutil.rmtree(tmp)
+
+
+def snapshot(i):
+    return JobInfo({
+        'rateReport': {'currentDocsPerSecond': str(i * 0.5), 'averageDocsPerSecond': 'NaN'},
+        'loadReport': {'busyThreads': str(i % 7)},
+        'uriTotalsReport': {'downloadedUriCount': str(i * 100)},
+        'heapReport': {'usedBytes': str(2 ** 33 + i)},
+    })
+
+
+def filled(name, rows, chunk_size):
+    history = History(os.path.join(tmp, name), chunk_size=chunk_size)
+    for i in range(rows):
+        history.append(snapshot(i), timestamp=T0 + i * 10)
+    return history
+
+
+def test_encode_round_trip():
+    values = np.array([5, 7, 7, MISSING, 2 ** 62, -3, 0], dtype=np.int64)
+    assert_equals(list(values), list(decode(encode(values), len(values))))
+
+
+def test_counters_compress():
+    values = np.cumsum(np.arange(8640, dtype=np.int64) % 13)
+    assert_true(len(encode(values)) < 8640 // 8, len(encode(values)))
+
+
+def test_read():
+    history = filled('read', 25, 10)
+    assert_equals(2, len(history.chunks))
+    assert_equals(25, len(history))
+    columns = history.read(['current_docs_per_second', 'busy_threads', 'average_docs_per_second'])
+    assert_equals(25, len(columns['timestamp']))
+    assert_equals(np.datetime64(int(T0 * 1000), 'ms'), columns['timestamp'][0])
+    assert_equals(12.0, columns['current_docs_per_second'][24])
+    assert_equals(24 % 7, columns['busy_threads'][24])
+    assert_true(np.isnan(columns['average_docs_per_second']).all())
+    history.close()
+
+
+def test_read_range():
+    history = filled('range', 50, 10)
+    columns = history.read('downloaded_uri_count', start=T0 + 95, end=T0 + 300)
+    assert_equals(list(range(1000, 3000, 100)), list(columns['downloaded_uri_count']))
+    history.close()
+
+
+def test_reopen():
+    filled('reopen', 25, 10).close()
+    history = History(os.path.join(tmp, 'reopen'))
+    assert_equals(25, len(history))
+    assert_equals(2 ** 33 + 24, history.read('heap_used_bytes')['heap_used_bytes'][-1])
+    history.append(snapshot(25), timestamp=T0 + 250)
+    history.close()
+    assert_equals(4, len(History(os.path.join(tmp, 'reopen')).chunks))
+
+
+def test_downsample():
+    history = filled('downsample', 100, 7)
+    times, values = history.downsample('downloaded_uri_count', 60, how='max')
+    assert_equals(17, len(times))
+    # Steps are aligned to the epoch, so the first one is partial:
+    full = history.read('downloaded_uri_count')['downloaded_uri_count']
+    assert_equals(full.max(), values[-1])
+    times, means = history.downsample('downloaded_uri_count', 60)
+    buckets = (history.read()['timestamp'].astype(np.int64) // 60000)
+    expected = [full[buckets == b].mean() for b in np.unique(buckets)]
+    assert_equals(expected, list(means))
+    times, lasts = history.downsample('busy_threads', 60, start=T0, end=T0 + 120, how='last')
+    assert_true(len(lasts) <= 3)
+    history.close()
+
+
+@raises(ValueError)
+def test_append_out_of_order():
+    history = History(os.path.join(tmp, 'order'))
+    history.append(snapshot(1), timestamp=T0 + 10)
+    history.append(snapshot(0), timestamp=T0)
+
+
+@raises(ValueError)
+def test_unknown_column():
+    History(os.path.join(tmp, 'unknown')).read('nonsense')
+
+
+def test_record():
+    with FakeEngine() as engine:
+        history = History(os.path.join(tmp, 'record'))
+        recorded = record(hapy.Hapy(engine.base_url), 'test', history, interval=0.01, rounds=3)
+    assert_equals(3, recorded)
+    assert_equals(3, len(history))
+    assert_equals(1, len(history.chunks))
+    history.close()
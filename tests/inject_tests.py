@@ -0,0 +1,119 @@
+import asyncio
+import base64
+import gzip
+import re
+
+from nose.tools import (
+    raises,
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.inject import batches, scheduled_count
+
+from .fake_engine import FakeEngine, script_output, script_params
+
+URLS = ['http://example.com/%d' % i for i in range(25)]
+ACTION = r'/engine/job/test/jobdir/action/hapy-\d{14}-[0-9a-f]{8}-\d{6}\.%s\.gz'
+
+
+def puts(engine):
+    return [(path, gzip.decompress(body).decode('utf-8').splitlines())
+            for method, path, body in engine.requests if method == 'PUT']
+
+
+def test_batches():
+    sizes = [(count, size) for count, size, payload in
+             batches(URLS[:3] + ['', '  # a comment', b'http://example.com/bytes\n'], batch_size=2)]
+    assert_equals([(2, 42), (2, 46)], sizes)
+
+
+def test_batches_bounded_by_bytes():
+    counts = [count for count, size, payload in batches(URLS, max_batch_bytes=100)]
+    assert_equals([5, 5, 5, 5, 5], counts)
+
+
+def test_inject_action_files():
+    done = []
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url)
+        sent = h.inject_urls('test', iter(URLS), batch_size=10, callback=done.append)
+        files = puts(engine)
+    assert_equals([10, 10, 5], [batch.urls for batch in sent])
+    assert_equals(sent, done)
+    assert_equals([None] * 3, [batch.scheduled for batch in sent])
+    assert_equals(3, len(files))
+    for path, lines in files:
+        assert_true(re.match(ACTION % 'schedule' + '$', path), path)
+    assert_equals(URLS, [url for path, lines in files for url in lines])
+
+
+def test_inject_action_suffixes():
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url)
+        h.inject_urls('test', URLS[:1], force_fetch=True)
+        h.inject_urls('test', URLS[:1], is_seed=True)
+        paths = [path for path, lines in puts(engine)]
+    assert_true(re.match(ACTION % 'force', paths[0]), paths[0])
+    assert_true(re.match(ACTION % 'seeds', paths[1]), paths[1])
+
+
+@raises(ValueError)
+def test_inject_action_forced_seeds():
+    hapy.Hapy('http://localhost:8443').inject_urls('test', URLS, force_fetch=True, is_seed=True)
+
+
+def test_inject_script():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output('{"scheduled": 10, "failed": 0}'))
+        h = hapy.Hapy(engine.base_url)
+        sent = h.inject_urls('test', URLS[:10], method='script', force_fetch=True)
+        method, path, body = engine.requests[-1]
+    assert_equals([10], [batch.scheduled for batch in sent])
+    assert_equals('/engine/job/test/script', path)
+    name, params = script_params(body)
+    assert_equals('inject-urls', name)
+    assert_true(params['force_fetch'])
+    assert_equals(False, params['is_seed'])
+    assert_equals(URLS[:10], gzip.decompress(base64.b64decode(params['urls'])).decode('utf-8').splitlines())
+
+
+def test_scheduled_count():
+    assert_equals(12, scheduled_count({'scheduled': 12, 'failed': 3}))
+    assert_equals(None, scheduled_count(None))
+
+
+def test_inject_async():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return await h.inject_urls('test', URLS, batch_size=20)
+    with FakeEngine() as engine:
+        sent = asyncio.run(go(engine))
+        files = puts(engine)
+    assert_equals([20, 5], [batch.urls for batch in sent])
+    assert_equals(URLS, [url for path, lines in files for url in lines])
+
+
+def test_inject_script_async():
+    done = []
+
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return await h.inject_urls('test', URLS[:10], method='script', is_seed=True,
+                                       callback=done.append)
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output('{"scheduled": 10, "failed": 0}'))
+        sent = asyncio.run(go(engine))
+        method, path, body = engine.requests[-1]
+    assert_equals([10], [batch.scheduled for batch in sent])
+    assert_equals(sent, done)
+    name, params = script_params(body)
+    assert_equals(('inject-urls', True), (name, params['is_seed']))
+
+
+def test_get_seeds():
+    with FakeEngine() as engine:
+        engine.files['test/jobdir/latest/seeds.txt'] = b'http://a.com/\nhttp://b.com/\n# end\nhttp://c.com/\n'
+        seeds = hapy.Hapy(engine.base_url).get_seeds('test')
+    assert_equals(['http://a.com/', 'http://b.com/'], seeds)
@@ -0,0 +1,114 @@
+import asyncio
+
+from nose.tools import (
+    raises,
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.instrument import Histogram, Observer, Recorder, Timing
+
+from .fake_engine import FakeEngine
+
+
+class Collector(Observer):
+
+    def __init__(self):
+        self.timings = []
+
+    def observe(self, timing):
+        self.timings.append(timing)
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 0.2, 0.5, float('inf')))
+    for value in (0.05, 0.15, 0.15, 0.3):
+        histogram.add(value)
+    assert_equals(4, histogram.count)
+    assert_true(abs(histogram.mean - 0.1625) < 1e-9)
+    assert_true(0.1 <= histogram.quantile(0.5) <= 0.2, histogram.quantile(0.5))
+    # The top bucket is capped by the largest value seen:
+    assert_true(histogram.quantile(1.0) <= 0.3)
+    assert_equals(0.0, Histogram().quantile(0.5))
+
+
+def test_phases():
+    collector = Collector()
+    with FakeEngine(username='admin', password='admin') as engine:
+        h = hapy.Hapy(engine.base_url, username='admin', password='admin', observer=collector)
+        h.get_job_info('test')
+        h.get_job_status('test')
+    first, second = collector.timings
+    assert_equals(('get_job_info', 1, None), (first.method, first.requests, first.error))
+    assert_true(first.bytes > 0)
+    assert_true(first.connect > 0 and first.server > 0 and first.parse > 0, first)
+    assert_true(first.connect + first.server + first.download + first.parse <= first.elapsed, first)
+    # The connection is reused:
+    assert_equals(0.0, second.connect)
+
+
+def test_outermost_call_only():
+    collector = Collector()
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url, observer=collector)
+        h.status('test')
+        h.list_jobs()
+    assert_equals(['status', 'list_jobs'], [timing.method for timing in collector.timings])
+
+
+@raises(hapy.HapyException)
+def test_errors():
+    recorder = Recorder()
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url, observer=recorder)
+        try:
+            h.get_job_configuration('missing')
+        finally:
+            assert_equals({'HapyException': 1}, recorder.stats()['get_job_configuration']['errors'])
+
+
+def test_requests_outside_calls():
+    collector = Collector()
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url, observer=collector)
+        h._http_get(h.base_url)
+    assert_equals(['GET'], [timing.method for timing in collector.timings])
+
+
+def test_recorder():
+    recorder = Recorder()
+    recorder.observe(Timing('get_info', 0.02, 0.001, 0.015, 0.002, 0.001, 1, 2048, None))
+    recorder.observe(Timing('get_info', 0.04, 0.0, 0.03, 0.005, 0.003, 1, 2048, ValueError()))
+    stats = recorder.stats()['get_info']
+    assert_equals((2, 2, 4096, {'ValueError': 1}),
+                  (stats['calls'], stats['requests'], stats['bytes'], stats['errors']))
+    assert_true(abs(stats['server']['mean'] - 0.0225) < 1e-9)
+    assert_equals(0.04, stats['elapsed']['max'])
+    lines = recorder.summary().splitlines()
+    assert_equals(['method', 'calls', 'errors', 'p50', 'p95', 'connect', 'server', 'download', 'parse', 'KiB'],
+                  lines[0].split())
+    assert_equals(['get_info', '2', '1'], lines[1].split()[:3])
+    assert_equals('4.0', lines[1].split()[-1])
+
+
+def test_async():
+    collector = Collector()
+
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url, observer=collector) as h:
+            await h.get_job_info('test')
+            await h.status('test')
+    with FakeEngine() as engine:
+        asyncio.run(go(engine))
+    first, second = collector.timings
+    assert_equals(['get_job_info', 'status'], [first.method, second.method])
+    assert_true(first.connect > 0 and first.server > 0 and first.parse > 0, first)
+    assert_true(first.bytes > 0)
+
+
+def test_untimed_without_observer():
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url)
+        assert_equals('test', h.get_job_info('test')['job']['shortName'])
+    assert_true(h.observer is None)
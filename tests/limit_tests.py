@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+
+from nose.tools import (
+    raises,
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.limit import CONTROL, MONITOR, RateLimiter, rate_limiter
+
+from .fake_engine import FakeEngine
+
+
+def wait_until(fn, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not fn():
+        assert_true(time.monotonic() < deadline, 'timed out')
+        time.sleep(0.005)
+
+
+def test_rate():
+    limiter = RateLimiter(rate=20, burst=1)
+    start = time.monotonic()
+    for i in range(10):
+        limiter.acquire()
+    elapsed = time.monotonic() - start
+    # The first goes at once, the other nine a twentieth of a second apart:
+    assert_true(0.4 < elapsed < 0.8, elapsed)
+    stats = limiter.stats()['monitor']
+    assert_equals(10, stats['acquired'])
+    assert_equals(9, stats['waited'])
+    assert_true(0.04 < stats['max_wait'] < 0.2, stats)
+
+
+def test_burst():
+    limiter = RateLimiter(rate=1, burst=5)
+    start = time.monotonic()
+    waits = [limiter.acquire() for i in range(5)]
+    assert_true(time.monotonic() - start < 0.1)
+    assert_true(all(wait < 0.05 for wait in waits), waits)
+    assert_equals(0, limiter.stats()['monitor']['waited'])
+
+
+def test_control_goes_first():
+    limiter = RateLimiter(rate=5, burst=1)
+    limiter.acquire()
+    order = []
+
+    def take(name, priority):
+        limiter.acquire(priority)
+        order.append(name)
+    threads = [threading.Thread(target=take, args=('monitor%d' % i, MONITOR)) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: limiter.stats()['monitor']['queued'] == 3)
+    threads.append(threading.Thread(target=take, args=('control', CONTROL)))
+    threads[-1].start()
+    for thread in threads:
+        thread.join()
+    assert_equals(['control', 'monitor0', 'monitor1', 'monitor2'], order)
+    stats = limiter.stats()
+    assert_true(stats['control']['max_wait'] < stats['monitor']['max_wait'], stats)
+
+
+def test_async():
+    limiter = RateLimiter(rate=10, burst=1)
+    order = []
+
+    async def take(name, priority):
+        await limiter.acquire_async(priority)
+        order.append(name)
+
+    async def go():
+        await limiter.acquire_async()
+        tasks = [asyncio.ensure_future(take('monitor%d' % i, MONITOR)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.ensure_future(take('control', CONTROL)))
+        await asyncio.gather(*tasks)
+    asyncio.run(go())
+    assert_equals(['control', 'monitor0', 'monitor1', 'monitor2'], order)
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    limiter = RateLimiter(rate=2, burst=1)
+
+    async def go():
+        await limiter.acquire_async()
+        task = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.01)
+        assert_equals(1, limiter.stats()['monitor']['queued'])
+        task.cancel()
+        await asyncio.sleep(0.01)
+        assert_equals(0, limiter.stats()['monitor']['queued'])
+        # The token it would have had goes to the next caller:
+        return await limiter.acquire_async()
+    wait = asyncio.run(go())
+    assert_true(wait < 0.6, wait)
+
+
+@raises(ValueError)
+def test_bad_rate():
+    RateLimiter(rate=0)
+
+
+@raises(ValueError)
+def test_bad_priority():
+    RateLimiter(rate=1).acquire(priority=5)
+
+
+def test_rate_limiter_spec():
+    limiter = RateLimiter(rate=1)
+    assert_true(rate_limiter(limiter) is limiter)
+    assert_true(rate_limiter(None) is None)
+    assert_equals((3.0, 4), (rate_limiter((3, 4)).rate, rate_limiter((3, 4)).burst))
+
+
+def test_actions_jump_the_queue():
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url, rate_limit=(5, 1), pool_maxsize=8)
+        h.get_info()
+        readers = [threading.Thread(target=h.get_job_status, args=('job%d' % i,)) for i in range(4)]
+        for thread in readers:
+            thread.start()
+        wait_until(lambda: h.limiter.stats()['monitor']['queued'] == 4)
+        h.pause_job('test')
+        for thread in readers:
+            thread.join()
+    methods = [method for method, path, body in engine.requests]
+    assert_equals(['GET', 'POST', 'GET', 'GET', 'GET', 'GET'], methods)
+    assert_equals(1, h.limiter.stats()['control']['acquired'])
+
+
+def test_scripts_are_monitoring():
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url, rate_limit=(100, 10))
+        h.execute_script('test', 'groovy', 'rawOut.println "x"')
+    stats = h.limiter.stats()
+    assert_equals((0, 1), (stats['control']['acquired'], stats['monitor']['acquired']))
+
+
+def test_async_client():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url, rate_limit=(20, 1)) as h:
+            await asyncio.gather(*[h.get_job_info('job%d' % i) for i in range(5)])
+            return h.limiter.stats()['monitor']
+    with FakeEngine() as engine:
+        start = time.monotonic()
+        stats = asyncio.run(go(engine))
+        elapsed = time.monotonic() - start
+    assert_equals(5, stats['acquired'])
+    assert_true(elapsed > 0.18, elapsed)
+
+
+def test_fleet_rate_limits():
+    with FakeEngine() as one, FakeEngine() as two:
+        shared = RateLimiter(rate=10)
+        fleet = hapy.HapyFleet([one.base_url, two.base_url], rate_limit=shared,
+                               rate_limits={two.base_url: (1, 2)})
+        limiters = [h.limiter for host, h in sorted(fleet.engines.items(),
+                                                    key=lambda item: item[0] != one.base_url)]
+        fleet.close()
+    assert_true(limiters[0] is shared)
+    assert_equals((1.0, 2), (limiters[1].rate, limiters[1].burst))
@@ -0,0 +1,168 @@
+import math
+
+from pkg_resources import resource_string
+
+from mock import patch, Mock
+from nose.tools import (
+    assert_equals,
+    assert_true,
+    assert_false,
+    assert_is_none
+)
+
+import hapy
+from hapy.models import (
+    CheckpointList,
+    EngineInfo,
+    JobInfo,
+    JobStatus,
+    LoadReport
+)
+
+BASE_URL = 'https://localhost:8443'
+
+
+def asset(name):
+    return resource_string(__name__, 'assets/%s' % name)
+
+
+def test_job_info_fields():
+    info = JobInfo.from_xml(asset('test_get_job_info.xml'))
+    assert_equals('test', info.short_name)
+    assert_equals('NASCENT', info.crawl_controller_state)
+    assert_equals(['launch', 'teardown'], info.available_actions)
+    assert_equals(0, info.launch_count)
+    assert_false(info.is_profile)
+    assert_equals(0, info.uri_totals.queued_uri_count)
+    assert_equals(0.0, info.rate_report.current_docs_per_second)
+    assert_true(math.isnan(info.rate_report.average_docs_per_second))
+    assert_equals(-1, info.load_report.deepest_queue_depth)
+    assert_equals(108797984, info.heap_report.used_bytes)
+    assert_equals((), info.checkpoints)
+    assert_is_none(info.checkpoints.latest)
+
+
+def test_job_info_lazy_sections():
+    info = JobInfo.from_xml(asset('test_get_job_info.xml'))
+    assert_true(isinstance(info._config_files, bytes))
+    assert_equals(
+        'https://localhost:8443/engine/job/test/jobdir/$%7BlaunchId%7D/logs/crawl.log',
+        info.config_url('loggerModule.crawlLogPath'))
+    assert_equals(18, len(info.config_files))
+    assert_false(isinstance(info._config_files, bytes))
+    assert_equals(['2013-11-18T12:33:50.157Z INFO Job instantiated'], info.job_log_tail)
+    assert_is_none(info.thread_report)
+
+
+def test_job_info_from_dict():
+    d = hapy.hapy._parse_info(asset('test_get_job_info.xml'))
+    info = JobInfo(d['job'])
+    assert_equals(['2013-11-18T12:33:50.157Z INFO Job instantiated'], info.job_log_tail)
+    assert_equals(0, info.launch_count)
+
+
+def test_job_info_sections_match_dict():
+    content = asset('test_get_job_info.xml')
+    lazy = JobInfo.from_xml(content)
+    eager = JobInfo(hapy.hapy._parse_info(content)['job'])
+    for name in ('job_log_tail', 'thread_report', 'frontier_report'):
+        assert_equals(getattr(eager, name), getattr(lazy, name), name)
+    assert_equals(
+        dict((key, f.url) for key, f in eager.config_files.items()),
+        dict((key, f.url) for key, f in lazy.config_files.items()))
+
+def test_job_info_has_no_dict():
+    info = JobInfo.from_xml(asset('test_get_job_info.xml'))
+    assert_false(hasattr(info, '__dict__'))
+    assert_false(hasattr(info.load_report, '__dict__'))
+
+
+def test_checkpoint_list():
+    assert_equals(('cp1',), CheckpointList({'value': 'cp1'}))
+    assert_equals('cp2', CheckpointList({'value': ['cp2', 'cp1']}).latest)
+    assert_equals((), CheckpointList(None))
+
+
+def test_indented_empty_elements():
+    content = asset('test_get_job_info.xml').replace(
+        b'<value>launch</value>', b'').replace(b'<value>teardown</value>', b'').replace(
+        b'<launchCount>', b'<checkpointFiles>\n    </checkpointFiles>\n  <launchCount>')
+    info = JobInfo.from_xml(content)
+    assert_equals([], info.available_actions)
+    assert_equals((), info.checkpoints)
+    assert_is_none(info.checkpoints.latest)
+    assert_equals((), CheckpointList('\n  '))
+
+
+def test_report_tolerates_missing_fields():
+    r = LoadReport({'busyThreads': '3'})
+    assert_equals(3, r.busy_threads)
+    assert_is_none(r.total_threads)
+
+
+def test_engine_info_multiple_jobs():
+    info = EngineInfo.from_xml(asset('test_get_info_multiple_jobs.xml'))
+    assert_equals('3.1.1', info.heritrix_version)
+    assert_equals(['test', 'test2'], [j.short_name for j in info.jobs])
+    assert_equals(0, info.jobs[1].launch_count)
+
+
+def test_engine_info_single_job():
+    info = EngineInfo.from_xml(asset('test_get_info.xml'))
+    assert_equals(1, len(info.jobs))
+
+
+@patch('hapy.hapy.requests.Session.get')
+def test_get_job_info_model(mock_get):
+    r = Mock()
+    r.status_code = 200
+    r.content = asset('test_get_job_info.xml')
+    mock_get.return_value = r
+    info = hapy.Hapy(BASE_URL).get_job_info_model('test')
+    assert_equals('test', info.short_name)
+
+
+def test_job_status():
+    status = JobStatus.from_xml(asset('test_get_job_info.xml'))
+    assert_equals(JobStatus('NASCENT', 'Ready', ('launch', 'teardown')), status)
+
+
+def test_job_status_stops_early():
+    # Anything after availableActions is never parsed, even if it's broken:
+    content = asset('test_get_job_info.xml').replace(b'<launchCount>', b'<launchCount><<')
+    assert_equals('NASCENT', JobStatus.from_xml(content).state)
+
+
+def test_job_status_no_actions():
+    content = asset('test_get_job_info.xml').replace(
+        b'<value>launch</value>', b'').replace(b'<value>teardown</value>', b'')
+    assert_equals((), JobStatus.from_xml(content).actions)
+    one = asset('test_get_job_info.xml').replace(b'<value>teardown</value>', b'')
+    assert_equals(('launch',), JobStatus.from_xml(one).actions)
+
+
+@patch('hapy.hapy.requests.Session.get')
+def test_status(mock_get):
+    r = Mock()
+    r.status_code = 200
+    r.content = asset('test_get_job_info.xml')
+    mock_get.return_value = r
+    assert_equals('NASCENT', hapy.Hapy(BASE_URL).status('test'))
+
+
+@patch('hapy.hapy.requests.Session.post')
+@patch('hapy.hapy.requests.Session.get')
+def test_launch_from_single_checkpoint(mock_get, mock_post):
+    r = Mock()
+    r.status_code = 200
+    r.content = asset('test_get_job_info.xml').replace(
+        b'<threadReport/>',
+        b'<checkpointFiles><value>cp00001-20200101</value></checkpointFiles>')
+    mock_get.return_value = r
+    r = Mock()
+    r.status_code = 303
+    mock_post.return_value = r
+    hapy.Hapy(BASE_URL).launch_from_latest_checkpoint('test')
+    assert_equals(
+        dict(action='launch', checkpoint='cp00001-20200101'),
+        mock_post.call_args[1]['data'])
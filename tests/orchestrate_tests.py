@@ -0,0 +1,140 @@
+import threading
+
+from urllib.parse import parse_qs
+
+from nose.tools import (
+    assert_equals,
+    assert_true,
+    assert_false
+)
+
+import hapy
+from hapy.orchestrate import (
+    CHECKPOINT_THEN_TEARDOWN,
+    RESTART_FROM_CHECKPOINT,
+    ROLLING_RESTART,
+    START,
+    find_targets,
+    run_plan
+)
+
+from .fake_engine import FakeEngine
+
+# The actions each state offers, and where each action leads:
+ACTIONS = {
+    '': ['build'],
+    'NASCENT': ['launch', 'teardown'],
+    'PAUSED': ['unpause', 'checkpoint', 'terminate'],
+    'RUNNING': ['pause', 'checkpoint', 'terminate'],
+    'FINISHED': ['teardown'],
+}
+MOVES = {
+    'build': 'NASCENT',
+    'launch': 'PAUSED',
+    'unpause': 'RUNNING',
+    'pause': 'PAUSED',
+    'terminate': 'FINISHED',
+    'teardown': '',
+}
+
+
+class Crawler(object):
+    '''Plays a Heritrix engine's job lifecycle on a `FakeEngine`.'''
+
+    def __init__(self, engine, **jobs):
+        self.jobs = jobs
+        self.actions = []
+        # Action name to the number of 500s to answer it with first:
+        self.failures = {}
+        self.lock = threading.Lock()
+        engine.route('GET', r'/engine/?', self.get_info)
+        engine.route('GET', r'/engine/job/([^/]+)/?', self.get_job_info)
+        engine.route('POST', r'/engine/job/([^/]+)/?', self.post_action)
+
+    def get_info(self, request, body):
+        jobs = ''.join('<value><shortName>%s</shortName><crawlControllerState>%s</crawlControllerState></value>'
+                       % (name, state) for name, state in sorted(self.jobs.items()))
+        return 200, ('<engine><jobs>%s</jobs></engine>' % jobs).encode('utf-8'), {}
+
+    def get_job_info(self, request, body, name):
+        state = self.jobs[name]
+        actions = ''.join('<value>%s</value>' % a for a in ACTIONS[state])
+        return 200, ('<job><shortName>%s</shortName><crawlControllerState>%s</crawlControllerState>'
+                     '<statusDescription/><availableActions>%s</availableActions></job>' % (
+                         name, state, actions)).encode('utf-8'), {}
+
+    def post_action(self, request, body, name):
+        action = parse_qs(body.decode('utf-8'))['action'][0]
+        with self.lock:
+            if self.failures.get(action):
+                self.failures[action] -= 1
+                return 500, b'', {}
+            assert action in ACTIONS[self.jobs[name]], (name, action, self.jobs[name])
+            self.actions.append((name, action))
+            self.jobs[name] = MOVES.get(action, self.jobs[name])
+        return 303, b'', {'Location': request.path}
+
+
+def test_start():
+    with FakeEngine() as engine:
+        crawler = Crawler(engine, test='')
+        results = run_plan(START, [(hapy.Hapy(engine.base_url), 'test')])
+    assert_true(results[0].ok, results[0])
+    assert_equals([('test', 'build'), ('test', 'launch'), ('test', 'unpause')], crawler.actions)
+    assert_equals('RUNNING', crawler.jobs['test'])
+    assert_equals(['build', 'launch', 'unpause'], [step.name for step in results[0].steps])
+
+
+def test_restart_skips_what_is_not_offered():
+    with FakeEngine() as engine:
+        crawler = Crawler(engine, a='RUNNING', b='NASCENT')
+        h = hapy.Hapy(engine.base_url)
+        results = run_plan(RESTART_FROM_CHECKPOINT, [(h, 'a'), (h, 'b')])
+    assert_true(all(result.ok for result in results), results)
+    assert_equals(['checkpoint', 'terminate', 'teardown', 'build', 'launch', 'unpause'],
+                  [action for name, action in crawler.actions if name == 'a'])
+    # b was built but never launched, so there was nothing to checkpoint:
+    assert_equals(['done'] * 6, [step.outcome for step in results[0].steps])
+    assert_equals(['skipped', 'skipped', 'done', 'done', 'done', 'done'],
+                  [step.outcome for step in results[1].steps])
+    assert_equals(dict(a='RUNNING', b='RUNNING'), crawler.jobs)
+
+
+def test_required_step_fails():
+    with FakeEngine() as engine:
+        crawler = Crawler(engine, test='NASCENT')
+        results = run_plan(CHECKPOINT_THEN_TEARDOWN, [(hapy.Hapy(engine.base_url), 'test')], timeout=0.3)
+    assert_false(results[0].ok)
+    assert_equals([('pause', 'skipped'), ('checkpoint', 'failed')],
+                  [(step.name, step.outcome) for step in results[0].steps])
+    assert_true(isinstance(results[0].steps[-1].error, TimeoutError))
+    assert_equals([], crawler.actions)
+
+
+def test_transient_failures_are_retried():
+    with FakeEngine() as engine:
+        crawler = Crawler(engine, test='')
+        crawler.failures['build'] = 1
+        steps = []
+        results = run_plan(START, [(hapy.Hapy(engine.base_url), 'test')], retry_delay=0.01,
+                           on_step=lambda host, job, step: steps.append(step))
+    assert_true(results[0].ok, results[0])
+    assert_equals(2, steps[0].attempts)
+    assert_equals(3, len(steps))
+
+
+def test_rolling_restart_one_job_per_engine():
+    with FakeEngine() as one, FakeEngine() as two:
+        crawlers = [Crawler(one, a='RUNNING', b='RUNNING', c='RUNNING'),
+                    Crawler(two, a='RUNNING', b='RUNNING')]
+        clients = [hapy.Hapy(one.base_url), hapy.Hapy(two.base_url)]
+        targets = find_targets(clients, ['a', 'b', 'c', 'missing'])
+        results = run_plan(ROLLING_RESTART, targets, parallelism=4)
+    assert_equals(5, len(targets))
+    assert_true(all(result.ok for result in results), results)
+    for crawler in crawlers:
+        names = [name for name, action in crawler.actions]
+        # Each job's actions come in one unbroken run:
+        runs = [name for i, name in enumerate(names) if i == 0 or names[i - 1] != name]
+        assert_equals(sorted(crawler.jobs), runs)
+        assert_true(all(state == 'RUNNING' for state in crawler.jobs.values()))
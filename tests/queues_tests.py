@@ -0,0 +1,52 @@
+import json
+
+from nose.tools import (
+    raises,
+    assert_equals
+)
+
+import hapy
+from hapy.queues import QueueRow, QueueStats
+
+from .fake_engine import FakeEngine, script_output, script_params
+
+RESULT = {
+    'totals': dict(queues=3, urls=150, active=1, snoozed=1, retired=0, inactive=1, spent=4200),
+    'rows': [
+        ['com,example,)', 'active', 100, 120, 3000, 3000, 0, 0, 2, 0, 1593684396219],
+        ['org,example,)', 'snoozed', 50, 60, 1200, 3000, 1800, 0, 0, 1593684400000, 1593684390000]
+    ]
+}
+OUTPUT = json.dumps(RESULT)
+
+
+def test_from_json():
+    stats = QueueStats.from_json(RESULT)
+    assert_equals(dict(queues=3, urls=150, active=1, snoozed=1, retired=0, inactive=1, spent=4200),
+                  stats.totals)
+    assert_equals(2, len(stats))
+    assert_equals(QueueRow('org,example,)', 'snoozed', 50, 60, 1200, 3000, 1800, 0, 0,
+                           1593684400000, 1593684390000), stats[1])
+    assert_equals([100, 50], list(stats.column('size')))
+    assert_equals(['com,example,)', 'org,example,)'], [row.queue for row in stats])
+
+
+def test_from_json_empty():
+    stats = QueueStats.from_json(None)
+    assert_equals(0, len(stats))
+    assert_equals(0, stats.totals['urls'])
+
+
+def test_get_queue_stats():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output(OUTPUT))
+        stats = hapy.Hapy(engine.base_url).get_queue_stats('test', top=2, sort_by='errors')
+        method, path, body = engine.requests[-1]
+    assert_equals(('queue-stats', dict(top=2, sort_by='errors')), script_params(body))
+    assert_equals(150, stats.totals['urls'])
+    assert_equals(2, len(stats))
+
+
+@raises(ValueError)
+def test_get_queue_stats_bad_sort():
+    hapy.Hapy('http://localhost:8443').get_queue_stats('test', sort_by='nonsense')
@@ -0,0 +1,263 @@
+import asyncio
+import threading
+import time
+
+import requests
+
+from nose.tools import (
+    raises,
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.exporter import render
+from hapy.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Hedging,
+    Resilience,
+    RetryPolicy,
+    is_transient
+)
+
+from .fake_engine import FakeEngine, xml_asset
+
+FAST = RetryPolicy(retries=2, base_delay=0.01)
+
+
+def flaky(failures, code=500, delays=()):
+    '''
+    A job page handler that answers `code` to the first `failures`
+    requests, and sleeps for `delays[i]` seconds before answering the i-th.
+    '''
+    seen = []
+    lock = threading.Lock()
+
+    def handler(request, body, name):
+        with lock:
+            i = len(seen)
+            seen.append(i)
+        if i < len(delays):
+            request.server.engine.sleep(delays[i])
+        if i < failures:
+            return code, b'', {}
+        return 200, xml_asset(request, 'test_get_job_info.xml'), {}
+    return handler
+
+
+def test_retry_delay():
+    policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+    assert_true(all(0 <= policy.delay(1) <= 0.1 for i in range(100)))
+    assert_true(all(0 <= policy.delay(5) <= 0.3 for i in range(100)))
+
+
+def test_is_transient():
+    assert_true(is_transient(requests.ConnectionError()))
+    assert_true(is_transient(requests.ReadTimeout()))
+    assert_true(not is_transient(ValueError()))
+
+
+def test_get_is_retried():
+    with FakeEngine() as engine:
+        engine.route('GET', r'/engine/job/([^/]+)/?', flaky(2))
+        h = hapy.Hapy(engine.base_url, resilience=dict(retry=FAST))
+        assert_equals('NASCENT', h.get_job_status('test').state)
+    assert_equals(3, len(engine.requests))
+    assert_equals(2, h.resilience.stats()['retries'])
+    assert_equals('closed', h.resilience.stats()['state'])
+
+
+@raises(hapy.HapyException)
+def test_client_errors_are_not_retried():
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url, resilience=dict(retry=FAST))
+        try:
+            h._http_get('%s/nothing' % engine.base_url)
+        finally:
+            assert_equals(1, len(engine.requests))
+            assert_equals(0, h.resilience.stats()['retries'])
+
+
+def test_actions_are_not_retried():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/?', lambda request, body, name: (500, b'', {}))
+        h = hapy.Hapy(engine.base_url, resilience=dict(retry=FAST))
+        try:
+            h.launch_job('test')
+            assert_true(False, 'should have failed')
+        except hapy.HapyException as e:
+            assert_equals(500, e.status_code)
+    assert_equals(1, len(engine.requests))
+    assert_equals(0, h.resilience.stats()['retries'])
+
+
+def test_unsent_actions_are_retried():
+    policy = Resilience(retry=FAST)
+    calls = []
+
+    def connect_then_work():
+        calls.append(1)
+        if len(calls) == 1:
+            raise requests.ConnectTimeout()
+        return 'ok'
+    assert_equals('ok', policy.call(connect_then_work, idempotent=False))
+
+    def read_timeout():
+        calls.append(1)
+        raise requests.ReadTimeout()
+    try:
+        policy.call(read_timeout, idempotent=False)
+        assert_true(False, 'should have failed')
+    except requests.ReadTimeout:
+        pass
+    # The read timed out after the request went, so it isn't sent again:
+    assert_equals(3, len(calls))
+
+
+def test_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    for i in range(2):
+        breaker.before()
+        breaker.after(False)
+    assert_equals('open', breaker.state)
+    try:
+        breaker.before()
+        assert_true(False, 'should be open')
+    except CircuitOpenError:
+        pass
+    time.sleep(0.15)
+    # One probe goes through, the rest wait for it:
+    breaker.before()
+    assert_equals('half_open', breaker.state)
+    try:
+        breaker.before()
+        assert_true(False, 'should be probing')
+    except CircuitOpenError:
+        pass
+    breaker.after(False)
+    assert_equals('open', breaker.state)
+    time.sleep(0.15)
+    breaker.before()
+    breaker.after(True)
+    assert_equals('closed', breaker.state)
+    assert_equals((2, 2), (breaker.opened, breaker.rejected))
+
+
+def test_breaker_fails_fast():
+    with FakeEngine() as engine:
+        engine.route('GET', r'/engine/job/([^/]+)/?', flaky(100))
+        h = hapy.Hapy(engine.base_url, resilience=dict(
+            retry=RetryPolicy(retries=0), breaker=CircuitBreaker(failure_threshold=3)))
+        errors = []
+        for i in range(5):
+            try:
+                h.get_job_status('test')
+            except Exception as e:
+                errors.append(type(e))
+    assert_equals([hapy.HapyException] * 3 + [CircuitOpenError] * 2, errors)
+    assert_equals(3, len(engine.requests))
+    stats = h.resilience.stats()
+    assert_equals(('open', 1, 2), (stats['state'], stats['opened'], stats['rejected']))
+
+
+def test_hedging():
+    with FakeEngine() as engine:
+        engine.route('GET', r'/engine/job/([^/]+)/?', flaky(0, delays=[0, 0, 0, 2.0]))
+        hedge = Hedging(percentile=50, min_samples=3, min_delay=0.05)
+        h = hapy.Hapy(engine.base_url, resilience=Resilience(hedge=hedge))
+        with h.capture() as calls:
+            for i in range(3):
+                h.get_job_status('test')
+            start = time.monotonic()
+            assert_equals('NASCENT', h.get_job_status('test').state)
+            elapsed = time.monotonic() - start
+    assert_true(elapsed < 1.0, elapsed)
+    stats = h.resilience.stats()
+    assert_equals((1, 1), (stats['hedges'], stats['hedge_wins']))
+    # Both copies of the hedged GET are captured, the slow one once it ends:
+    assert_true(len(calls) >= 4, calls)
+
+
+def test_hedging_never_queues():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow(request, body, name):
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        request.server.engine.sleep(0.3)
+        with lock:
+            active.pop()
+        return 200, xml_asset(request, 'test_get_job_info.xml'), {}
+    with FakeEngine() as engine:
+        hedge = Hedging(min_samples=1, min_delay=1.0, max_workers=2)
+        h = hapy.Hapy(engine.base_url, pool_maxsize=8, coalesce=False, resilience=Resilience(hedge=hedge))
+        h.get_job_status('test')
+        engine.route('GET', r'/engine/job/([^/]+)/?', slow)
+        threads = [threading.Thread(target=h.get_job_status, args=('test',)) for i in range(6)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+    # Callers beyond the two workers ran their GETs themselves, together:
+    assert_true(max(peak) > 2, peak)
+    assert_true(elapsed < 0.8, elapsed)
+    assert_equals(0, h.resilience.stats()['hedges'])
+
+def test_hedged_last_call():
+    with FakeEngine() as engine:
+        engine.route('GET', r'/engine/job/([^/]+)/?', flaky(0, delays=[0, 0, 2.0]))
+        hedge = Hedging(percentile=50, min_samples=2, min_delay=0.05)
+        h = hapy.Hapy(engine.base_url, resilience=Resilience(hedge=hedge))
+        for i in range(2):
+            h.get_job_status('test')
+        first = h.last_call
+        h.get_job_status('test')
+        # The call that answered, made by a worker thread:
+        call = h.last_call
+        assert_true(call is not first)
+        assert_equals(('GET', 200), (call.method, call.status))
+        assert_true(call.url.endswith('/job/test'), call.url)
+        assert_true(call.elapsed < 1.0, call)
+        assert_true(h.lastresponse is not None and h.lastresponse.status_code == 200)
+
+
+def test_async():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url, resilience=dict(retry=FAST)) as h:
+            status = await h.get_job_status('test')
+            return status, h.resilience.stats()
+    with FakeEngine() as engine:
+        engine.route('GET', r'/engine/job/([^/]+)/?', flaky(1))
+        status, stats = asyncio.run(go(engine))
+    assert_equals('NASCENT', status.state)
+    assert_equals(1, stats['retries'])
+
+
+def test_async_hedging():
+    async def go(engine):
+        hedge = Hedging(percentile=50, min_samples=2, min_delay=0.05)
+        async with hapy.AsyncHapy(engine.base_url, resilience=Resilience(hedge=hedge)) as h:
+            for i in range(2):
+                await h.get_job_status('test')
+            start = time.monotonic()
+            await h.get_job_status('test')
+            return time.monotonic() - start, h.resilience.stats()
+    with FakeEngine() as engine:
+        engine.route('GET', r'/engine/job/([^/]+)/?', flaky(0, delays=[0, 0, 2.0]))
+        elapsed, stats = asyncio.run(go(engine))
+    assert_true(elapsed < 1.0, elapsed)
+    assert_equals((1, 1), (stats['hedges'], stats['hedge_wins']))
+
+
+def test_exported():
+    stats = Resilience().stats()
+    stats.update(state='open', retries=3)
+    text = render([], [], clients=[('http://a', stats)]).decode('utf-8')
+    assert_true('heritrix_client_circuit_state{host="http://a",state="open"} 1.0' in text, text)
+    assert_true('heritrix_client_retries_total{host="http://a"} 3.0' in text, text)
@@ -0,0 +1,127 @@
+from nose.tools import (
+    raises,
+    assert_equals,
+    assert_true
+)
+
+import asyncio
+
+from urllib.parse import parse_qs
+
+import hapy
+from hapy import scripts
+from hapy.parse import RAW_ONLY_GROOVY
+
+from .fake_engine import FakeEngine, script_output, script_params
+
+
+def test_names():
+    names = scripts.names()
+    assert_true('pending-urls-from' in names)
+    assert_true('delete_job' in names)
+
+
+def test_get_is_cached():
+    assert_true(scripts.get('url-status') is scripts.get('url-status'))
+
+
+@raises(KeyError)
+def test_get_missing():
+    scripts.get('no-such-script')
+
+
+def test_body_does_not_change_with_params():
+    a = scripts.render('pending-urls-from', url='http://example.com/"; System.exit(0); "', limit=1)
+    b = scripts.render('pending-urls-from', url='http://example.org/', limit=20)
+    # Only the parameters line differs:
+    diff = [(x, y) for x, y in zip(a.splitlines(), b.splitlines()) if x != y]
+    assert_equals(1, len(diff))
+    assert_true(diff[0][0].startswith('params = '))
+    assert_true('System.exit' not in a)
+
+
+@raises(ValueError)
+def test_render_missing_param():
+    scripts.render('exclude-surt', surt=None)
+
+
+def test_run_script_missing_param():
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url)
+        try:
+            h.run_script('test', 'exclude-surt')
+            assert_true(False, 'should have failed')
+        except ValueError as e:
+            assert_true('surt' in str(e), e)
+    # Nothing was sent:
+    assert_equals([], engine.requests)
+
+
+def sent_script(body):
+    return parse_qs(body.decode('utf-8'))['script'][0]
+
+
+def test_run_script():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output('{"pending": true}'))
+        h = hapy.Hapy(engine.base_url)
+        result = h.run_script('test', 'url-status', url='http://example.com/"quoted"', limit=5)
+        method, path, body = engine.requests[-1]
+    assert_equals({'pending': True}, result)
+    assert_true(sent_script(body).startswith(RAW_ONLY_GROOVY))
+    assert_equals('/engine/job/test/script', path)
+    assert_equals(('url-status', dict(url='http://example.com/"quoted"', limit=5)), script_params(body))
+
+
+def test_execute_script_parse():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output('{"a": [1, 2]}'))
+        h = hapy.Hapy(engine.base_url)
+        assert_equals({'a': [1, 2]}, h.execute_script('test', 'groovy', 'x', parse='json'))
+        assert_equals('{"a": [1, 2]}', h.execute_script('test', 'groovy', 'x', parse='raw'))
+        method, path, body = engine.requests[-1]
+    assert_equals('x', sent_script(body))
+
+
+def test_execute_script_parse_empty():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output(''))
+        assert_equals(None, hapy.Hapy(engine.base_url).execute_script('test', 'groovy', 'x', parse='json'))
+
+
+def test_execute_script_raw_only():
+    with FakeEngine() as engine:
+        hapy.Hapy(engine.base_url).execute_script('test', 'groovy', 'x', raw_only=True)
+        method, path, body = engine.requests[-1]
+    assert_equals(RAW_ONLY_GROOVY + 'x', sent_script(body))
+
+
+@raises(ValueError)
+def test_execute_script_raw_only_groovy():
+    hapy.Hapy('http://localhost:8443').execute_script('test', 'beanshell', 'x', raw_only=True)
+
+
+@raises(ValueError)
+def test_execute_script_bad_parse():
+    hapy.Hapy('http://localhost:8443').execute_script('test', 'groovy', 'x', parse='yaml')
+
+
+def test_get_launch_id():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output('{"launch_id": "20200702100000"}'))
+        h = hapy.Hapy(engine.base_url)
+        assert_equals('20200702100000', h.get_launch_id('test'))
+        method, path, body = engine.requests[-1]
+    assert_equals(('launch-id', {}), script_params(body))
+
+
+def test_empty_frontier():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return await h.empty_frontier('test')
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output('{"deleted": 42}'))
+        assert_equals(42, hapy.Hapy(engine.base_url).empty_frontier('test'))
+        assert_equals(42, asyncio.run(go(engine)))
+        method, path, body = engine.requests[-1]
+    assert_equals(('empty-frontier', {}), script_params(body))
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+from concurrent import futures
+
+from nose.tools import (
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.hapy import CallInfo
+
+from .fake_engine import FakeEngine
+
+THREADS = 16
+CALLS = 25
+
+
+def hammer(h, fn):
+    '''Runs `fn(h, i)` on THREADS threads at once and returns their results.'''
+    start = threading.Barrier(THREADS)
+
+    def run(i):
+        start.wait()
+        return fn(h, i)
+    with futures.ThreadPoolExecutor(max_workers=THREADS) as executor:
+        return list(executor.map(run, range(THREADS)))
+
+
+def test_shared_client():
+    def work(h, i):
+        job = 'job%d' % i
+        for n in range(CALLS):
+            info = h.get_job_info(job)
+            # Each thread sees its own last response, whatever the others do:
+            assert_true(h.lastresponse.url.endswith('/job/%s' % job), h.lastresponse.url)
+        return info['job']['shortName'], h.last_call
+    with FakeEngine(username='admin', password='admin') as engine:
+        with hapy.Hapy(engine.base_url, username='admin', password='admin',
+                       pool_maxsize=THREADS) as h:
+            results = hammer(h, work)
+            stats = h.connection_stats()
+    assert_true(all(name == 'test' for name, call in results))
+    assert_equals(['%s/job/job%d' % (h.base_url, i) for i in range(THREADS)],
+                  [call.url for name, call in results])
+    assert_equals(THREADS * CALLS, len([r for r in engine.requests if r[0] == 'GET']))
+    # Connections are pooled across threads, and each thread answers the
+    # digest challenge once at most:
+    assert_true(stats['opened'] <= THREADS, stats)
+    assert_true(engine.challenges <= THREADS, engine.challenges)
+
+
+def test_capture_is_per_thread():
+    def work(h, i):
+        with h.capture() as calls:
+            for n in range(CALLS):
+                h.get_job_info('job%d' % i)
+        return calls
+    with FakeEngine() as engine:
+        with hapy.Hapy(engine.base_url, pool_maxsize=THREADS) as h:
+            results = hammer(h, work)
+    for i, calls in enumerate(results):
+        assert_equals(CALLS, len(calls))
+        assert_true(all(call.url.endswith('/job/job%d' % i) for call in calls))
+
+
+def test_call_info():
+    with FakeEngine() as engine:
+        h = hapy.Hapy(engine.base_url)
+        with h.capture() as outer:
+            h.get_info()
+            with h.capture() as inner:
+                h.pause_job('test')
+    assert_equals(2, len(outer))
+    assert_equals(1, len(inner))
+    get, post = outer
+    assert_equals(('GET', h.base_url, 200), get[:3])
+    assert_true(get.bytes > 0)
+    assert_true(get.elapsed > 0)
+    assert_equals(CallInfo('POST', '%s/job/test' % h.base_url, 303, post.elapsed, 0), post)
+    assert_true(h.last_call is post)
+
+
+def test_capture_is_per_task():
+    async def work(h, i):
+        with h.capture() as calls:
+            for n in range(5):
+                await h.get_job_info('job%d' % i)
+        return calls
+
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return await asyncio.gather(*[work(h, i) for i in range(8)])
+    with FakeEngine() as engine:
+        results = asyncio.run(go(engine))
+    for i, calls in enumerate(results):
+        assert_equals(5, len(calls))
+        assert_true(all(call.url.endswith('/job/job%d' % i) for call in calls))
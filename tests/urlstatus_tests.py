@@ -0,0 +1,66 @@
+import asyncio
+import json
+import time
+
+from nose.tools import (
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.urlstatus import chunked
+
+from .fake_engine import FakeEngine, script_params
+
+URLS = ['http://example.com/%d' % i for i in range(20)]
+
+
+def status_script(request, body, name):
+    '''Answers like url-status-batch.groovy: even-numbered URLs are pending.'''
+    script, params = script_params(body)
+    result = dict((url, dict(queue='com,example,)', pending=int(url.rsplit('/', 1)[1]) % 2 == 0,
+                             history=[]))
+                  for url in params['urls'])
+    return 200, (
+        '<?xml version="1.0" standalone=\'yes\'?><script>'
+        '<rawOutput>%s</rawOutput></script>' % json.dumps(result)).encode('utf-8'), {}
+
+
+def test_chunked():
+    chunks = list(chunked(URLS[:5] + [' ', URLS[0], URLS[5] + '\n'], 4))
+    assert_equals([URLS[:4], URLS[4:6]], chunks)
+
+
+def test_url_status_batch():
+    with FakeEngine() as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', status_script)
+        statuses = hapy.Hapy(engine.base_url).url_status_batch('test', URLS, chunk_size=6)
+        scripts = [path for method, path, body in engine.requests if path.endswith('/script')]
+    assert_equals(4, len(scripts))
+    assert_equals(set(URLS), set(statuses))
+    assert_true(statuses['http://example.com/4']['pending'])
+    assert_equals(False, statuses['http://example.com/5']['pending'])
+
+
+def test_url_status_batch_concurrency():
+    with FakeEngine(delay=0.2) as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', status_script)
+        h = hapy.Hapy(engine.base_url)
+        start = time.time()
+        statuses = h.url_status_batch('test', URLS, chunk_size=5, concurrency=4)
+        elapsed = time.time() - start
+    assert_equals(20, len(statuses))
+    assert_true(elapsed < 0.6, elapsed)
+
+
+def test_url_status_batch_async():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return await h.url_status_batch('test', URLS, chunk_size=5, concurrency=4)
+    with FakeEngine(delay=0.2) as engine:
+        engine.route('POST', r'/engine/job/([^/]+)/script', status_script)
+        start = time.time()
+        statuses = asyncio.run(go(engine))
+        elapsed = time.time() - start
+    assert_equals(20, len(statuses))
+    assert_true(elapsed < 0.6, elapsed)
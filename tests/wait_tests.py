@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+from nose.tools import (
+    raises,
+    assert_equals,
+    assert_true
+)
+
+import hapy
+from hapy.cache import ResponseCache
+from hapy.wait import Backoff, StateWaiter
+from hapy.models import JobSummary
+
+from .fake_engine import FakeEngine, script_output, xml_asset
+
+
+def states(engine, *sequence):
+    '''
+    Routes the engine and job pages so the job moves through `sequence`,
+    one state per request to the engine page, then stays at the last.
+    '''
+    seen = []
+
+    def state():
+        return sequence[min(len(seen), len(sequence) - 1)].encode('ascii')
+
+    def get_info(request, body):
+        body = xml_asset(request, 'test_get_info.xml').replace(b'NASCENT', state())
+        seen.append(1)
+        return 200, body, {'Content-Type': 'application/xml'}
+
+    def get_job_info(request, body, name):
+        body = xml_asset(request, 'test_get_job_info.xml').replace(b'NASCENT', state())
+        if state() == b'RUNNING':
+            body = body.replace(b'<value>launch</value>', b'<value>pause</value>')
+        seen.append(1)
+        return 200, body, {'Content-Type': 'application/xml'}
+
+    engine.route('GET', r'/engine/?', get_info)
+    engine.route('GET', r'/engine/job/([^/]+)/?', get_job_info)
+    return seen
+
+
+def test_backoff():
+    backoff = Backoff(recent=True, fast=0.1, maximum=0.5, factor=2)
+    assert_equals([0.1, 0.2, 0.4, 0.5, 0.5], [backoff.next() for i in range(5)])
+    assert_equals(0.1, backoff.next(changed=True))
+    assert_equals(1.0, Backoff().next())
+
+
+def test_state_waiter():
+    waiter = StateWaiter({'a': 'PAUSED', 'b': ('FINISHED', 'PAUSED')})
+    index = {'a': JobSummary({'crawlControllerState': 'PAUSED'}),
+             'b': JobSummary({'crawlControllerState': 'RUNNING'})}
+    assert_true(waiter.update(index) is not None)
+    assert_equals(set(['b']), waiter.waiting)
+    index['b'] = JobSummary({'crawlControllerState': 'FINISHED'})
+    assert_equals(None, waiter.update(index))
+
+
+def test_wait_for_state():
+    with FakeEngine() as engine:
+        seen = states(engine, 'NASCENT', 'PREPARING', 'PAUSED')
+        h = hapy.Hapy(engine.base_url)
+        h.launch_job('test')
+        start = time.time()
+        info = h.wait_for_state('test', 'PAUSED', timeout=5)
+        elapsed = time.time() - start
+    assert_equals('PAUSED', info.crawl_controller_state)
+    # Three polls of the engine, then the job page:
+    assert_equals(4, len(seen))
+    # Fast polling right after an action:
+    assert_true(elapsed < 0.5, elapsed)
+
+
+def test_scripts_are_not_actions():
+    with FakeEngine() as engine:
+        seen = states(engine, 'NASCENT', 'PREPARING', 'PAUSED')
+        engine.route('POST', r'/engine/job/([^/]+)/script', script_output('{}'))
+        h = hapy.Hapy(engine.base_url)
+        h.execute_script('test', 'groovy', 'rawOut.print("{}")')
+        assert_equals(None, h._acted_at)
+        h.launch_job('test')
+        acted_at = h._acted_at
+        h.execute_script('test', 'groovy', 'rawOut.print("{}")')
+        assert_equals(acted_at, h._acted_at)
+        start = time.time()
+        info = h.wait_for_state('test', 'PAUSED', timeout=5)
+        elapsed = time.time() - start
+    assert_equals('PAUSED', info.crawl_controller_state)
+    assert_equals(4, len(seen))
+    assert_true(elapsed < 0.5, elapsed)
+
+
+@raises(TimeoutError)
+def test_wait_for_state_timeout():
+    with FakeEngine() as engine:
+        states(engine, 'RUNNING')
+        hapy.Hapy(engine.base_url).wait_for_state('test', ('PAUSED', 'FINISHED'), timeout=0.3)
+
+
+def test_wait_for_action():
+    with FakeEngine() as engine:
+        states(engine, 'PREPARING', 'PREPARING', 'RUNNING')
+        h = hapy.Hapy(engine.base_url)
+        h.launch_job('test')
+        info = h.wait_for_action('test', 'pause', timeout=5)
+    assert_equals('RUNNING', info.crawl_controller_state)
+    assert_true('pause' in info.available_actions)
+
+
+def test_waits_poll_past_the_cache():
+    with FakeEngine() as engine:
+        seen = states(engine, 'PREPARING', 'PREPARING', 'RUNNING')
+        h = hapy.Hapy(engine.base_url, cache=ResponseCache(ttls={'engine': 60, 'job': 60}))
+        h.get_info()
+        h.get_job_info('test')
+        info = h.wait_for_state('test', 'RUNNING', timeout=5)
+        assert_equals('RUNNING', info.crawl_controller_state)
+        info = h.wait_for_action('test', 'pause', timeout=5)
+        assert_true('pause' in info.available_actions)
+        # The cache still answers ordinary reads:
+        h.get_info()
+    assert_equals(6, len(seen))
+
+
+def test_wait_for_states_async():
+    async def go(engine):
+        async with hapy.AsyncHapy(engine.base_url) as h:
+            return await h.wait_for_states({'test': 'PAUSED', 'other': ('NASCENT', None)}, timeout=5)
+    with FakeEngine() as engine:
+        seen = states(engine, 'PREPARING', 'PAUSED')
+        infos = asyncio.run(go(engine))
+    assert_equals('PAUSED', infos['test'].crawl_controller_state)
+    assert_equals(set(['test', 'other']), set(infos))